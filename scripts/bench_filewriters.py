@@ -0,0 +1,91 @@
+"""
+Benchmark SPEC and CSV writer callbacks: per-event documents vs a single
+event_page carrying the same rows
+
+usage:
+    python scripts/bench_filewriters.py [num_rows]
+
+@author: roberttk
+"""
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from ssrltools.callbacks import SpecCSVCallback
+from ssrltools.filewriters import SpecWriterCallback
+
+START = {'uid': 'bench-start', 'time': 0., 'scan_id': 1,
+         'plan_type': 'generator', 'plan_name': 'bench',
+         'detectors': ['det'], 'motors': ['motor']}
+DESCRIPTOR = {'uid': 'bench-desc', 'run_start': 'bench-start',
+              'name': 'primary', 'time': 0.,
+              'data_keys': {'motor': {}, 'det': {}, 'counts': {}},
+              'hints': {'det': {'fields': ['det']}}}
+STOP = {'uid': 'bench-stop', 'run_start': 'bench-start', 'time': 1.,
+        'exit_status': 'success'}
+
+def make_page(n):
+    """one event_page holding n rows"""
+    seq = np.arange(1, n + 1)
+    return {'descriptor': 'bench-desc',
+            'time': seq * 0.01,
+            'seq_num': seq,
+            'uid': [f'ev-{i}' for i in seq],
+            'data': {'motor': seq * 0.1,
+                     'det': np.sin(seq),
+                     'counts': seq % 1000},
+            'timestamps': {'motor': seq * 0.01,
+                           'det': seq * 0.01,
+                           'counts': seq * 0.01}}
+
+def make_events(page):
+    """the same rows as individual event documents"""
+    keys = list(page['data'])
+    columns = [page['data'][k].tolist() for k in keys]
+    times = page['time'].tolist()
+    for i, row in enumerate(zip(*columns)):
+        yield {'descriptor': page['descriptor'],
+               'time': times[i],
+               'seq_num': i + 1,
+               'uid': page['uid'][i],
+               'data': dict(zip(keys, row)),
+               'timestamps': dict.fromkeys(keys, times[i])}
+
+def run(cb, docs):
+    """feed docs to cb, return (ingest time, stop/write time)"""
+    cb('start', START)
+    cb('descriptor', DESCRIPTOR)
+    t0 = time.perf_counter()
+    for name, doc in docs:
+        cb(name, doc)
+    t1 = time.perf_counter()
+    cb('stop', STOP)
+    return t1 - t0, time.perf_counter() - t1
+
+def main(n=100000):
+    page = make_page(n)
+    events = list(make_events(page))
+    tmpdir = tempfile.mkdtemp()
+
+    def csv_writer(fn):
+        open(fn, 'w').close()       # otherwise named by timestamp, in cwd
+        return SpecCSVCallback(fn)
+
+    writers = {
+        'spec': lambda fn: SpecWriterCallback(fn).receiver,
+        'csv': csv_writer,
+    }
+    print(f'{n} rows')
+    for label, factory in writers.items():
+        for mode, docs in (('event', [('event', ev) for ev in events]),
+                           ('event_page', [('event_page', page)])):
+            fn = os.path.join(tmpdir, f'{label}-{mode}.dat')
+            ingest, write = run(factory(fn), docs)
+            print(f'{label:>5s} {mode:>10s}: ingest {ingest:8.4f} s,'
+                  f'  write {write:8.4f} s')
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
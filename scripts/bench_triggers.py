@@ -0,0 +1,224 @@
+"""
+Benchmark detector triggering in step scans against simulated IOCs
+
+Starts the acquisition simulator (ssrltools.sim.IOC.acquire), connects
+trigger-only versions of the Dexela, Pilatus, MarCCD and Xspress3
+detectors (the repo's SingleTrigger / XspressTrigger mixins, without file
+plugins), and runs bp.count and ssrltools.plans.nscan over them.
+
+Recorded, per scan:
+    latency     trigger() to status done, per detector
+    span        first trigger to last status done, per point
+    dead time   last status done of one point to first trigger of the next
+    overlap     summed detector busy time / wall time any was busy, per
+                point: 1 means the detectors ran one after the other, the
+                number of detectors means fully in parallel
+
+usage:
+    python scripts/bench_triggers.py [--num 20] [--latency 0.05]
+        [--set dexela=0.2 --set xspress3=0.02] [--jitter 0.01]
+        [--detectors dexela pilatus] [--output bench_triggers.json]
+
+@author: roberttk
+"""
+import argparse
+import datetime
+import json
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+import bluesky.plans as bp
+from bluesky import RunEngine
+from ophyd import EpicsSignal, ADComponent as ADCpt, SingleTrigger
+from ophyd.areadetector.detectors import PilatusDetector, MarCCDDetector
+from ophyd.sim import motor
+
+from ssrltools.devices.areadetectors import SSRLDexelaDet, HackedCam
+from ssrltools.devices.xspress3 import XspressTrigger, Xspress3Detector
+from ssrltools.plans import nscan
+
+PREFIX = 'SIM:'
+
+
+class BenchDexela(SSRLDexelaDet):
+    cam = ADCpt(HackedCam, '')
+
+class BenchPilatus(SingleTrigger, PilatusDetector):
+    pass
+
+class BenchMarCCD(SingleTrigger, MarCCDDetector):
+    pass
+
+class BenchXspress3(XspressTrigger, Xspress3Detector):
+    pass
+
+# name: (class, detector prefix, cam prefix in the simulator)
+DETECTORS = {
+    'dexela': (BenchDexela, 'DEX:', 'DEX:'),
+    'pilatus': (BenchPilatus, 'PIL:', 'PIL:cam1:'),
+    'marccd': (BenchMarCCD, 'MAR:', 'MAR:cam1:'),
+    'xspress3': (BenchXspress3, 'XSP3:', 'XSP3:'),
+}
+
+
+class TriggerTimer(object):
+    '''Wrap each detector's trigger() to time its status'''
+    def __init__(self, detectors):
+        self.records = []       # (detector name, triggered, done)
+        for det in detectors:
+            det.trigger = self._timed(det.name, det.trigger)
+
+    def _timed(self, name, trigger):
+        def timed_trigger():
+            t0 = time.monotonic()
+            status = trigger()
+            status.add_callback(lambda st: self.records.append(
+                                    (name, t0, time.monotonic())))
+            return status
+        return timed_trigger
+
+    def clear(self):
+        self.records = []
+
+
+def _stats(values):
+    values = np.asarray(values, dtype=float)
+    if not len(values):
+        return {}
+    return {'mean': float(values.mean()),
+            'median': float(np.median(values)),
+            'p95': float(np.percentile(values, 95)),
+            'max': float(values.max()),
+            'n': int(len(values))}
+
+def _union_length(intervals):
+    total, end = 0., -np.inf
+    for start, stop in sorted(intervals):
+        if stop > end:
+            total += stop - max(start, end)
+            end = stop
+    return total
+
+def summarize(records, num_dets):
+    '''latency, span, dead time and overlap from the trigger records'''
+    # every detector is triggered once per point, in order
+    by_det = {}
+    for name, t0, t1 in sorted(records, key=lambda r: r[1]):
+        by_det.setdefault(name, []).append((t0, t1))
+    points = list(zip(*by_det.values()))
+
+    spans, overlaps, dead = [], [], []
+    prev_done = None
+    for point in points:
+        first = min(t0 for t0, _ in point)
+        last = max(t1 for _, t1 in point)
+        busy = sum(t1 - t0 for t0, t1 in point)
+        spans.append(last - first)
+        overlaps.append(busy / _union_length(point) if busy else 1.)
+        if prev_done is not None:
+            dead.append(first - prev_done)
+        prev_done = last
+
+    return {
+        'latency': {name: _stats([t1 - t0 for t0, t1 in ivs])
+                    for name, ivs in by_det.items()},
+        'span': _stats(spans),
+        'dead_time': _stats(dead),
+        'overlap': dict(_stats(overlaps), ideal=num_dets),
+    }
+
+def set_latency(det_names, latency, jitter, timeout=20):
+    deadline = time.monotonic() + timeout   # give the IOC time to start
+    for name in det_names:
+        cam_prefix = PREFIX + DETECTORS[name][2]
+        for suffix, value in (('SimLatency', latency[name]),
+                              ('SimJitter', jitter)):
+            sig = EpicsSignal(cam_prefix + suffix, name=suffix)
+            while True:
+                try:
+                    sig.wait_for_connection(timeout=2)
+                    break
+                except TimeoutError:
+                    if time.monotonic() > deadline:
+                        raise
+            sig.put(value, wait=True)
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--num', type=int, default=20,
+                        help='points per scan')
+    parser.add_argument('--latency', type=float, default=0.05,
+                        help='seconds per frame, every detector')
+    parser.add_argument('--set', action='append', default=[],
+                        metavar='DET=SECONDS',
+                        help='seconds per frame for one detector')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra seconds per frame, at most')
+    parser.add_argument('--detectors', nargs='+', choices=list(DETECTORS),
+                        default=list(DETECTORS))
+    parser.add_argument('--output', default='bench_triggers.json')
+    args = parser.parse_args(argv)
+
+    latency = dict.fromkeys(DETECTORS, args.latency)
+    for item in args.set:
+        name, _, value = item.partition('=')
+        if name not in DETECTORS:
+            parser.error(f'unknown detector {name!r}')
+        latency[name] = float(value)
+    args.latency = {name: latency[name] for name in args.detectors}
+    return args
+
+def main(argv=None):
+    args = parse_args(argv)
+    ioc = subprocess.Popen([sys.executable, '-m', 'ssrltools.sim.IOC.acquire'],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    try:
+        # also waits for the IOC: the trigger mixins connect on creation
+        set_latency(args.detectors, args.latency, args.jitter)
+        dets = []
+        for name in args.detectors:
+            cls, prefix, _ = DETECTORS[name]
+            # nothing to read: the simulator serves only the trigger PVs
+            dets.append(cls(PREFIX + prefix, name=name, read_attrs=[],
+                            configuration_attrs=[]))
+
+        timer = TriggerTimer(dets)
+        RE = RunEngine({})
+        plans = {
+            'count': lambda: bp.count(dets, args.num),
+            'nscan': lambda: nscan(dets, motor, -1, 1, num=args.num),
+        }
+        results = {}
+        for label, plan in plans.items():
+            timer.clear()
+            t0 = time.monotonic()
+            RE(plan())
+            wall = time.monotonic() - t0
+            results[label] = dict(summarize(timer.records, len(dets)),
+                                  wall_time=wall,
+                                  per_point=wall / args.num)
+            print(f'{label:>6s}: {results[label]["span"]["mean"] * 1000:7.1f}'
+                  f' ms per point, dead time '
+                  f'{results[label]["dead_time"]["mean"] * 1000:6.1f} ms, '
+                  f'overlap {results[label]["overlap"]["mean"]:.2f}'
+                  f' of {len(dets)}')
+    finally:
+        ioc.terminate()
+        ioc.wait()
+
+    report = {
+        'date': datetime.datetime.now().isoformat(),
+        'config': {'num': args.num, 'latency': args.latency,
+                   'jitter': args.jitter, 'detectors': args.detectors},
+        'results': results,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+    print(f'results written to {args.output}')
+
+if __name__ == '__main__':
+    main()
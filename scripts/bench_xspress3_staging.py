@@ -0,0 +1,88 @@
+"""
+Benchmark Xspress3 per-run setup: Xspress3FileStore.stage / unstage
+
+Starts the simulated Xspress3 IOC (ssrltools.sim.IOC.xspress) and times
+the real stage, one frame and unstage of an Xspress3 detector, once
+waiting on PV monitors only (config_time=0) and once with the old fixed
+0.5 s settle time added (config_time=0.5).
+
+usage:
+    python scripts/bench_xspress3_staging.py [num_runs]
+
+@author: roberttk
+"""
+import subprocess
+import sys
+import tempfile
+import time
+
+from ophyd import Component as Cpt
+
+from ssrltools.devices.xspress3 import (XspressTrigger, Xspress3Detector,
+                                        Xspress3Channel, Xspress3FileStore)
+
+PREFIX = 'XSPRESS3-EXAMPLE:'
+CONFIG_TIME = 0.5       # old Xspress3FileStore default
+
+
+class SimXspress3(XspressTrigger, Xspress3Detector):
+    channel1 = Cpt(Xspress3Channel, 'C1_', channel_num=1)
+    channel2 = Cpt(Xspress3Channel, 'C2_', channel_num=2)
+    hdf5 = Cpt(Xspress3FileStore, 'HDF5:', root='/',
+               write_path_template=tempfile.gettempdir(), wait_on_stage=True)
+
+
+def connect():
+    deadline = time.monotonic() + 20       # give the IOC time to start
+    while True:
+        try:
+            det = SimXspress3(PREFIX, name='xs',
+                              read_attrs=['channel1', 'channel2', 'hdf5'])
+            det.wait_for_connection(timeout=2)
+            break
+        except TimeoutError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+    det.total_points.put(1)
+    det.make_directories.put(True)
+    det.settings.acquire_time.put(0.001)
+    return det
+
+def one_run(det):
+    timings = {}
+    t0 = time.perf_counter()
+    det.stage()
+    timings['stage'] = time.perf_counter() - t0
+    det.trigger().wait(10)
+    t0 = time.perf_counter()
+    det.unstage()
+    timings['unstage'] = time.perf_counter() - t0
+    return timings
+
+def main(num_runs=20):
+    ioc = subprocess.Popen([sys.executable, '-m', 'ssrltools.sim.IOC.xspress'],
+                           stdout=subprocess.DEVNULL,
+                           stderr=subprocess.DEVNULL)
+    try:
+        det = connect()
+        one_run(det)        # connects the PVs staging touches
+        for label, config_time in (('readiness', 0), ('fixed settle',
+                                                      CONFIG_TIME)):
+            det.hdf5._config_time = config_time
+            totals = {'stage': 0., 'unstage': 0.}
+            t0 = time.perf_counter()
+            for _ in range(num_runs):
+                for key, value in one_run(det).items():
+                    totals[key] += value
+            per_run = (time.perf_counter() - t0) / num_runs
+            print(f'{label:>12s}: {per_run * 1000:8.1f} ms per run, '
+                  f'stage {totals["stage"] / num_runs * 1000:.1f} ms, '
+                  f'unstage {totals["unstage"] / num_runs * 1000:.1f} ms '
+                  f'({num_runs} runs)')
+    finally:
+        ioc.terminate()
+        ioc.wait()
+
+if __name__ == '__main__':
+    main(*[int(a) for a in sys.argv[1:]])
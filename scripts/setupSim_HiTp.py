@@ -17,6 +17,7 @@ from ophyd.areadetector.filestore_mixins import resource_factory
 
 from ssrltools.devices import ShutterBase
 from ssrltools.sim import ArraySynSignal
+from ssrltools.sim.noise import NOISE_MODELS, noise_source
 import time
 
 p_x = SynAxis(name='plate_x', labels={'motors'})
@@ -143,8 +144,9 @@ class ArraySynLocator(ArraySynSignal):
                  Imax=100,
                  noise=None, random_state=None, 
                  size=10, pt_density=20, noise_multiplier=1, **kwargs):
-        if noise not in ('poisson', 'uniform', None):
-            raise ValueError("Noise must be one of 'poisson', 'uniform', None")
+        if noise not in NOISE_MODELS:
+            raise ValueError("Noise must be one of 'poisson', 'uniform', "
+                             "'gaussian', None")
             
         self._motor1 = motor1
         self._motor2 = motor2
@@ -153,8 +155,7 @@ class ArraySynLocator(ArraySynSignal):
 
         self.__name__ = name
         
-        if random_state is None:
-            random_state = np.random
+        self.noise_source = noise_source(name, random_state)
                                 
         # Function to simulate calls to pv
         def func():
@@ -180,9 +181,12 @@ class ArraySynLocator(ArraySynSignal):
             v = Imax * np.exp(-( ((xx-m1)**2 / 2) +  \
                                  ((yy-m2)**2 / 2) ))
             if noise == 'poisson':
-                v = int(random_state.poission(np.round(v), 1))
+                v = self.noise_source.poisson(np.round(v))
             elif noise == 'uniform':
-                v += random_state.uniform(-1, 1) * noise_multiplier
+                self.noise_source.add_uniform(v, -noise_multiplier,
+                                              noise_multiplier)
+            elif noise == 'gaussian':
+                self.noise_source.add_normal(v, noise_multiplier)
         
             return v
         
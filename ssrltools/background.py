@@ -0,0 +1,222 @@
+"""
+Background writer thread for file I/O off the RunEngine callback path
+
+.. autosummary::
+
+   ~BackgroundWriter
+
+"""
+import atexit
+from concurrent.futures import Future
+import logging
+import queue
+import threading
+import time
+import weakref
+
+logger = logging.getLogger(__name__)
+
+_STOP = object()        # queue sentinel, ends the writer thread
+
+_open_writers = weakref.WeakSet()     # closed at interpreter exit
+
+
+@atexit.register
+def _close_open_writers():
+    for writer in list(_open_writers):
+        writer.close()
+
+
+class BackgroundWriter(object):
+    """
+    Run write jobs, in submission order, on a single background thread.
+
+    The queue is bounded: ``submit()`` blocks once ``maxsize`` jobs are
+    waiting, so a slow disk slows the producer down instead of filling
+    memory.  Pending jobs are written out on ``flush()``, ``close()`` and
+    at interpreter exit.  One writer can be shared by several callbacks.
+    The thread only holds the writer weakly: a writer dropped without
+    ``close()`` stops its thread once collected.
+
+    usage:
+        writer = BackgroundWriter(maxsize=32)
+        spec = SpecWriterCallback('scans.dat', writer=writer)
+        csv = SpecCSVCallback('scans.csv', writer=writer)
+        ...
+        writer.flush()          # wait for all pending writes
+        writer.metrics          # queue depth and latency numbers
+
+    PARAMETERS
+
+    maxsize : int
+        most jobs waiting in the queue before ``submit()`` blocks
+    name : str
+        name of the writer thread
+    """
+
+    def __init__(self, maxsize=64, name='BackgroundWriter'):
+        self.name = name
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._lock = threading.Lock()
+        # orders submit / flush against close: held while blocked on a
+        # full queue, so apart from _lock, which the writer thread takes
+        self._submit_lock = threading.Lock()
+        self._closed = False
+        self.reset_metrics()
+
+        self._thread = threading.Thread(target=_run,
+                                        args=(weakref.ref(self), self._queue),
+                                        name=name, daemon=True)
+        self._thread.start()
+        self._finalizer = weakref.finalize(self, self._queue.put, _STOP)
+        self._finalizer.atexit = False
+        _open_writers.add(self)
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} {self.name!r} "
+                f"depth={self.queue_depth}>")
+
+    @property
+    def queue_depth(self):
+        '''number of jobs waiting to be written'''
+        return self._queue.qsize()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def submit(self, func, *args, timeout=None, **kwargs):
+        """
+        Queue func(*args, **kwargs) to run on the writer thread.
+
+        Blocks while the queue is full (back-pressure).  Raises queue.Full
+        if timeout (s) passes first, RuntimeError if the writer is closed.
+        Returns a Future holding the result or exception of the job.
+        """
+        fut = Future()
+        with self._submit_lock:
+            if self._closed:
+                raise RuntimeError(f'{self.name} is closed')
+            t0 = time.perf_counter()
+            self._queue.put((fut, func, args, kwargs, t0), timeout=timeout)
+        wait = time.perf_counter() - t0
+        with self._lock:
+            self._submitted += 1
+            self._max_depth = max(self._max_depth, self._queue.qsize())
+            self._blocked_time += wait
+        return fut
+
+    def flush(self, timeout=None):
+        """
+        Wait until every job submitted so far has been written.
+        Returns False if timeout (s) passed first.
+        """
+        done = threading.Event()
+        with self._submit_lock:
+            if self._closed or not self._thread.is_alive():
+                return True
+            self._queue.put((None, done.set, (), {}, time.perf_counter()))
+        return done.wait(timeout)
+
+    def close(self, timeout=None):
+        """write out pending jobs and stop the writer thread"""
+        with self._submit_lock:
+            if self._closed:
+                return
+            self._closed = True
+            _open_writers.discard(self)
+            self._finalizer.detach()
+            if self._thread.is_alive():
+                self._queue.put(_STOP)
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            return
+        # nothing runs these any more
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _STOP and item[0] is not None:
+                item[0].set_exception(RuntimeError(f'{self.name} is closed'))
+
+    def _failure(self):
+        with self._lock:
+            self._failed += 1
+
+    def _record(self, write_time, latency):
+        with self._lock:
+            self._completed += 1
+            self._write_time += write_time
+            self._latency += latency
+            self._max_latency = max(self._max_latency, latency)
+            self._last_latency = latency
+
+    def reset_metrics(self):
+        """zero the counters reported by ``metrics``"""
+        with getattr(self, '_lock', threading.Lock()):
+            self._submitted = 0
+            self._completed = 0
+            self._failed = 0
+            self._max_depth = 0
+            self._blocked_time = 0.0
+            self._write_time = 0.0
+            self._latency = 0.0
+            self._max_latency = 0.0
+            self._last_latency = 0.0
+
+    @property
+    def metrics(self):
+        """
+        dict of writer statistics, times in seconds:
+
+        * queue_depth, max_queue_depth : jobs waiting now, and at most
+        * submitted, completed, failed : job counts
+        * blocked_time : total time submit() waited on a full queue
+        * mean_write_time : time spent running each job
+        * mean_latency, max_latency, last_latency : submit to written
+        """
+        with self._lock:
+            n = max(self._completed, 1)
+            return dict(
+                queue_depth=self._queue.qsize(),
+                max_queue_depth=self._max_depth,
+                submitted=self._submitted,
+                completed=self._completed,
+                failed=self._failed,
+                blocked_time=self._blocked_time,
+                mean_write_time=self._write_time / n,
+                mean_latency=self._latency / n,
+                max_latency=self._max_latency,
+                last_latency=self._last_latency,
+            )
+
+
+def _run(ref, jobs):
+    """writer thread: run jobs until _STOP, holding the writer weakly"""
+    while True:
+        item = jobs.get()
+        if item is _STOP:
+            return
+        fut, func, args, kwargs, t_submit = item
+        if fut is not None and not fut.set_running_or_notify_cancel():
+            continue
+        writer = ref()      # None once collected: jobs still run
+        t0 = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as exc:
+            logger.exception('%s: %s failed',
+                             getattr(writer, 'name', 'BackgroundWriter'),
+                             getattr(func, '__name__', func))
+            if writer is not None:
+                writer._failure()
+            if fut is not None:
+                fut.set_exception(exc)
+        else:
+            if fut is not None:
+                fut.set_result(result)
+        t1 = time.perf_counter()
+        if fut is not None and writer is not None:
+            writer._record(t1 - t0, t1 - t_submit)
+        del writer
@@ -0,0 +1,98 @@
+"""
+Bounded least recently used cache, shared by the handlers and simulators
+
+.. autosummary::
+
+   ~LRUCache
+
+"""
+from collections import OrderedDict
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class LRUCache(object):
+    '''Least recently used cache, bounded by item count and total cost
+
+    Items past either limit are evicted oldest first, and handed to
+    on_evict (e.g. to close a file).  cost(value) defaults to 1 per item.
+    '''
+    def __init__(self, maxsize=None, max_cost=None, cost=None,
+                 on_evict=None):
+        self.maxsize = maxsize
+        self.max_cost = max_cost
+        self._cost = cost or (lambda value: 1)
+        self._on_evict = on_evict
+        self._items = OrderedDict()
+        self._total = 0
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    @property
+    def total_cost(self):
+        return self._total
+
+    def get(self, key, default=None):
+        with self._lock:
+            if key not in self._items:
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._items.move_to_end(key)
+            return self._items[key][0]
+
+    def put(self, key, value):
+        with self._lock:
+            self.pop(key)
+            cost = self._cost(value)
+            self._items[key] = (value, cost)
+            self._total += cost
+            self._evict(keep=key)
+
+    def pop(self, key):
+        '''remove key without calling on_evict, returns its value or None'''
+        with self._lock:
+            if key not in self._items:
+                return None
+            value, cost = self._items.pop(key)
+            self._total -= cost
+            return value
+
+    def discard(self, predicate):
+        '''evict every item whose key satisfies predicate'''
+        with self._lock:
+            for key in [k for k in self._items if predicate(k)]:
+                self._drop(key)
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._items):
+                self._drop(key)
+
+    def _over(self):
+        return ((self.maxsize is not None and len(self._items) > self.maxsize)
+                or (self.max_cost is not None and self._total > self.max_cost))
+
+    def _evict(self, keep=None):
+        while self._over():
+            key = next(iter(self._items))
+            if key == keep:
+                break       # never evict the item just added
+            self._drop(key)
+
+    def _drop(self, key):
+        value = self.pop(key)
+        if self._on_evict is not None:
+            try:
+                self._on_evict(value)
+            except Exception:
+                logger.exception('error evicting %s', key)
@@ -15,6 +15,8 @@ import os
 import socket
 import time
 
+from .filewriters import ColumnBuffer, bulk_events_to_pages
+
 logger = logging.getLogger(__name__)
 print(__name__)
 logger.debug('test debug')
@@ -57,53 +59,127 @@ def _doc_contents(key, doc):
 class SpecCSVCallback(CallbackBase):
     """SpecCSVCallback generate spec CSV file from data (event docs)
     write file on stop document
+
+    Data are kept in a ColumnBuffer (one growable NumPy array per key) 
+    and formatted a column at a time.  With ``flush_every`` set, the 
+    buffer is appended to the file and cleared every ``flush_every`` rows,
+    so memory stays bounded on long scans.
+
+    usage:
+        csv_cb = SpecCSVCallback('scan.csv', flush_every=10000)
+        RE.subscribe(csv_cb)
+
+    PARAMETERS
+
+    filename : str, optional
+        CSV file to write, default is named from the current time
+    flush_every : int, optional
+        write out buffered rows every this many rows, default only at stop
+    verbose : bool
+        print the buffered data at stop, default False
+    writer : BackgroundWriter, optional
+        format and write rows on the writer's thread, so document 
+        handling returns immediately, default None (write synchronously)
     """
 
-    def __init__(self, filename=None):
+    def __init__(self, filename=None, flush_every=None, verbose=False,
+                 writer=None):
         if filename is None or not os.path.exists(filename):
             now  = datetime.now()
             self.filename = datetime.strftime(now, '%Y%m%d-%H%M%S') + '.csv'
         else:
             self.filename = filename
 
-        self.data = OrderedDict() # store everything here
+        self.flush_every = flush_every
+        self.verbose = verbose
+        self.writer = writer
+        self.data = ColumnBuffer() # store everything here
         self.num_primary_data = 0
+        self.num_written = 0
         super().__init__()
+
+    def start(self, doc):
+        """ handle start docs, new file contents for each run
+        """
+        self.data = ColumnBuffer()
+        self.num_primary_data = 0
+        self.num_written = 0
     
     def descriptor(self, doc):
         """ handle descriptor docs, prepping for scan data
         """
         logger.debug('descriptor method')
         keyset = list(doc['data_keys'].keys())
-        self.data.update({k: [] for k in keyset})
-        self.data.update({'seq_num': []})
+        if self.num_written > 0 and not set(keyset) <= set(self.data.keys()):
+            logger.warning('new data keys after CSV header was written, '
+                           'their values are dropped')
+            return
+        self.data.add_keys(keyset)
+        self.data.add_keys(['seq_num'])
 
     def event(self, doc):
         """ handle event documents by pulling from data keys
+        thin adapter over event_page, one row at a time
         """
-
-        self.data['seq_num'].append(doc['seq_num'])
-        for k in doc['data'].keys():
-            self.data[k].append(doc['data'].get(k, 0))
+        row = {k: v for k, v in doc['data'].items() if k in self.data}
+        row['seq_num'] = doc['seq_num']
+        self.data.append_row(row, fill=0)
         self.num_primary_data += 1
+        self._check_flush()
+
+    def event_page(self, doc):
+        """ handle event_page docs, appending whole columns at once
+        """
+        columns = {k: v for k, v in doc['data'].items() if k in self.data}
+        columns['seq_num'] = doc['seq_num']
+        n = len(doc['seq_num'])
+        self.data.extend(columns, n=n, fill=0)
+        self.num_primary_data += n
+        self._check_flush()
+
+    def bulk_events(self, doc):
+        """ handle bulk_events docs as one event_page per descriptor
+        """
+        for page in bulk_events_to_pages(doc):
+            self.event_page(page)
 
     def stop(self, doc):
         """ write files at the stop document trigger.  
         """
-        print(self.data)
-        # self.write_scan
-        # prepare lines
-        lines = []
-        if len(self.data.keys()) > 0:
-            lines.append(','.join(self.data.keys()))
-            for i in range(self.num_primary_data):
-                s = []
-                for k in self.data.keys():
-                    datum = self.data[k][i]
-                    s.append(str(datum))
-                
-                lines.append(','.join(s))
-        
-        # write lines
-        with open(self.filename, 'w') as f:
-            f.write('\n'.join(lines))
+        if self.verbose:
+            print(dict(self.data.items()))
+        self.flush()
+
+    def _check_flush(self):
+        if self.flush_every and len(self.data) >= self.flush_every:
+            self.flush()
+
+    def flush(self):
+        """ write buffered rows to the file and clear the buffer.
+        The first flush of a run (re)writes the file, with the header.
+        With a background writer, returns the Future of the write.
+        """
+        if len(self.data.keys()) == 0:
+            return
+        first = self.num_written == 0
+        if len(self.data) == 0 and not first:
+            return
+
+        header = list(self.data.keys()) if first else None
+        columns = [v.tolist() for v in self.data.values()]
+        self.num_written += len(self.data)
+        self.data.clear()
+        if self.writer is None:
+            return self._write_rows(self.filename, header, columns)
+        return self.writer.submit(self._write_rows, self.filename, header, 
+                                  columns)
+
+    @staticmethod
+    def _write_rows(filename, header, columns):
+        # format a whole column at a time, then join rows
+        rows = list(map(','.join, zip(*[map(str, c) for c in columns])))
+        with open(filename, 'a' if header is None else 'w') as f:
+            if header is not None:
+                f.write(','.join(header) + '\n')
+            if len(rows) > 0:
+                f.write('\n'.join(rows) + '\n')
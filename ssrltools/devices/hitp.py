@@ -16,6 +16,8 @@ from pathlib import Path
 
 from numpy import random
 
+from .locations import SampleLocTable
+
 def gen_wafer_locs(shape='circle', radius=10):
     """
     Create square grid of locations, with spacing of 1 between
@@ -28,14 +30,9 @@ def gen_wafer_locs(shape='circle', radius=10):
     x = xv.flatten()
     y = yv.flatten()
     if shape == 'circle':
-        xout = [] #np.array([])
-        yout = [] # np.array([])
-        for i in range(len(x)):
-            if (x[i]**2 + y[i]**2) <= radius**2:
-                xout.append(x[i])
-                yout.append(y[i])
-        
-        return xout, yout
+        inside = (x**2 + y**2) <= radius**2
+
+        return x[inside], y[inside]
     elif shape == 'hitp':
         # special case with steps of 4.5
         vals = np.linspace(-31.5, 31.5, num=15)
@@ -44,14 +41,9 @@ def gen_wafer_locs(shape='circle', radius=10):
         x = xv.flatten()
         y = yv.flatten()
 
-        xout = [] #np.array([])
-        yout = [] # np.array([])
-        for i in range(len(x)):
-            if (x[i]**2 + y[i]**2) <= 31.5**2:
-                xout.append(x[i])
-                yout.append(y[i])
+        inside = (x**2 + y**2) <= 31.5**2
 
-        return xout, yout
+        return x[inside], y[inside]
     else:
         return x, y
 
@@ -84,18 +76,15 @@ class HiTpStage(Device):
         # only accessible from self once instantiated
         
         # hard coding plate positions for now
-        self.sample_locs = {}
         x, y = gen_wafer_locs(shape='hitp')
-        loc177 = np.array([x, y])
-
-        for i in range(len(loc177[0])):
-            self.sample_locs[i] = { 'stage_x': loc177[0, i],
-                                    'stage_y': loc177[1, i],
-                                    'stage_z': 0,
-                                    'plate_x': 0, #self.plate_x.position,
-                                    'plate_y': 0, #self.plate_y.position,
-                                    'theta':   0 #self.theta.position
-                                  }
+        self.sample_locs = SampleLocTable.from_columns(
+                                    stage_x=x,
+                                    stage_y=y,
+                                    stage_z=0,
+                                    plate_x=0, #self.plate_x.position,
+                                    plate_y=0, #self.plate_y.position,
+                                    theta=0 #self.theta.position
+                                  )
         
         self.center = { 'stage_x': 0,
                         'stage_y': 0,
@@ -126,11 +115,10 @@ class HiTpStage(Device):
         After aligning plate and theta, set all sample locations to have
         same plate_x, plate_y, theta.
         """
-        for i in range(len(self.sample_locs)):
-            self.sample_locs[i]['theta'] = self.theta.position
-            self.sample_locs[i]['plate_x'] = self.plate_x.position
-            self.sample_locs[i]['plate_y'] = self.plate_y.position
-            self.sample_locs[i]['stage_z'] = self.stage_z.position
+        self.sample_locs.set(theta=self.theta.position,
+                             plate_x=self.plate_x.position,
+                             plate_y=self.plate_y.position,
+                             stage_z=self.stage_z.position)
 
 
     def sample_loc_list(self, index=None):
@@ -139,6 +127,11 @@ class HiTpStage(Device):
         motor1, [m1_loc1, m1_loc2, ...], 
         motor2, [m2_loc1, m2_loc2, ...], ...
 
+        index selects (and orders) the samples returned: None for all of
+        them, 'center' for the center position.  An int selects that one
+        sample, as position arrays of length 1, and [] selects none.
+        (index=0 and [] used to return all samples.)
+
         usage: 
             stage = HiTpStage('prefix', name='name')
             RE( bp.list_scan(*stage.sample_loc_list()) )
@@ -157,30 +150,8 @@ class HiTpStage(Device):
             return result
 
         else: # Return all sample locations or given indices
-            loc_lists = {}
-            for name in self.component_names:
-                loc_lists[name] = []
-
-            if not index: # Return all sample locs
-                for pos in self.sample_locs.values():
-                    for motor in pos.keys():
-                        loc_lists[motor].append(pos[motor])
-            elif isinstance(index, (int, list)):
-                if type(index) is int:
-                    indices = [index]
-                else: 
-                    indices = list(index)
-                    
-                for i in indices:
-                    for motor in self.sample_locs[i].keys():
-                        loc_lists[motor].append(self.sample_locs[i][motor])
-
-            # format as * unpackable args
-            for name in self.component_names:
-                result.append(getattr(self, name))
-                result.append(loc_lists[name])
-
-            return result
+            # position arrays are views into the table when index is None
+            return self.sample_locs.list_scan_args(self, index=index)
 
         
 
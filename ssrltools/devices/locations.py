@@ -0,0 +1,174 @@
+"""
+Array-backed sample location storage for multi-sample stages
+
+.. autosummary::
+
+   ~SampleLocTable
+
+"""
+import numpy as np
+
+
+class SampleLocTable(object):
+    """
+    Table of sample positions, one row per sample index and one column per
+    motor component.
+
+    Positions live in a single column-major float array, so every motor
+    column is contiguous and can be handed out without copying.  Rows are
+    addressed by sample index, which need not be contiguous.
+
+    Still reads like the old dict-of-dicts for single samples::
+
+        table[3]                 # {'stage_x': ..., 'stage_y': ..., ...}
+        table[3] = {'stage_x': 1.0, ...}
+
+    Bulk operations are vectorized::
+
+        table.set(theta=2.0, plate_x=0.1)          # every sample
+        table.set([1, 2, 3], stage_z=[0, 1, 2])    # a subset
+        table.get([4, 9], ['stage_x', 'stage_y'])  # (2, 2) array
+        bp.list_scan(dets, *table.list_scan_args(stage))
+    """
+
+    def __init__(self, columns, index=None, data=None):
+        self._columns = tuple(columns)
+        self._col_map = {name: j for j, name in enumerate(self._columns)}
+
+        if data is None:
+            n = 0 if index is None else len(index)
+            data = np.zeros((n, len(self._columns)))
+        self._data = np.asfortranarray(data, dtype=float)
+        if self._data.shape[1] != len(self._columns):
+            raise ValueError('data must have one column per motor name')
+
+        if index is None:
+            index = np.arange(len(self._data))
+        self._index = np.asarray(index, dtype=int)
+        if len(self._index) != len(self._data):
+            raise ValueError('index and data lengths do not match')
+        self._rows = {int(i): r for r, i in enumerate(self._index)}
+
+    @classmethod
+    def from_columns(cls, index=None, **columns):
+        """
+        Build a table from keyword columns.  Scalars are broadcast to
+        every sample.
+
+        usage:
+            SampleLocTable.from_columns(stage_x=x, stage_y=y, theta=0)
+        """
+        arrays = [np.atleast_1d(np.asarray(v, dtype=float))
+                  for v in columns.values()]
+        n = len(index) if index is not None else max(len(a) for a in arrays)
+        data = np.empty((n, len(arrays)), order='F')
+        for j, a in enumerate(arrays):
+            data[:, j] = a
+
+        return cls(columns.keys(), index=index, data=data)
+
+    @property
+    def columns(self):
+        '''Motor component names, in column order'''
+        return self._columns
+
+    @property
+    def index(self):
+        '''Sample indices, in row order'''
+        return self._index
+
+    @property
+    def data(self):
+        '''(num_samples, num_columns) position array, column-major'''
+        return self._data
+
+    def __len__(self):
+        return len(self._index)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __contains__(self, index):
+        return index in self._rows
+
+    def keys(self):
+        return [int(i) for i in self._index]
+
+    def values(self):
+        return [self[i] for i in self.keys()]
+
+    def items(self):
+        return [(i, self[i]) for i in self.keys()]
+
+    def __getitem__(self, index):
+        row = self._data[self._rows[index]]
+        return dict(zip(self._columns, row.tolist()))
+
+    def __setitem__(self, index, positions):
+        if index not in self._rows:
+            self._append(index)
+        row = self._rows[index]
+        for name, val in positions.items():
+            self._data[row, self._col_map[name]] = val
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} {len(self)} samples, "
+                f"columns={self._columns}>")
+
+    def _append(self, index):
+        self._data = np.asfortranarray(
+                        np.vstack([self._data,
+                                   np.zeros((1, len(self._columns)))]))
+        self._index = np.append(self._index, int(index))
+        self._rows[int(index)] = len(self._index) - 1
+
+    def rows(self, index=None):
+        """
+        Row positions for sample indices.  Returns a slice selecting every
+        row if index is None, so that results stay views.
+        """
+        if index is None:
+            return slice(None)
+        if np.isscalar(index):
+            index = [index]
+
+        return np.fromiter((self._rows[int(i)] for i in index), dtype=int,
+                           count=len(index))
+
+    def get(self, index=None, columns=None):
+        """
+        Return positions as an (N, k) array for the requested samples and
+        columns.  A view when both are None.
+        """
+        rows = self.rows(index)
+        if columns is None:
+            return self._data[rows]
+        cols = [self._col_map[name] for name in columns]
+
+        return self._data[rows][:, cols]
+
+    def column(self, name, index=None):
+        '''One motor column; a contiguous view when index is None'''
+        return self._data[self.rows(index), self._col_map[name]]
+
+    def set(self, index=None, **values):
+        """
+        Vectorized update of one or more columns for the given samples
+        (default all).  Values broadcast: a scalar sets every selected row.
+        """
+        rows = self.rows(index)
+        for name, val in values.items():
+            self._data[rows, self._col_map[name]] = val
+
+    def list_scan_args(self, device, index=None):
+        """
+        Format as motor, positions pairs for consumption by bp.list_scan.
+        Motors are looked up on device by column name.
+        """
+        rows = self.rows(index)
+        result = []
+        for j, name in enumerate(self._columns):
+            result.append(getattr(device, name))
+            result.append(self._data[rows, j])
+
+        return result
@@ -6,9 +6,12 @@ from pathlib import PurePath
 from .utils import makedirs
 
 from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
 import itertools
+import threading
 
 import h5py
+import numpy as np
 
 from ophyd.areadetector import (DetectorBase, CamBase,
                                 EpicsSignalWithRBV as SignalWithRBV)
@@ -21,8 +24,7 @@ from ophyd.areadetector.filestore_mixins import FileStorePluginBase
 from ophyd.areadetector.plugins import HDF5Plugin, PluginBase
 from ophyd.areadetector import ADBase
 from ophyd.device import (BlueskyInterface, Staged)
-from ophyd.sim import NullStatus  # TODO: remove after complete/collect are defined
-from ophyd.signal import set_and_wait
+from ophyd.status import SubscriptionStatus
 
 from ..handlers import Xspress3HDF5Handler
 from ..handlers.xspress3 import XRF_DATA_KEY
@@ -35,13 +37,29 @@ Repackaged and customized here for use at SSRL.
 
 hxntools pulled DeviceStatus from ophyd.ophydobj, which has been depricated
 """
+def wait_for_value(signal, predicate, timeout=None, settle_time=None):
+    '''Status that finishes when predicate(value) is true for signal
+
+    Driven by the signal's monitor callbacks, checked immediately against
+    the current value.  Fails with a timeout after timeout seconds.
+    '''
+    def check(*args, value, **kwargs):
+        return bool(predicate(value))
+
+    return SubscriptionStatus(signal, check, timeout=timeout,
+                              settle_time=settle_time)
+
 class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
     '''Xspress3 acquisition -> filestore'''
     num_capture_calc = Cpt(EpicsSignal, 'NumCapture_CALC')
     num_capture_calc_disable = Cpt(EpicsSignal, 'NumCapture_CALC.DISA')
     filestore_spec = Xspress3HDF5Handler.HANDLER_NAME
+    # the bluesky RunEngine only accepts single datum documents from
+    # collect_asset_docs; set False to hand out datum_page documents
+    unpack_datum_pages = True
 
-    def __init__(self, basename, *, config_time=0.5,
+    def __init__(self, basename, *, config_time=0, stage_timeout=10,
+                 unstage_timeout=15, wait_on_stage=False, datum_batch=None,
                  mds_key_format='{self.settings.name}_ch{chan}', parent=None,
                  **kwargs):
         super().__init__(basename, parent=parent, **kwargs)
@@ -61,23 +79,31 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
         # it was not needed for SRX and I could not guess what it did
         self._master = None
 
+        # readiness is waited for on PV monitors, config_time is only an
+        # optional extra settle time once capture reads back as on
         self._config_time = config_time
+        self.stage_timeout = stage_timeout
+        self.unstage_timeout = unstage_timeout
+        self.wait_on_stage = wait_on_stage
+        self.ready_status = None
         self.mds_keys = {chan: mds_key_format.format(self=self, chan=chan)
                          for chan in self.channels}
 
+        # 0 or None (default): one datum per channel per trigger, through
+        # the detector's generate_datum.  datum_batch > 0: one datum_page per
+        # datum_batch triggers, covering all channels (generate_datum_batch).
+        # The RunEngine flushes asset docs after every read, and pages are
+        # unpacked (unpack_datum_pages), so the documents are the same
+        # either way: batching only saves the per-channel plugin lookups.
+        self.datum_batch = datum_batch
+        self._chan_by_key = {}
+        self._batch = None      # (first frame, last frame, channels)
+
     def stop(self, success=False):
         ret = super().stop(success=success)
         self.capture.put(0)
         return ret
 
-    def kickoff(self):
-        # TODO
-        raise NotImplementedError()
-
-    def collect(self):
-        # TODO (hxn-specific implementation elsewhere)
-        raise NotImplementedError()
-
     def make_filename(self):
         fn, rp, write_path = super().make_filename()
         if self.parent.make_directories.get():
@@ -85,35 +111,96 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
         return fn, rp, write_path
 
     def unstage(self):
+        # wait for capture to read back as done, with a fail-safe: the RE
+        # would otherwise hang here, as we eat all SIGINT to ensure that
+        # cleanup happens in orderly manner.
+        done = wait_for_value(self.capture, lambda v: v == 0,
+                              timeout=self.unstage_timeout)
         try:
-            i = 0
-            # this needs a fail-safe, RE will now hang forever here
-            # as we eat all SIGINT to ensure that cleanup happens in
-            # orderly manner.
-            while self.capture.get() == 1:
-                i += 1
-                if (i % 50) == 0:
-                    logger.warning('Still capturing data .... waiting.')
-                ttime.sleep(0.1)
-                if i > 150:
-                    logger.warning('Still capturing data .... giving up.')
-                    self.capture.put(0)
-                    break
-
+            done.wait()
         except KeyboardInterrupt:
             logger.warning('Still capturing data .... interrupted.')
+        except Exception:
+            logger.warning('Still capturing data .... giving up.')
+            self.capture.put(0)
 
+        self.ready_status = None
+        self._batch = None
         return super().unstage()
 
+    def channel_num(self, key):
+        '''channel number of the channel named key'''
+        try:
+            return self._chan_by_key[key]
+        except KeyError:
+            # channels renamed, or first use: rebuild the map
+            self._chan_by_key = {getattr(self.parent, f'channel{j}').name: j
+                                 for j in self.channels}
+            return self._chan_by_key[key]
+
     def generate_datum(self, key, timestamp, datum_kwargs):
-        sn, n = next((f'channel{j}', j)
-                      for j in self.channels
-                      if getattr(self.parent, f'channel{j}').name == key)
+        n = self.channel_num(key)
         datum_kwargs.update({'frame': self.parent._abs_trigger_count,
-                             'channel': int(sn[7:])})
+                             'channel': n})
         self.mds_keys[n] = key
         super().generate_datum(key, timestamp, datum_kwargs)
 
+    def _datum_id(self, chan, frame):
+        return f'{self._resource_uid}/ch{chan}-{frame}'
+
+    def generate_datum_batch(self, keys, timestamp):
+        '''Datums for the current frame of the channels named in keys
+
+        Readings are recorded at once, for read(); the datums go out as one
+        datum_page per datum_batch triggers, or sooner when the asset docs
+        are collected.
+        '''
+        frame = self.parent._abs_trigger_count
+        chans = [self.channel_num(key) for key in keys]
+        for chan, key in zip(chans, keys):
+            self.mds_keys[chan] = key
+            reading = {'value': self._datum_id(chan, frame),
+                       'timestamp': timestamp}
+            self._datum_uids[key].append(reading)
+
+        if self._batch is not None and self._batch[2] != chans:
+            self._flush_batch()
+        if self._batch is None:
+            self._batch = (frame, frame + 1, chans)
+        else:
+            self._batch = (self._batch[0], frame + 1, chans)
+        if self._batch[1] - self._batch[0] >= self.datum_batch:
+            self._flush_batch()
+
+    def _flush_batch(self):
+        if self._batch is not None:
+            first, last, chans = self._batch
+            self._batch = None
+            self.generate_datum_page(first, last, chans)
+
+    def generate_datum_page(self, first, last, channels=None):
+        '''Cache one datum_page for frames first:last of every channel
+
+        Used when flying and for batched triggers, in place of one datum
+        per frame per channel.
+        Returns {data key: list of datum ids, one per frame}.
+        '''
+        if channels is None:
+            channels = self.channels
+        frames = list(range(first, last))
+        ids = OrderedDict()
+        page = {'resource': self._resource_uid,
+                'datum_id': [],
+                'datum_kwargs': {'frame': [], 'channel': []}}
+        for chan in channels:
+            chan_ids = [self._datum_id(chan, frame) for frame in frames]
+            ids[self.mds_keys[chan]] = chan_ids
+            page['datum_id'].extend(chan_ids)
+            page['datum_kwargs']['frame'].extend(frames)
+            page['datum_kwargs']['channel'].extend([chan] * len(frames))
+        self._asset_docs_cache.append(('datum_page', page))
+        return ids
+
     def stage(self):
         # if should external trigger
         ext_trig = self.parent.external_trig.get()
@@ -138,6 +225,8 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
 
         if ext_trig:
             logger.debug('Setting up external triggering')
+            # one acquisition arms every frame of the run
+            self.stage_sigs[self.settings.image_mode] = 'Multiple'
             self.stage_sigs[self.settings.trigger_mode] = 'TTL Veto Only'
             self.stage_sigs[self.settings.num_images] = total_capture
 
@@ -145,12 +234,17 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
             logger.debug('Setting up internal triggering')
             # self.settings.trigger_mode.put('Internal')
             # self.settings.num_images.put(1)
+            self.stage_sigs.pop(self.settings.image_mode, None)
             self.stage_sigs[self.settings.trigger_mode] = 'Internal'
             self.stage_sigs[self.settings.num_images] = spec_per_point
 
         self.stage_sigs[self.auto_save] = 'No'
         logger.debug('Configuring other filestore stuff')
 
+        # data keys of the run, as read in step scans: the channel names
+        self.mds_keys = {chan: getattr(self.parent, f'channel{chan}').name
+                         for chan in self.channels}
+
         logger.debug('Making the filename')
         filename, read_path, write_path = self.make_filename()
 
@@ -181,11 +275,19 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
         self._filestore_res = self._asset_docs_cache[-1][-1]
 
         # this gets auto turned off at the end.  But probably only with stream...
+        # Xspress3 needs a bit of time to configure itself: rather than a
+        # fixed sleep, watch for capture and the detector state to settle
+        self.ready_status = (
+            wait_for_value(self.capture, lambda v: v == 1,
+                           timeout=self.stage_timeout,
+                           settle_time=self._config_time or None) &
+            wait_for_value(self.settings.detector_state, lambda v: v == 0,
+                           timeout=self.stage_timeout))
         self.capture.put(1)
 
-        # Xspress3 needs a bit of time to configure itself...
-        # this does not play nice with the event loop :/
-        ttime.sleep(self._config_time)
+        if self.wait_on_stage:
+            self.ready_status.wait()
+        # otherwise XspressTrigger.trigger waits on ready_status
 
         return ret
 
@@ -211,10 +313,20 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
         return desc
 
     def collect_asset_docs(self):
+        self._flush_batch()
         items = list(self._asset_docs_cache)
         self._asset_docs_cache.clear()
-        for item in items:
-            yield item
+        for name, doc in items:
+            if name == 'datum_page' and self.unpack_datum_pages:
+                resource = doc['resource']
+                kwargs = doc['datum_kwargs']
+                for i, datum_id in enumerate(doc['datum_id']):
+                    yield 'datum', {'resource': resource,
+                                    'datum_id': datum_id,
+                                    'datum_kwargs': {k: v[i] for k, v
+                                                     in kwargs.items()}}
+            else:
+                yield name, doc
 
     def warmup(self):
         """
@@ -225,29 +337,40 @@ class Xspress3FileStore(FileStorePluginBase, HDF5Plugin):
                 ophyd.areadetector.plugins.HDF5Plugin
             Swapping "cam" with "settings"
         Taken from NSLS-II-TES implementaiton
+
+        Waits for the plugin to see a new array (array counter and size
+        readbacks) instead of sleeping.  Returns without acquiring if the
+        plugin already knows its array size.
         """
+        timeout = self.stage_timeout
+        settings = self.parent.settings
+        if self.width.get() > 0:
+            return
+
         print("warming up the HDF5 plugin...")
-        set_and_wait(self.enable, 1)
-        sigs = OrderedDict([(self.parent.settings.array_callbacks, 1),
-                    (self.parent.settings.image_mode, 'Single'),
-                    (self.parent.settings.trigger_mode, 'Internal'),
+        self.enable.set(1).wait(timeout)
+        sigs = OrderedDict([(settings.array_callbacks, 1),
+                    (settings.image_mode, 'Single'),
+                    (settings.trigger_mode, 'Internal'),
                     # just in case tha acquisition time is set very long...
-                    (self.parent.settings.acquire_time , 1),
-                    #(self.parent.settings.acquire_period, 1),
-                    (self.parent.settings.acquire, 1)])
+                    (settings.acquire_time , 1),
+                    #(settings.acquire_period, 1),
+                    ])
 
         original_vals = {sig: sig.get() for sig in sigs}
-
         for sig, val in sigs.items():
-            ttime.sleep(0.1) # Being overly cautios here
-            set_and_wait(sig, val)
+            sig.set(val).wait(timeout)
 
-        ttime.sleep(2)
+        count = settings.array_counter.get()
+        seen = (wait_for_value(settings.array_counter, lambda v: v > count,
+                               timeout=timeout) &
+                wait_for_value(self.width, lambda v: v > 0, timeout=timeout))
+        settings.acquire.put(1)
+        seen.wait()
 
         # Reset stage signals to original values
         for sig, val in reversed(list(original_vals.items())):
-            ttime.sleep(0.1) 
-            set_and_wait(sig, val)
+            sig.set(val).wait(timeout)
 
         print("done")
 
@@ -307,32 +430,221 @@ class Xspress3ROISettings(PluginBase):
                 return root
             root = root.parent
 
+class EnergyCalibration(object):
+    '''Bin number <-> energy (eV) conversion for one Xspress3 channel
+
+        ev = offset + gain * bin + quadratic * bin**2
+
+    Conversions work elementwise, like ufuncs, on scalars or arrays of any
+    shape (scalars give Python numbers back).  Energy axes are cached per
+    number of bins, so treat an instance as immutable: to recalibrate,
+    assign a new one to the channel's ``calibration``.
+
+    usage:
+        xs.channel1.calibration = EnergyCalibration(gain=9.98, offset=-3)
+        xs.channel1.calibration.ev_to_bin([6400, 7060])
+        plt.plot(xs.channel1.energy_axis(4096), spectrum)
+    '''
+    def __init__(self, gain=10., offset=0., quadratic=0.):
+        if gain <= 0 or quadratic < 0:
+            raise ValueError('energy must increase with bin number')
+        self._gain = float(gain)
+        self._offset = float(offset)
+        self._quadratic = float(quadratic)
+        self._axes = {}
+
+    @property
+    def gain(self):
+        return self._gain
+
+    @property
+    def offset(self):
+        return self._offset
+
+    @property
+    def quadratic(self):
+        return self._quadratic
+
+    def __repr__(self):
+        return (f'{self.__class__.__name__}(gain={self._gain!r}, '
+                f'offset={self._offset!r}, quadratic={self._quadratic!r})')
+
+    def bin_to_ev(self, bins):
+        '''energy (eV) at the bin numbers'''
+        b = np.asarray(bins, dtype=float)
+        ev = self._offset + b * (self._gain + self._quadratic * b)
+        return ev.item() if ev.ndim == 0 else ev
+
+    def ev_to_bin(self, ev):
+        '''bin numbers (int) holding the energies in eV'''
+        e = np.asarray(ev, dtype=float) - self._offset
+        if self._quadratic:
+            # positive root of quadratic*b**2 + gain*b - e, in the form
+            # that stays accurate for small quadratic terms
+            disc = np.maximum(self._gain ** 2 + 4 * self._quadratic * e, 0)
+            b = 2 * e / (self._gain + np.sqrt(disc))
+        else:
+            b = e / self._gain
+        # tolerate round-off at exact bin edges
+        b = np.floor(b + 1e-9).astype(int)
+        return b.item() if b.ndim == 0 else b
+
+    def energy_axis(self, num_bins):
+        '''read-only array of the energy of each of num_bins bins'''
+        axis = self._axes.get(num_bins)
+        if axis is None:
+            axis = self.bin_to_ev(np.arange(num_bins))
+            axis.flags.writeable = False
+            self._axes[num_bins] = axis
+        return axis
+
+DEFAULT_CALIBRATION = EnergyCalibration(gain=10.)
+
 class EvSignal(DerivedSignal):
-    '''A signal that converts a bin number into electron volts'''
+    '''A signal that converts a bin number into electron volts
+
+    Uses the calibration of the parent ROI's channel.
+    '''
     def __init__(self, parent_attr, *, parent=None, **kwargs):
         bin_signal = getattr(parent, parent_attr)
         super().__init__(derived_from=bin_signal, parent=parent, **kwargs)
 
-    def get(self, **kwargs):
-        bin_ = super().get(**kwargs)
-        return bin_to_ev(bin_)
+    @property
+    def calibration(self):
+        channel = getattr(self.parent, 'channel', None)
+        return getattr(channel, 'calibration', DEFAULT_CALIBRATION)
+
+    def forward(self, ev_value):
+        return self.calibration.ev_to_bin(ev_value)
 
-    def put(self, ev_value, **kwargs):
-        bin_value = ev_to_bin(ev_value)
-        return super().put(bin_value, **kwargs)
+    def inverse(self, bin_):
+        return self.calibration.bin_to_ev(bin_)
 
     def describe(self):
         desc = super().describe()
+        desc[self.name]['dtype'] = 'number'
         desc[self.name]['units'] = 'eV'
         return desc
 
-def ev_to_bin(ev):
+def ev_to_bin(ev, calibration=DEFAULT_CALIBRATION):
     '''Convert eV to bin number'''
-    return int(ev / 10)
-
-def bin_to_ev(bin_):
-    '''Convert bin number to eV'''
-    return int(bin_) * 10
+    return calibration.ev_to_bin(ev)
+
+def bin_to_ev(bin_, calibration=DEFAULT_CALIBRATION):
+    '''Convert bin number to eV
+
+    A scalar bin gives int eV, of the whole bin, as before calibrations;
+    arrays give float eV, see EnergyCalibration.bin_to_ev.
+    '''
+    if np.ndim(bin_) == 0:
+        return int(calibration.bin_to_ev(int(bin_)))
+    return calibration.bin_to_ev(bin_)
+
+def _channel_roi_sums(dataset, chan, bounds, max_points=None,
+                      chunk_size=1024):
+    '''All ROI sums for one channel, reading its spectra once
+
+    Reads dataset[frames, chan - 1, lo:hi] in blocks of chunk_size frames,
+    where lo:hi spans every ROI.  Each block is reduced once, into sums
+    between consecutive ROI edges; ROI sums are then differences of the
+    cumulative segment sums.  Overlapping ROIs cost nothing extra.
+    Returns a (num_points, num_rois) array.
+    '''
+    num_frames, _, num_bins = dataset.shape
+    if max_points is not None:
+        num_frames = min(num_frames, max_points)
+    bounds = np.clip(np.asarray(bounds, dtype=int).reshape(-1, 2),
+                     0, num_bins)
+    bounds[:, 1] = np.maximum(bounds[:, 0], bounds[:, 1])
+    lo, hi = bounds.min(), bounds.max()
+
+    acc = np.int64 if np.dtype(dataset.dtype).kind in 'iub' else np.float64
+    out = np.zeros((num_frames, len(bounds)), dtype=acc)
+    if hi == lo:
+        return out
+
+    # segment k covers bins edges[k]:edges[k+1], relative to lo
+    edges, inverse = np.unique(bounds - lo, return_inverse=True)
+    inverse = inverse.reshape(bounds.shape)
+    csum = np.zeros((min(chunk_size, num_frames), len(edges)), dtype=acc)
+    for start in range(0, num_frames, chunk_size):
+        stop = min(start + chunk_size, num_frames)
+        cs = csum[:stop - start]
+        block = dataset[start:stop, chan - 1, lo:hi]
+        for k in range(len(edges) - 1):
+            np.sum(block[:, edges[k]:edges[k + 1]], axis=1, dtype=acc,
+                   out=cs[:, k + 1])
+        np.cumsum(cs[:, 1:], axis=1, out=cs[:, 1:])
+        out[start:stop] = cs[:, inverse[:, 1]] - cs[:, inverse[:, 0]]
+    return out
+
+def cumsum_roi_sums(spectra, bounds, out=None):
+    '''Sums of (bin_low, bin_high) ROIs of spectra, shape (..., bins)
+
+    One cumulative sum along the bins, then one lookup for every ROI:
+    sum = csum[bin_high] - csum[bin_low], bin_high exclusive as in
+    xrf_roi_sums.  out, shape (..., bins + 1), is used for the cumulative
+    sum when given, to avoid allocating one per frame.
+    Returns an array of shape (..., num_rois).
+    '''
+    spectra = np.asarray(spectra)
+    num_bins = spectra.shape[-1]
+    bounds = np.clip(np.asarray(bounds, dtype=int).reshape(-1, 2),
+                     0, num_bins)
+    bounds[:, 1] = np.maximum(bounds[:, 0], bounds[:, 1])
+    if out is None:
+        acc = np.int64 if spectra.dtype.kind in 'iub' else np.float64
+        out = np.empty(spectra.shape[:-1] + (num_bins + 1,), dtype=acc)
+    out[..., 0] = 0
+    np.cumsum(spectra, axis=-1, dtype=out.dtype, out=out[..., 1:])
+    return out[..., bounds[:, 1]] - out[..., bounds[:, 0]]
+
+def xrf_roi_sums(dataset, rois, *, max_points=None, chunk_size=1024,
+                 max_workers=None):
+    '''Sum many (channel, bin_low, bin_high) ROIs over an MCA dataset
+
+    Each channel's spectra are read once, in chunks, and all of its ROIs
+    are reduced together (see _channel_roi_sums).  Bins follow
+    get_roi of Xspress3HDF5Handler: bin_low inclusive, bin_high exclusive.
+
+    Parameters
+    ----------
+    dataset : h5py.Dataset or array, shape (frames, channels, bins)
+    rois : sequence of (chan, bin_low, bin_high)
+        channels count from 1
+    max_points : int, optional
+        only sum the first max_points frames
+    chunk_size : int, optional
+        frames read per block, bounds memory use
+    max_workers : int, optional
+        process channels on this many threads, default serial
+
+    Returns
+    -------
+    list of arrays, one per ROI, in the order given
+    '''
+    rois = [tuple(int(v) for v in roi) for roi in rois]
+    by_chan = OrderedDict()
+    for i, (chan, bin_low, bin_high) in enumerate(rois):
+        by_chan.setdefault(chan, []).append((i, bin_low, bin_high))
+
+    def reduce(chan):
+        bounds = [(lo, hi) for _, lo, hi in by_chan[chan]]
+        return _channel_roi_sums(dataset, chan, bounds,
+                                 max_points=max_points,
+                                 chunk_size=chunk_size)
+
+    if max_workers and len(by_chan) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            sums = dict(zip(by_chan, pool.map(reduce, by_chan)))
+    else:
+        sums = {chan: reduce(chan) for chan in by_chan}
+
+    result = [None] * len(rois)
+    for chan, entries in by_chan.items():
+        for j, (i, _, _) in enumerate(entries):
+            result[i] = sums[chan][:, j]
+    return result
 
 class Xspress3ROI(ADBase):
     '''A configurable Xspress3 EPICS ROI'''
@@ -385,6 +697,9 @@ class Xspress3ROI(ADBase):
             bin_suffix = 'MCA_ROI{}'.format(roi_num)
 
         self.bin_suffix = bin_suffix
+        # last known (bin_low, bin_high, enable), saves reading them back
+        # on every configure
+        self._config = None
 
         super().__init__(prefix, parent=parent, read_attrs=read_attrs,
                          configuration_attrs=configuration_attrs, **kwargs)
@@ -413,36 +728,87 @@ class Xspress3ROI(ADBase):
         '''Clear and disable this ROI'''
         self.configure(0, 0)
 
-    def configure(self, ev_low, ev_high):
+    def known_config(self, refresh=False):
+        '''(bin_low, bin_high, enable), read from the IOC only when not
+        known yet or refresh is set'''
+        if refresh or self._config is None:
+            self._config = (self.bin_low.get(), self.bin_high.get(),
+                            self.enable.get())
+        return self._config
+
+    def configure(self, ev_low, ev_high, *, refresh=False, timeout=10):
         '''Configure the ROI with low and high eV
+
+        Converted to bins with the channel's calibration, see
+        configure_bins.
         Parameters
         ----------
-        ev_low : int
+        ev_low : float
             low electron volts for ROI
-        ev_high : int
+        ev_high : float
             high electron volts for ROI
+        refresh : bool, optional
+            read the current settings from the IOC, not the cache
+        timeout : float, optional
+            for the returned status
+
+        Returns
+        -------
+        status finishing when the readbacks match, None if nothing changed
         '''
-        ev_low = int(ev_low)
-        ev_high = int(ev_high)
-
         enable = 1 if ev_high > ev_low else 0
-        changed = any([self.ev_high.get() != ev_high,
-                       self.ev_low.get() != ev_low,
-                       self.enable.get() != enable])
-
-        if not changed:
-            return
+        bin_low, bin_high = self._channel.calibration.ev_to_bin(
+                                                        (ev_low, ev_high))
+        return self.configure_bins(bin_low, bin_high, enable,
+                                   refresh=refresh, timeout=timeout)
+
+    def configure_bins(self, bin_low, bin_high, enable, *, refresh=False,
+                       timeout=10):
+        '''Configure the ROI bins and enable
+
+        Compares against the last known settings, and puts only the ones
+        that changed, without waiting.  Parameters and return value as for
+        configure.
+        '''
+        new = (int(bin_low), int(bin_high), int(enable))
+        old = self.known_config(refresh=refresh)
+        if new == old:
+            return None
 
-        logger.debug('Setting up EPICS ROI: name=%s ev=(%s, %s) '
+        logger.debug('Setting up EPICS ROI: name=%s bins=(%s, %s) '
                      'enable=%s prefix=%s channel=%s',
-                     self.name, ev_low, ev_high, enable, self.prefix,
+                     self.name, new[0], new[1], new[2], self.prefix,
                      self._channel)
-        if ev_high <= self.ev_low.get():
-            self.ev_low.put(0)
-
-        self.ev_high.put(ev_high)
-        self.ev_low.put(ev_low)
-        self.enable.put(enable)
+        # the high limit can not go below the low one: clear low first
+        reset_low = 0 < old[0] and new[1] <= old[0]
+        changed = OrderedDict()
+        if new[1] != old[1]:
+            changed[self.bin_high] = new[1]
+        if new[0] != old[0] or reset_low:
+            changed[self.bin_low] = new[0]
+        if new[2] != old[2]:
+            changed[self.enable] = new[2]
+
+        # watch the readbacks before putting, see wait_for_value
+        status = None
+        for sig, value in changed.items():
+            st = wait_for_value(sig, lambda v, value=value: v == value,
+                                timeout=timeout)
+            status = st if status is None else status & st
+
+        if reset_low:
+            self.bin_low.put(0)
+        for sig, value in changed.items():
+            sig.put(value)
+
+        self._config = new
+
+        def forget(status):
+            if not status.success:
+                self._config = None
+
+        status.add_callback(forget)
+        return status
 
 def make_rois(rois):
     defn = OrderedDict()
@@ -471,9 +837,15 @@ class Xspress3Channel(ADBase):
 
     rois = DDC(make_rois(range(1, 8)))
     vis_enabled = Cpt(EpicsSignal, 'PluginControlVal')
+    # latest MCA spectrum of the channel, from its array plugin
+    spectrum = FC(EpicsSignalRO,
+                  '{self.parent.prefix}ARR{self.channel_num}:ArrayData',
+                  kind='omitted')
 
-    def __init__(self, prefix, *, channel_num=None, **kwargs):
+    def __init__(self, prefix, *, channel_num=None, calibration=None,
+                 **kwargs):
         self.channel_num = int(channel_num)
+        self.calibration = calibration or DEFAULT_CALIBRATION
 
         super().__init__(prefix, **kwargs)
 
@@ -482,6 +854,25 @@ class Xspress3Channel(ADBase):
         for roi in range(1, self.rois.num_rois.get() + 1):
             yield getattr(self.rois, 'roi{:02d}'.format(roi))
 
+    def energy_axis(self, num_bins=4096):
+        '''energy (eV) of each MCA bin, from the channel calibration'''
+        return self.calibration.energy_axis(num_bins)
+
+    def get_roi(self, index):
+        '''The Xspress3ROI with index, counting from 1'''
+        if index <= 0 or index > self.rois.num_rois.get():
+            raise ValueError(f'ROI index {index} out of range, '
+                             f'1-{self.rois.num_rois.get()}')
+        return getattr(self.rois, 'roi{:02d}'.format(index))
+
+    def name_roi(self, roi, name):
+        '''Name roi and its signals after the unformatted name'''
+        roi_name = self.roi_name_format.format(self=self, roi_name=name)
+        roi.name = roi_name
+        roi.value.name = roi_name
+        roi.value_sum.name = self.roi_sum_name_format.format(self=self,
+                                                             roi_name=name)
+
     def set_roi(self, index, ev_low, ev_high, *, name=None):
         '''Set specified ROI to (ev_low, ev_high)
         Parameters
@@ -500,17 +891,12 @@ class Xspress3Channel(ADBase):
         if isinstance(index, Xspress3ROI):
             roi = index
         else:
-            if index <= 0:
-                raise ValueError('ROI index starts from 1')
-            roi = list(self.all_rois)[index - 1]
+            roi = self.get_roi(index)
 
-        roi.configure(ev_low, ev_high)
+        status = roi.configure(ev_low, ev_high)
         if name is not None:
-            roi_name = self.roi_name_format.format(self=self, roi_name=name)
-            roi.name = roi_name
-            roi.value.name = roi_name
-            roi.value_sum.name = self.roi_sum_name_format.format(self=self,
-                                                                 roi_name=name)
+            self.name_roi(roi, name)
+        return status
 
     def clear_all_rois(self):
         '''Clear all ROIs'''
@@ -531,10 +917,19 @@ class XspressTrigger(BlueskyInterface):
         self._status = None
         self._acquisition_signal = self.settings.acquire
         self._abs_trigger_count = 0
+        self._datum_keys = []
+        self._batched_stores = []
 
     def stage(self):
         self._abs_trigger_count = 0
         self._acquisition_signal.subscribe(self._acquire_changed)
+        # fixed for the run: the channels read, and file plugins batching
+        # their datums (see Xspress3FileStore.generate_datum_batch)
+        self._datum_keys = [getattr(self, sn).name for sn in self.read_attrs
+                            if sn.startswith('channel') and '.' not in sn]
+        self._batched_stores = [
+            dev for dev in (getattr(self, attr) for attr in self._sub_devices)
+            if getattr(dev, 'datum_batch', None)]
         return super().stage()
 
     def unstage(self):
@@ -548,24 +943,195 @@ class XspressTrigger(BlueskyInterface):
             return
         if (old_value == 1) and (value == 0):
             # Negative-going edge means an acquisition just finished.
-            self._status._finished()
+            status, self._status = self._status, None
+            status._finished()
+
+    def _ready_status(self):
+        '''combined ready_status of staged file plugins, None if all ready'''
+        pending = None
+        for attr in self._sub_devices:
+            st = getattr(getattr(self, attr), 'ready_status', None)
+            if st is not None and not (st.done and st.success):
+                pending = st if pending is None else pending & st
+        return pending
+
+    def _start_acquire(self):
+        self.settings.erase.put(1)
+        self._acquisition_signal.put(1, wait=False)
 
     def trigger(self):
         if self._staged != Staged.yes:
             raise RuntimeError("not staged")
 
-        self._status = DeviceStatus(self)
-        self.settings.erase.put(1)
-        self._acquisition_signal.put(1, wait=False)
+        self._status = status = DeviceStatus(self)
+        ready = self._ready_status()
+        if ready is None:
+            self._start_acquire()
+        else:
+            # staging still settling: acquire as soon as the IOC is ready
+            def start_when_ready(ready):
+                if ready.success:
+                    self._start_acquire()
+                else:
+                    status._finished(success=False)
+
+            ready.add_callback(start_when_ready)
         trigger_time = ttime.time()
 
-        for sn in self.read_attrs:
-            if sn.startswith('channel') and '.' not in sn:
-                ch = getattr(self, sn)
-                self.dispatch(ch.name, trigger_time)
+        if self._batched_stores:
+            # as generate_datum: disabled plugins write nothing to point at
+            for fs in self._batched_stores:
+                if fs.enable.get():
+                    fs.generate_datum_batch(self._datum_keys, trigger_time)
+        else:
+            # one datum per channel, through every file plugin
+            for key in self._datum_keys:
+                self.generate_datum(key, trigger_time, {})
 
         self._abs_trigger_count += 1
-        return self._status
+        # not self._status: a short acquisition may be over already
+        return status
+
+class XspressFlyer(XspressTrigger):
+    """Fly mode mixin: arm every frame once, collect frames as they land
+
+    Set external_trig, total_points and spectra_per_point before staging;
+    the file plugin then arms total_points * spectra_per_point frames.
+    kickoff starts the one acquisition.  Each NumCaptured update adds a
+    datum_page for the frames written since the last update, and complete
+    finishes once every frame is captured.  collect can be called while
+    flying, it yields an event per frame for the frames landed so far.
+
+    Step-mode trigger still works when not flying.  complete fails after
+    complete_timeout seconds, by default the time the frames take at
+    max(AcquireTime, AcquirePeriod), doubled, plus complete_margin.
+
+    usage:
+        class MyXspress3(XspressFlyer, Xspress3Detector):
+            ...
+        xs.external_trig.put(True)
+        xs.total_points.put(1000)
+        RE(bpp.stage_wrapper(bp.fly([xs]), [xs]))
+    """
+    fly_stream_name = 'primary'
+    kickoff_timeout = 10
+    complete_timeout = None     # None: from the number of frames
+    complete_margin = 30
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._fly_lock = threading.RLock()
+        self._fly_events = deque()
+        self._fly_collectable = 0
+        self._fly_frames = 0
+        self._fly_target = 0
+        self._fly_done = None
+        self._fly_store = None
+
+    def _file_store(self):
+        for attr in self._sub_devices:
+            dev = getattr(self, attr)
+            if isinstance(dev, Xspress3FileStore):
+                return dev
+        raise RuntimeError(f'{self.name} has no Xspress3FileStore')
+
+    def _complete_timeout(self, frames):
+        if self.complete_timeout is not None:
+            return self.complete_timeout
+        frame_time = max(self.settings.acquire_time.get(),
+                         self.settings.acquire_period.get())
+        return 2 * frames * frame_time + self.complete_margin
+
+    def kickoff(self):
+        if self._staged != Staged.yes:
+            raise RuntimeError("not staged")
+        if not self.external_trig.get():
+            raise RuntimeError("fly mode needs external_trig set before "
+                               "staging")
+
+        fs = self._fly_store = self._file_store()
+        with self._fly_lock:
+            self._fly_events.clear()
+            self._fly_collectable = 0
+            self._fly_frames = 0
+            self._fly_target = (self.total_points.get() *
+                                self.spectra_per_point.get())
+            self._fly_done = DeviceStatus(
+                self, timeout=self._complete_timeout(self._fly_target))
+        fs.num_captured.subscribe(self._frames_landed, run=False)
+
+        # done once the IOC reports it is acquiring
+        status = DeviceStatus(self)
+
+        def armed(st):
+            status._finished(success=st.success)
+
+        def start(ready=None):
+            if ready is not None and not ready.success:
+                status._finished(success=False)
+                return
+            wait_for_value(self.settings.acquire, lambda v: v == 1,
+                           timeout=self.kickoff_timeout).add_callback(armed)
+            self._acquisition_signal.put(1, wait=False)
+
+        ready = self._ready_status()
+        if ready is None:
+            start()
+        else:
+            ready.add_callback(start)
+        return status
+
+    def _frames_landed(self, value=None, **kwargs):
+        '''NumCaptured monitor: datums and events for the new frames'''
+        with self._fly_lock:
+            landed = min(int(value), self._fly_target)
+            first = self._fly_frames
+            if landed <= first:
+                return
+            ids = self._fly_store.generate_datum_page(first, landed)
+            now = ttime.time()
+            keys = list(ids)
+            for i in range(landed - first):
+                self._fly_events.append(
+                    {'time': now,
+                     'data': {key: ids[key][i] for key in keys},
+                     'timestamps': dict.fromkeys(keys, now),
+                     'filled': dict.fromkeys(keys, False)})
+            self._fly_frames = landed
+            self._abs_trigger_count = landed
+            done = landed >= self._fly_target
+        if done and not self._fly_done.done:
+            self._fly_done._finished()
+
+    def complete(self):
+        if self._fly_done is None:
+            raise RuntimeError("not kicked off")
+        return self._fly_done
+
+    def describe_collect(self):
+        return {self.fly_stream_name: self._file_store().describe()}
+
+    def collect_asset_docs(self):
+        # only events whose datums have been handed out may be collected
+        with self._fly_lock:
+            docs = list(super().collect_asset_docs())
+            self._fly_collectable = len(self._fly_events)
+        yield from docs
+
+    def collect(self):
+        with self._fly_lock:
+            events = [self._fly_events.popleft()
+                      for _ in range(self._fly_collectable)]
+            self._fly_collectable = 0
+        yield from events
+
+    def unstage(self):
+        if self._fly_store is not None:
+            self._fly_store.num_captured.clear_sub(self._frames_landed)
+            self._fly_store = None
+        if self._fly_done is not None and not self._fly_done.done:
+            self._fly_done._finished(success=False)
+        return super().unstage()
 
 class Xspress3Detector(DetectorBase): # XspressTrigger also subclassed normally
     settings = Cpt(Xspress3DetectorSettings, '')
@@ -631,17 +1197,93 @@ class Xspress3Detector(DetectorBase): # XspressTrigger also subclassed normally
             if roi.enable.get():
                 yield roi
 
-    def read_hdf5(self, fn, *, rois=None, max_retries=2):
+    def configure_rois(self, table, *, refresh=False, wait=True,
+                       timeout=10):
+        '''Configure many ROIs at once
+
+        Each row is compared with the ROI's last known settings (read from
+        the IOC on first use, or with refresh), and only the changed
+        settings are put.  All puts go out before anything is waited on.
+
+        Parameters
+        ----------
+        table : iterable of (channel, roi, ev_low, ev_high, name)
+            channel and roi count from 1; name may be None, or left off,
+            to keep the ROI name
+        refresh : bool, optional
+            re-read the current settings of every ROI in the table
+        wait : bool, optional
+            wait for every readback to match before returning
+        timeout : float, optional
+            for the combined status
+
+        Returns
+        -------
+        status, finished once every changed ROI reads back as set
+        '''
+        by_chan = OrderedDict()
+        for row in table:
+            name = row[4] if len(row) > 4 else None
+            by_chan.setdefault(int(row[0]), []).append(
+                (int(row[1]), row[2], row[3], name))
+
+        status = None
+        for chan, rows in by_chan.items():
+            channel = self._channels[chan]
+            # convert the whole channel's table at once
+            evs = np.array([(lo, hi) for _, lo, hi, _ in rows], dtype=float)
+            bins = channel.calibration.ev_to_bin(evs).tolist()
+            enables = (evs[:, 1] > evs[:, 0]).tolist()
+            for (index, _, _, name), (lo, hi), enable in zip(rows, bins,
+                                                              enables):
+                roi = channel.get_roi(index)
+                st = roi.configure_bins(lo, hi, enable, refresh=refresh,
+                                        timeout=timeout)
+                if name is not None:
+                    channel.name_roi(roi, name)
+                if st is not None:
+                    status = st if status is None else status & st
+
+        if status is None:
+            status = DeviceStatus(self)
+            status._finished()
+        if wait:
+            status.wait(timeout)
+        return status
+
+    def read_hdf5(self, fn, *, rois=None, max_retries=2, chunk_size=1024,
+                  max_workers=None):
         '''Read ROI data from an HDF5 file using the current ROI configuration
+
+        ROI bounds are read from the IOC once, up front.  Each channel's
+        spectra are then read once, in chunks of frames, and all of its
+        ROIs summed together (see xrf_roi_sums).
+
         Parameters
         ----------
         fn : str
             HDF5 filename to load
         rois : sequence of Xspress3ROI instances, optional
+        chunk_size : int, optional
+            frames read per block
+        max_workers : int, optional
+            process channels on a thread pool of this size
         '''
         if rois is None:
             rois = self.enabled_rois
 
+        # snapshot the ROI configuration: one get per bound
+        bounds = [(roi, roi.bin_low.get(), roi.bin_high.get())
+                  for roi in rois]
+
+        # energies of the bounds, one conversion per channel
+        chans = np.array([roi.channel_num for roi, _, _ in bounds], dtype=int)
+        ev_bounds = np.zeros((len(bounds), 2))
+        for chan in np.unique(chans):
+            mask = chans == chan
+            ev_bounds[mask] = self._channels[chan].calibration.bin_to_ev(
+                [(lo, hi) for (_, lo, hi), m in zip(bounds, mask) if m])
+
         num_points = self.settings.num_images.get()
         if isinstance(fn, h5py.File):
             hdf = fn
@@ -650,19 +1292,152 @@ class Xspress3Detector(DetectorBase): # XspressTrigger also subclassed normally
 
         RoiTuple = Xspress3ROI.get_device_tuple()
 
-        handler = Xspress3HDF5Handler(hdf, key=self.data_key)
-        for roi in self.enabled_rois:
-            roi_data = handler.get_roi(chan=roi.channel_num,
-                                       bin_low=roi.bin_low.get(),
-                                       bin_high=roi.bin_high.get(),
-                                       max_points=num_points)
-
-            roi_info = RoiTuple(bin_low=roi.bin_low.get(),
-                                bin_high=roi.bin_high.get(),
-                                ev_low=roi.ev_low.get(),
-                                ev_high=roi.ev_high.get(),
-                                value=roi_data,
-                                value_sum=None,
-                                enable=None)
-
-            yield roi.name, roi_info
\ No newline at end of file
+        try:
+            sums = xrf_roi_sums(hdf[self.data_key],
+                                [(roi.channel_num, lo, hi)
+                                 for roi, lo, hi in bounds],
+                                max_points=num_points, chunk_size=chunk_size,
+                                max_workers=max_workers)
+        finally:
+            if hdf is not fn:
+                hdf.close()
+
+        for (roi, bin_low, bin_high), (ev_low, ev_high), roi_data in zip(
+                bounds, ev_bounds.tolist(), sums):
+            # newer ophyd adds fields (configuration_names): default to None
+            roi_info = RoiTuple(**dict(dict.fromkeys(RoiTuple._fields),
+                                       bin_low=bin_low,
+                                       bin_high=bin_high,
+                                       ev_low=ev_low,
+                                       ev_high=ev_high,
+                                       value=roi_data))
+
+            yield roi.name, roi_info
+
+    def live_roi_sums(self, rois=None):
+        '''LiveRoiSums of rois (default: the enabled ones)'''
+        return LiveRoiSums(self, rois=rois)
+
+class LiveRoiSums(object):
+    '''ROI sums of each new spectrum, computed in-process
+
+    Subscribes to the spectrum of every channel with a ROI, and on each
+    update computes all of that channel's ROIs at once (cumsum_roi_sums),
+    into one Signal per ROI.  ROI bounds come from the ROIs' cached
+    settings (see Xspress3ROI.known_config), so no extra PV traffic.
+
+    The signals can be monitored, or the object read like a device.
+    frames counts the spectra of the lowest numbered channel followed, so
+    goes up once per frame however many channels there are.  Updates
+    carrying the timestamp of the spectrum already seen (the current
+    value, resent as the monitors start) are skipped.
+
+    usage:
+        live = xs.live_roi_sums()
+        live.start()
+        RE(bp.scan([xs, live], motor, 0, 1, 11))  # or bps.monitor(sig)
+        live.stop()
+
+    PARAMETERS
+
+    detector : Xspress3Detector
+    rois : sequence of Xspress3ROI, optional
+        default: the enabled ROIs, when started
+    name : str, optional
+        default: detector name + '_live'
+    '''
+
+    def __init__(self, detector, rois=None, name=None):
+        self.detector = detector
+        self.name = name or detector.name + '_live'
+        self.parent = None
+        self._rois = rois
+        self._by_chan = OrderedDict()    # chan -> (bounds, signals)
+        self._buffers = {}
+        self.signals = OrderedDict()
+        self.frames = Signal(name=self.name + '_frames', value=0)
+        self._frame_chan = None     # its updates count the frames
+        self._seen = {}             # chan -> timestamp of the last spectrum
+        self._running = False
+
+    def __repr__(self):
+        return (f'<{self.__class__.__name__} {self.name!r} '
+                f'rois={list(self.signals)}>')
+
+    def _configure(self, refresh=False):
+        rois = self._rois
+        if rois is None:
+            rois = [roi for roi in self.detector.all_rois
+                    if roi.known_config(refresh=refresh)[2]]
+        by_chan = OrderedDict()
+        for roi in rois:
+            bin_low, bin_high, _ = roi.known_config(refresh=refresh)
+            key = roi.value.name + '_live'
+            sig = self.signals.get(key) or Signal(name=key, value=0)
+            bounds, sigs = by_chan.setdefault(roi.channel_num, ([], []))
+            bounds.append((bin_low, bin_high))
+            sigs.append(sig)
+        self._by_chan = OrderedDict(
+            (chan, (np.array(bounds, dtype=int), sigs))
+            for chan, (bounds, sigs) in by_chan.items())
+        self.signals = OrderedDict((sig.name, sig)
+                                   for _, sigs in self._by_chan.values()
+                                   for sig in sigs)
+        self._frame_chan = min(self._by_chan, default=None)
+
+    def start(self, refresh=False):
+        '''pick up the ROI bounds, and follow the channel spectra'''
+        self.stop()
+        self._configure(refresh=refresh)
+        self.frames.put(0)
+        for chan in self._by_chan:
+            spectrum = self.detector.channels[chan].spectrum
+            spectrum.get()
+            self._seen[chan] = spectrum.timestamp
+            spectrum.subscribe(self._spectrum_changed, run=False)
+        self._running = True
+
+    def stop(self):
+        if self._running:
+            for chan in self._by_chan:
+                self.detector.channels[chan].spectrum.clear_sub(
+                    self._spectrum_changed)
+        self._running = False
+
+    def _spectrum_changed(self, value=None, timestamp=None, obj=None,
+                          **kwargs):
+        chan = obj.parent.channel_num
+        if timestamp is not None and timestamp == self._seen.get(chan):
+            return
+        self._seen[chan] = timestamp
+        bounds, sigs = self._by_chan[chan]
+        spectrum = np.asarray(value)
+        buf = self._buffers.get(chan)
+        if buf is None or len(buf) != spectrum.shape[-1] + 1:
+            acc = np.int64 if spectrum.dtype.kind in 'iub' else np.float64
+            buf = self._buffers[chan] = np.empty(spectrum.shape[-1] + 1,
+                                                 dtype=acc)
+        sums = cumsum_roi_sums(spectrum, bounds, out=buf).tolist()
+        for sig, total in zip(sigs, sums):
+            sig.put(total, timestamp=timestamp)
+        if chan == self._frame_chan:
+            self.frames.put(self.frames.get() + 1, timestamp=timestamp)
+
+    # enough of the bluesky readable interface to be read in plans
+    def read(self):
+        res = OrderedDict()
+        for sig in self.signals.values():
+            res.update(sig.read())
+        return res
+
+    def describe(self):
+        res = OrderedDict()
+        for sig in self.signals.values():
+            res.update(sig.describe())
+        return res
+
+    def read_configuration(self):
+        return OrderedDict()
+
+    def describe_configuration(self):
+        return OrderedDict()
@@ -4,7 +4,10 @@ Bluesky callback that writes SPEC data files
 .. autosummary::
    
    ~SpecWriterCallback
+   ~SpecFileIndex
+   ~ColumnBuffer
    ~spec_comment
+   ~bulk_events_to_pages
 
 EXAMPLE : the :ref:`specfile_example() <example_specfile>` writes one or more scans to a SPEC data file using a jupyter notebook.
 
@@ -53,11 +56,14 @@ EXAMPLE : use as writer from Databroker with customizations::
 from collections import OrderedDict
 from datetime import datetime
 import getpass
+import json
 import logging
 import os
 import socket
 import time
 
+import numpy as np
+
 
 logger = logging.getLogger(__name__).addHandler(logging.NullHandler())
 
@@ -76,6 +82,44 @@ logger = logging.getLogger(__name__).addHandler(logging.NullHandler())
 
 SPEC_TIME_FORMAT = "%a %b %d %H:%M:%S %Y"
 SCAN_ID_RESET_VALUE = 0
+SPEC_INDEX_SUFFIX = ".idx"
+
+def _text_size(text):
+    """bytes text occupies once written in text mode (newline translation)"""
+    return len(text.encode()) + text.count("\n") * (len(os.linesep) - 1)
+
+def _event_as_page(doc):
+    """repackage one *event* document as an *event_page* of length 1"""
+    return dict(
+        descriptor=doc["descriptor"],
+        time=[doc["time"]],
+        uid=[doc.get("uid")],
+        seq_num=[doc.get("seq_num")],
+        data={k: [v] for k, v in doc["data"].items()},
+        timestamps={k: [v] for k, v in doc.get("timestamps", {}).items()},
+        )
+
+def bulk_events_to_pages(doc):
+    """
+    transpose a *bulk_events* document into one *event_page* per descriptor
+
+    Yields the pages; descriptors with no events are skipped.  Lets
+    callbacks handle the deprecated *bulk_events* documents the same way
+    as *event_page* documents.
+    """
+    for descriptor, events in doc.items():
+        if len(events) == 0:
+            continue
+        yield dict(
+            descriptor=descriptor,
+            time=[ev["time"] for ev in events],
+            uid=[ev.get("uid") for ev in events],
+            seq_num=[ev.get("seq_num") for ev in events],
+            data={k: [ev["data"][k] for ev in events] 
+                  for k in events[0]["data"]},
+            timestamps={k: [ev["timestamps"][k] for ev in events] 
+                        for k in events[0].get("timestamps", {})},
+            )
 
 def _rebuild_scan_command(doc):
     """
@@ -131,12 +175,306 @@ def _rebuild_scan_command(doc):
     return f"{scan_id}  {cmd}"
 
 
+class SpecFileIndex(object):
+    """
+    sidecar index of the scans in a SPEC data file
+
+    Keeps the scan id, uid and byte offset of the ``#S`` line of every
+    scan in a small JSON-lines file next to the SPEC file
+    (``<filename>.idx``).  One line is appended per scan written, so 
+    duplicate-uid checks, the highest scan id and random access to a scan
+    do not need to read the SPEC file.
+
+    Each entry also records the SPEC file size after that scan was written.
+    If the index is missing, or the recorded size does not match the SPEC 
+    file (written by another program, or a scan that never finished), the 
+    index is rebuilt in memory with one pass over the SPEC file.  Reading
+    never changes the sidecar: it is rewritten, if stale, when the first
+    scan is appended.
+
+    .. autosummary::
+       
+       ~append
+       ~is_current
+       ~rebuild
+       ~offset
+       ~read_scan
+       ~max_scan_id
+    """
+
+    def __init__(self, spec_filename, index_filename=None):
+        self.spec_filename = spec_filename
+        self.index_filename = index_filename or (spec_filename + SPEC_INDEX_SUFFIX)
+        self._reset()
+        self.load()
+
+    def _reset(self):
+        self.entries = []           # [{scan_id, uid, offset, end}, ...]
+        self._by_uid = {}
+        self._by_scan_id = {}       # most recent scan with this id
+        self._max_scan_id = 0
+        self._saved = False         # sidecar holds all of entries
+
+    def _add(self, entry):
+        self.entries.append(entry)
+        if entry["uid"]:
+            self._by_uid[entry["uid"]] = entry
+        self._by_scan_id[entry["scan_id"]] = entry
+        self._max_scan_id = max(self._max_scan_id, entry["scan_id"])
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, uid):
+        return uid in self._by_uid
+
+    @property
+    def max_scan_id(self):
+        """highest scan number in the SPEC file (0 if none)"""
+        return self._max_scan_id
+
+    def load(self):
+        """read the index, rebuilding it (in memory) if missing or stale"""
+        logger = logging.getLogger(__name__)
+        self._reset()
+        if not os.path.exists(self.spec_filename):
+            return      # any sidecar is stale: ignore it
+
+        if os.path.exists(self.index_filename):
+            with open(self.index_filename) as f:
+                for line in f:
+                    if line.strip():
+                        self._add(json.loads(line))
+            if self.is_current():
+                self._saved = True
+                return
+            logger.info("SPEC index %s is stale, rebuilding", self.index_filename)
+        self.rebuild()
+
+    def is_current(self):
+        """does the last entry match the end of the SPEC file?"""
+        size = os.path.getsize(self.spec_filename)
+        if len(self.entries) == 0:
+            return False
+        last = self.entries[-1]
+        if last["end"] != size:
+            return False
+        with open(self.spec_filename, "rb") as f:
+            f.seek(last["offset"])
+            words = f.readline().split()
+        return words[:2] == [b"#S", str(last["scan_id"]).encode()]
+
+    def rebuild(self):
+        """re-index the SPEC file with one pass over its lines, in memory"""
+        self._reset()
+        entry = None
+        offset = 0
+        content_end = 0     # end of the last non-blank line
+        with open(self.spec_filename, "rb") as f:
+            for line in f:
+                if line.startswith(b"#S ") and len(line.split()) > 1:
+                    if entry is not None:
+                        entry["end"] = content_end
+                    entry = dict(scan_id=int(line.split()[1]), uid=None, 
+                                 offset=offset, end=None)
+                    self._add(entry)
+                elif entry is not None and line.startswith(b"#MD uid = "):
+                    entry["uid"] = line.split()[-1].decode()
+                    self._by_uid[entry["uid"]] = entry
+                offset += len(line)
+                if line.strip():
+                    content_end = offset
+        if entry is not None:
+            entry["end"] = offset
+
+    def append(self, scan_id, uid, offset, end):
+        """
+        record a scan just written to the SPEC file
+
+        The first append also replaces a missing or stale sidecar.
+        """
+        entry = dict(scan_id=int(scan_id), uid=uid, offset=offset, end=end)
+        self._add(entry)
+        if self._saved:
+            entries, mode = [entry], "a"
+        else:
+            entries, mode = self.entries, "w"
+        with open(self.index_filename, mode) as f:
+            for entry in entries:
+                f.write(json.dumps(entry) + "\n")
+        self._saved = True
+
+    def offset(self, key):
+        """byte offset of the ``#S`` line, by scan id or uid"""
+        entry = self._by_uid.get(key) or self._by_scan_id[key]
+        return entry["offset"]
+
+    def read_scan(self, key):
+        """return the text of one scan, by scan id or uid"""
+        entry = self._by_uid.get(key) or self._by_scan_id[key]
+        with open(self.spec_filename, "rb") as f:
+            f.seek(entry["offset"])
+            buf = f.read(entry["end"] - entry["offset"])
+        return buf.decode()
+
+
+class ColumnBuffer(object):
+    """
+    growable NumPy column store, one array per data key
+
+    Whole columns are appended at once with ``extend()``; all columns 
+    always hold the same number of rows.  Arrays grow by doubling, so 
+    appends are amortized O(1) per row.  Numeric columns keep a numeric 
+    dtype (promoted if later values need it); text and array-valued 
+    columns are stored as object arrays.
+
+    Reads like the ``OrderedDict`` of lists it replaces: ``keys()``, 
+    ``values()``, ``items()`` and ``buf[key]`` (a view of the filled rows).
+    """
+
+    def __init__(self, keys=(), capacity=256):
+        self._arrays = OrderedDict((k, None) for k in keys)
+        self._capacity = capacity
+        self._len = 0
+        self._pending = []      # rows from append_row(), not yet in arrays
+
+    def __len__(self):
+        return self._len + len(self._pending)
+
+    def __contains__(self, key):
+        return key in self._arrays
+
+    def __getitem__(self, key):
+        self._consolidate()
+        arr = self._arrays[key]
+        if arr is None:
+            return np.zeros(0)
+        return arr[:self._len]
+
+    def __repr__(self):
+        return (f"<{self.__class__.__name__} {len(self)} rows, "
+                f"keys={list(self._arrays)}>")
+
+    def keys(self):
+        return self._arrays.keys()
+
+    def values(self):
+        return [self[k] for k in self._arrays]
+
+    def items(self):
+        return [(k, self[k]) for k in self._arrays]
+
+    def add_keys(self, keys):
+        """add (empty) columns, back-filled with 0 if rows exist"""
+        self._consolidate()
+        for k in keys:
+            if k not in self._arrays:
+                self._arrays[k] = None
+                if self._len > 0:
+                    self._store(k, np.zeros(self._len, dtype=int), 0)
+
+    def clear(self):
+        """drop all rows, keeping keys and allocated arrays for reuse"""
+        self._len = 0
+        self._pending = []
+
+    def rows(self, start=0, stop=None):
+        """iterate over rows as tuples of python values, in key order"""
+        return zip(*[self[k][start:stop].tolist() for k in self._arrays])
+
+    def append_row(self, row, fill=0):
+        """
+        append one row given as a dict of values
+
+        Rows are kept as plain tuples until the next read or ``extend()``,
+        then moved into the arrays in one vectorized step.  Keeps the
+        per-event cost close to appending to lists.
+        """
+        if not row.keys() <= self._arrays.keys():
+            for k in row:
+                if k not in self._arrays:
+                    raise KeyError(f"unexpected data key {k}")
+        self._pending.append(tuple(row.get(k, fill) for k in self._arrays))
+
+    def _consolidate(self):
+        if self._pending:
+            pending, self._pending = self._pending, []
+            self._extend(dict(zip(self._arrays, zip(*pending))), 
+                         len(pending), 0)
+
+    def extend(self, columns, n=None, fill=0):
+        """
+        append n rows given as a dict of columns (sequences of length n)
+
+        Columns missing from the dict are filled with fill.  Keys not
+        already in the buffer raise KeyError.
+        """
+        for k in columns:
+            if k not in self._arrays:
+                raise KeyError(f"unexpected data key {k}")
+        if n is None:
+            n = len(next(iter(columns.values())))
+        self._consolidate()
+        self._extend(columns, n, fill)
+
+    def _extend(self, columns, n, fill):
+        if n == 0:
+            return
+        self._reserve(self._len + n)
+        for k in self._arrays:
+            if k in columns:
+                vals = self._as_column(columns[k], n)
+            else:
+                vals = np.full(n, fill)
+            self._store(k, vals, self._len)
+        self._len += n
+
+    @staticmethod
+    def _as_column(values, n):
+        vals = np.asarray(values)
+        if vals.dtype.kind in "OSU" or vals.ndim != 1:
+            # text, or one array per row: keep the python objects
+            vals = np.empty(n, dtype=object)
+            for i, v in enumerate(values):
+                vals[i] = v
+        return vals
+
+    def _reserve(self, size):
+        if size <= self._capacity:
+            return
+        while self._capacity < size:
+            self._capacity *= 2
+        for k, arr in self._arrays.items():
+            if arr is not None:
+                new = np.empty(self._capacity, dtype=arr.dtype)
+                new[:self._len] = arr[:self._len]
+                self._arrays[k] = new
+
+    def _store(self, key, vals, start):
+        arr = self._arrays[key]
+        if arr is None:
+            arr = np.empty(self._capacity, dtype=vals.dtype)
+        elif arr.dtype != vals.dtype:
+            if object in (arr.dtype, vals.dtype):
+                dtype = np.dtype(object)
+            else:
+                dtype = np.promote_types(arr.dtype, vals.dtype)
+            if dtype != arr.dtype:
+                arr = arr.astype(dtype)
+        arr[start:start+len(vals)] = vals
+        self._arrays[key] = arr
+
+
 class SpecWriterCallback(object):
     """
     collect data from Bluesky RunEngine documents to write as SPEC data
     
     This gathers data from all documents and appends scan to the file 
     when the *stop* document is received.
+
+    Scan ids, uids and byte offsets of every scan are kept in a sidecar
+    index (see ``SpecFileIndex``), so the SPEC file itself is never re-read
+    to find the highest scan number or to check for duplicate uids.
     
     Parameters
 
@@ -158,6 +496,22 @@ class SpecWriterCallback(object):
         highest scan number in existing SPEC data file.
         default: False
 
+    streaming : boolean, optional
+        If True, the scan header (through the #L line) is written when the
+        *primary* descriptor arrives and each data row is appended as its
+        *event* arrives, through a file handle held open for the scan.
+        Event data is not kept in memory.  Remaining comments are written
+        at *stop*.
+        default: False
+
+    writer : BackgroundWriter, optional
+        If given, file I/O (and formatting of data rows) runs on the 
+        writer's thread and document handling returns immediately.
+        Writes are done in document order.  Errors in the writer thread
+        are logged, and raised by the next ``flush()``, which waits for
+        pending writes.
+        default: None (write synchronously)
+
     User Interface methods
 
     .. autosummary::
@@ -169,6 +523,7 @@ class SpecWriterCallback(object):
        ~clear
        ~prepare_scan_contents
        ~write_scan
+       ~flush
 
     Internal methods
 
@@ -178,6 +533,7 @@ class SpecWriterCallback(object):
        ~start
        ~descriptor
        ~event
+       ~event_page
        ~bulk_events
        ~datum
        ~resource
@@ -185,7 +541,15 @@ class SpecWriterCallback(object):
 
     """
     
-    def __init__(self, filename=None, auto_write=True, RE=None, reset_scan_id=False):
+    def __init__(self, filename=None, auto_write=True, RE=None, reset_scan_id=False,
+                 streaming=False, writer=None):
+        self.writer = writer        # BackgroundWriter for file I/O, or None
+        self._streaming_scan = False    # scan header has been sent to file
+        self._stream = None         # open file handle while streaming a scan
+        self._stream_offset = None  # byte offset of the streamed #S line
+        self._index = None          # SpecFileIndex of spec_filename
+        self._io_errors = []        # of queued writes, raised by flush()
+        self.streaming = streaming
         self.clear()
         self.buffered_comments = self._empty_comments_dict()
         self.spec_filename = filename
@@ -216,7 +580,7 @@ class SpecWriterCallback(object):
         self.scan_epoch = None      # absolute epoch to report in scan #D line
         self.time = None            # full time from document
         self.comments = self._empty_comments_dict()
-        self.data = OrderedDict()           # data in the scan
+        self.data = ColumnBuffer()          # data in the scan
         self.detectors = OrderedDict()      # names of detectors in the scan
         self.hints = OrderedDict()          # why?
         self.metadata = OrderedDict()       # #MD lines in header
@@ -231,6 +595,7 @@ class SpecWriterCallback(object):
         self.columns = OrderedDict()        # #L in scan
         self.scan_command = None            # #S line
         self.scanning = False
+        self._streamed_comments = {}        # comments already streamed, by key
 
     def _empty_comments_dict(self):
         return dict(
@@ -258,6 +623,7 @@ class SpecWriterCallback(object):
             start = self.start,
             descriptor = self.descriptor,
             event = self.event,
+            event_page = self.event_page,
             bulk_events = self.bulk_events,
             datum = self.datum,
             resource = self.resource,
@@ -268,10 +634,13 @@ class SpecWriterCallback(object):
             uid = document.get("uid") or document.get("datum_id")
             logger.debug("%s document, uid=%s", key, str(uid))
             ts = document.get("time")
+            if key == "event_page" and ts is not None:
+                # a column of times: keep the latest
+                ts = document["time"][-1] if len(ts) > 0 else None
             if ts is None:
                 ts = datetime.now()
             else:
-                ts = datetime.fromtimestamp(document["time"])
+                ts = datetime.fromtimestamp(float(ts))
             self._datetime = ts
             xref[key](document)
         else:
@@ -288,6 +657,9 @@ class SpecWriterCallback(object):
             plan_type plan_name plan_args
         """.split()
 
+        if self._streaming_scan:
+            self._io(self._close_stream)
+            self._streaming_scan = False
         self.clear()
         self.scanning = True
         self.uid = doc["uid"]
@@ -365,35 +737,75 @@ class SpecWriterCallback(object):
         middle_keys = [k for k in keyset if k not in first_keys + last_keys]
         epoch_keys = "Epoch_float Epoch".split()
         
-        self.data.update({k: [] for k in first_keys+epoch_keys+middle_keys+last_keys})
+        self.data.add_keys(first_keys+epoch_keys+middle_keys+last_keys)
+
+        if self.streaming:
+            self._open_stream()
 
     def event(self, doc):
         """
         handle *event* documents
+
+        thin adapter over ``event_page()``, with a per-row fast path 
+        when buffering
+        """
+        if self._streaming_scan:
+            self.event_page(_event_as_page(doc))
+            return
+        stream_doc = self._streams.get(doc["descriptor"])
+        if stream_doc is None:
+            fmt = "descriptor UID {} not found"
+            raise KeyError(fmt.format(doc["descriptor"]))
+        if stream_doc["name"] != "primary":
+            return
+
+        row = dict(doc["data"])
+        elapsed = doc["time"] - self.time
+        row["Epoch"] = int(elapsed + 0.5)
+        row["Epoch_float"] = elapsed
+        # like SPEC, default to 0 if not found by name
+        self.data.append_row(row, fill=0)
+        self.num_primary_data += 1
+
+    def event_page(self, doc):
+        """
+        handle *event_page* documents
+
+        appends whole columns of primary stream data at once
         """
         stream_doc = self._streams.get(doc["descriptor"])
         if stream_doc is None:
             fmt = "descriptor UID {} not found"
             raise KeyError(fmt.format(doc["descriptor"]))
-        if stream_doc["name"] == "primary":
-            for k in doc["data"].keys():
-                if k not in self.data.keys():
-                    msg = f"unexpected failure here, key {k} not found"
-                    raise KeyError(msg)
-                    #return                  # not our expected event data
-            for k in self.data.keys():
-                if k == "Epoch":
-                    v = int(doc["time"] - self.time + 0.5)
-                elif k == "Epoch_float":
-                    v = doc["time"] - self.time
-                else:
-                    v = doc["data"].get(k, 0)   # like SPEC, default to 0 if not found by name
-                self.data[k].append(v)
-            self.num_primary_data += 1
+        if stream_doc["name"] != "primary":
+            return
+        for k in doc["data"].keys():
+            if k not in self.data.keys():
+                msg = f"unexpected failure here, key {k} not found"
+                raise KeyError(msg)
+                #return                  # not our expected event data
+
+        n = len(doc["time"])
+        elapsed = np.asarray(doc["time"], dtype=float) - self.time
+        columns = dict(doc["data"])
+        columns["Epoch"] = (elapsed + 0.5).astype(int)
+        columns["Epoch_float"] = elapsed
+
+        if self._streaming_scan:
+            # like SPEC, default to 0 if not found by name
+            keys = list(self.data.keys())
+            cols = [np.asarray(columns[k]).tolist() if k in columns else [0]*n
+                    for k in keys]
+            self._io(self._stream_rows, keys, cols, self.num_primary_data)
+        else:
+            # like SPEC, default to 0 if not found by name
+            self.data.extend(columns, n=n, fill=0)
+        self.num_primary_data += n
     
     def bulk_events(self, doc):
         """handle *bulk_events* documents"""
-        pass
+        for page in bulk_events_to_pages(doc):
+            self.event_page(page)
     
     def datum(self, doc):
         """handle *datum* documents"""
@@ -413,7 +825,11 @@ class SpecWriterCallback(object):
         else:
             self._cmt("stop", "exit_status = not available")
 
-        if self.auto_write:
+        if self._streaming_scan:
+            text = "\n".join(self._scan_trailer_lines()) + "\n"
+            self._io(self._finish_stream, text, self.scan_id, self.uid)
+            self._streaming_scan = False
+        elif self.auto_write:
             self.write_scan()
 
         self.scanning = False
@@ -424,6 +840,18 @@ class SpecWriterCallback(object):
         
         :returns: [str] a list of lines to append to the data file
         """
+        lines = self._scan_header_lines()
+        lines += self._format_data_rows(*self._data_snapshot())
+        lines += self._scan_trailer_lines()
+        
+        return lines
+
+    def _data_snapshot(self):
+        """keys and columns (as lists) of the buffered scan data"""
+        return list(self.data.keys()), [v.tolist() for v in self.data.values()]
+
+    def _scan_header_lines(self):
+        """format the scan lines from #S through #L"""
         dt = datetime.fromtimestamp(self.scan_epoch)
         lines = []
         lines.append("")
@@ -447,25 +875,44 @@ class SpecWriterCallback(object):
         lines.append("#N " + str(len(self.data.keys())))
         if len(self.data.keys()) > 0:
             lines.append("#L " + "  ".join(self.data.keys()))
-            for i in range(self.num_primary_data):
-                str_data = OrderedDict()
-                s = []
-                for k in self.data.keys():
-                    datum = self.data[k][i]
-                    if isinstance(datum, str):
-                        # SPEC scan data is expected to be numbers
-                        # this is text, substitute the row number 
-                        # and report after this line in a #U line
-                        str_data[k] = datum
-                        datum = i
-                    s.append(str(datum))
-                lines.append(" ".join(s))
-                for k in str_data.keys():
-                    # report the text data
-                    lines.append(f"#U {i} {k} {str_data[k]}")
         else:
             lines.append("#C no data column labels identified")
 
+        return lines
+
+    def _format_data_rows(self, keys, columns, start=0):
+        """format columns of data, numbering rows from start"""
+        lines = []
+        for i, row in enumerate(zip(*columns), start):
+            lines += self._format_data_row(i, row, keys)
+        return lines
+
+    def _format_data_row(self, i, row, keys=None):
+        """format data row i, followed by #U lines for any text values"""
+        str_data = OrderedDict()
+        s = []
+        for k, datum in zip(keys or self.data.keys(), row):
+            if isinstance(datum, str):
+                # SPEC scan data is expected to be numbers
+                # this is text, substitute the row number 
+                # and report after this line in a #U line
+                str_data[k] = datum
+                datum = i
+            s.append(str(datum))
+        lines = [" ".join(s)]
+        for k in str_data.keys():
+            # report the text data
+            lines.append(f"#U {i} {k} {str_data[k]}")
+        return lines
+
+    def _scan_trailer_lines(self):
+        """format the comments that follow the scan data"""
+        lines = []
+        # start & descriptor comments made after a streamed header was written
+        for key, n in self._streamed_comments.items():
+            for v in self.comments[key][n:]:
+                lines.append("#C " + v)
+
         for v in self.comments["event"]:
             lines.append("#C " + v)
 
@@ -479,7 +926,84 @@ class SpecWriterCallback(object):
             lines.append("#C " + v)
         
         return lines
-    
+
+    def _io(self, func, *args):
+        """run a file I/O step now, or queue it on the background writer"""
+        if self.writer is None:
+            return func(*args)
+        future = self.writer.submit(func, *args)
+        future.add_done_callback(self._io_done)
+        return future
+
+    def _io_done(self, future):
+        exc = future.exception()
+        if exc is not None:
+            logger = logging.getLogger(__name__)
+            logger.error("write to SPEC file %s failed: %s",
+                         self.spec_filename, exc)
+            self._io_errors.append(exc)
+
+    def _wait_for_writes(self, timeout=None):
+        if self.writer is not None:
+            return self.writer.flush(timeout)
+        return True
+
+    def flush(self, timeout=None):
+        """
+        wait for writes queued on the background writer, if any
+
+        Raises the first error of the queued writes since the last flush.
+        """
+        done = self._wait_for_writes(timeout)
+        errors, self._io_errors = self._io_errors, []
+        if errors:
+            raise errors[0]
+        return done
+
+    def _open_stream(self):
+        """write the scan header and hold the file open for data rows"""
+        # cleared once written, see _write_pending_file_header
+        file_header = None
+        if self.write_file_header:
+            file_header = self._file_header_lines()
+        text = "\n".join(self._scan_header_lines()) + "\n"
+        self._streamed_comments = {
+            key: len(self.comments[key]) 
+            for key in ("start", "descriptor")}
+        self._streaming_scan = True
+        self._io(self._begin_stream, file_header, text, self.uid)
+
+    def _begin_stream(self, file_header, text, uid):
+        logger = logging.getLogger(__name__)
+        self._check_uid_not_written(uid)
+        self._write_pending_file_header(file_header)
+        self._stream_offset = self._scan_offset(text)
+        self._stream = open(self.spec_filename, "a")
+        self._stream.write(text)
+        self._stream.flush()
+
+    def _stream_rows(self, keys, columns, start):
+        if self._stream is None:
+            return      # header was refused, see _begin_stream
+        self._stream.write(
+            "\n".join(self._format_data_rows(keys, columns, start)) + "\n")
+        self._stream.flush()
+
+    def _finish_stream(self, text, scan_id, uid):
+        if self._stream is None:
+            return
+        self._stream.write(text)
+        self._close_stream()
+        self._index_scan(self._stream_offset, scan_id, uid)
+        logger = logging.getLogger(__name__)
+        logger.info("streamed scan %d to SPEC file: %s", scan_id, self.spec_filename)
+
+    def _close_stream(self):
+        """close the file handle of a streamed scan, if open"""
+        if self._stream is not None:
+            self._stream.close()
+            self._stream = None
+
     def _write_lines_(self, lines, mode="a"):
         """write (more) lines to the file"""
         with open(self.spec_filename, mode) as f:
@@ -487,6 +1011,11 @@ class SpecWriterCallback(object):
     
     def write_header(self):
         """write the header section of a SPEC data file"""
+        self._write_file_header(self._file_header_lines())
+        self.write_file_header = False
+
+    def _file_header_lines(self):
+        """format the header section of a SPEC data file"""
         dt = datetime.fromtimestamp(self.spec_epoch)
         lines = []
         lines.append(f"#F {self.spec_filename}")
@@ -496,11 +1025,24 @@ class SpecWriterCallback(object):
         lines.append(f"#O0 ")
         lines.append(f"#o0 ")
         lines.append("")
+        return lines
 
+    def _write_pending_file_header(self, lines):
+        """
+        write the file header, unless None or written since it was
+        formatted (runs in write order, on the writer thread if any)
+        """
+        if lines is None or not self.write_file_header:
+            return
+        self._write_file_header(lines)
+        self.write_file_header = False
+        logger = logging.getLogger(__name__)
+        logger.info("wrote header to SPEC file: %s", self.spec_filename)
+
+    def _write_file_header(self, lines):
         if os.path.exists(self.spec_filename):
-            lines.insert(0, "")
+            lines = [""] + lines
         self._write_lines_(lines, mode="a+")
-        self.write_file_header = False
     
     def write_scan(self):
         """
@@ -511,23 +1053,61 @@ class SpecWriterCallback(object):
         * appends scan data
         
         note:  does nothing if there are no lines to be written
+
+        With a background writer, the scan is formatted and written on
+        the writer thread; returns the Future of that write.
         """
-        if os.path.exists(self.spec_filename):
-            with open(self.spec_filename) as f:
-                buf = f.read()
-                if buf.find(self.uid) >= 0:
-                    # raise exception if uid is already in the file!
-                    msg = f"{self.spec_filename} already contains uid={self.uid}"
-                    raise ValueError(msg)
+        # cleared once written, see _write_pending_file_header
+        file_header = None
+        if self.write_file_header:
+            file_header = self._file_header_lines()
+        keys, columns = self._data_snapshot()
+        return self._io(self._write_scan_lines, 
+                        file_header,
+                        self._scan_header_lines(),
+                        keys, columns,
+                        self._scan_trailer_lines(),
+                        self.scan_id, self.uid)
+
+    def _write_scan_lines(self, file_header, header, keys, columns, trailer,
+                          scan_id, uid):
+        self._check_uid_not_written(uid)
         logger = logging.getLogger(__name__)
-        lines = self.prepare_scan_contents()
+        lines = header + self._format_data_rows(keys, columns) + trailer
         lines.append("")
-        if lines is not None:
-            if self.write_file_header:
-                self.write_header()
-                logger.info("wrote header to SPEC file: %s", self.spec_filename)
-            self._write_lines_(lines, mode="a")
-            logger.info("wrote scan %d to SPEC file: %s", self.scan_id, self.spec_filename)
+        self._write_pending_file_header(file_header)
+        offset = self._scan_offset("\n".join(lines))
+        self._write_lines_(lines, mode="a")
+        self._index_scan(offset, scan_id, uid)
+        logger.info("wrote scan %d to SPEC file: %s", scan_id, self.spec_filename)
+
+    def _check_uid_not_written(self, uid=None):
+        """raise ValueError if the scan uid is already in the file"""
+        uid = uid or self.uid
+        if self._index is None or self._index.spec_filename != self.spec_filename:
+            self._index = SpecFileIndex(self.spec_filename)
+        elif os.path.exists(self.spec_filename) and not self._index.is_current():
+            self._index.load()      # file was appended by another writer
+        if uid in self._index:
+            # raise exception if uid is already in the file!
+            msg = f"{self.spec_filename} already contains uid={uid}"
+            raise ValueError(msg)
+
+    def _scan_offset(self, text):
+        """
+        byte offset the #S line of text will have when appended to the file
+        """
+        pos = 0
+        if os.path.exists(self.spec_filename):
+            pos = os.path.getsize(self.spec_filename)
+        return pos + _text_size(text[:text.index("#S ")])
+
+    def _index_scan(self, offset, scan_id=None, uid=None):
+        """record the scan just written in the sidecar index"""
+        end = os.path.getsize(self.spec_filename)
+        if scan_id is None:
+            scan_id = self.scan_id
+        self._index.append(scan_id, uid or self.uid, offset, end)
 
     def make_default_filename(self):
         """generate a file name to be used as default"""
@@ -540,14 +1120,13 @@ class SpecWriterCallback(object):
         
         but don't create it until we have data
         """
+        self._wait_for_writes()
         self.clear()
         filename = filename or self.make_default_filename()
+        self._index = SpecFileIndex(filename)
         if os.path.exists(filename):
-            from spec2nexus.spec import SpecDataFile
-            sdf = SpecDataFile(filename)
-            scan_list = sdf.getScanNumbers()
-            l = len(scan_list)
-            m = max(map(float, scan_list))
+            l = len(self._index)
+            m = self._index.max_scan_id
             highest = int(max(l, m) + 0.9999)     # solves issue #128
             scan_id = max(scan_id or 0, highest)
         self.spec_filename = filename
@@ -570,9 +1149,9 @@ class SpecWriterCallback(object):
     
     def usefile(self, filename):
         """read from existing SPEC data file"""
+        self._wait_for_writes()
         if not os.path.exists(self.spec_filename):
             raise IOError(f"file {filename} does not exist")
-        scan_id = None
         with open(filename, "r") as f:
             key = "#F"
             line = f.readline().strip()
@@ -600,14 +1179,9 @@ class SpecWriterCallback(object):
             if len(p) > 4 and p[2] == "user":
                 username = p[4]
             
-            # find the highest scan number used
-            key = "#S"
-            scan_ids = []
-            for line in f.readlines():
-                if line.startswith(key+" ") and len(line.split())>1:
-                    scan_id = int(line.split()[1])
-                    scan_ids.append(scan_id)
-            scan_id = max(scan_ids)
+        # find the highest scan number used, from the sidecar index
+        self._index = SpecFileIndex(filename)
+        scan_id = self._index.max_scan_id
 
         self.spec_filename = filename
         self.spec_epoch = epoch
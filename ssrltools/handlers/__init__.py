@@ -1,5 +1,5 @@
 # imports to expose out to world
-from .xspress3 import Xspress3HDF5Handler
+from .xspress3 import Xspress3HDF5Handler, CachedXspress3HDF5Handler
 
 def register(db):
     from .xspress3 import register
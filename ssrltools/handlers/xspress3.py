@@ -1,15 +1,156 @@
 import logging
 
+import h5py
+import numpy as np
+
 # imort XRF_DATA_KEY for back-compat
 from databroker.assets.handlers import (Xspress3HDF5Handler,
                                         XS3_XRF_DATA_KEY as XRF_DATA_KEY)
 
+from ssrltools.cache import LRUCache
+
 
 logger = logging.getLogger(__name__)
 
 FMT_ROI_KEY = 'entry/instrument/detector/NDAttributes/CHAN{}ROI{}'
 
 
+def _close_file(hdf):
+    if hdf.id.valid:
+        hdf.close()
+
+# shared by all handler instances: databroker makes one handler per resource,
+# and replaying a map makes many resources pointing at few files
+_FILE_CACHE = LRUCache(maxsize=8, on_evict=_close_file)
+_CHUNK_CACHE = LRUCache(max_cost=256 * 2**20, cost=lambda arr: arr.nbytes)
+
+
+class CachedXspress3HDF5Handler(Xspress3HDF5Handler):
+    '''Xspress3 handler that shares open files and caches decoded frames
+
+    * each file is opened once, and kept in an LRU cache of open h5py
+      files (8 by default), closed on eviction
+    * frames are read in blocks of whole HDF5 chunks, and kept in an LRU
+      cache bounded by bytes (256 MiB by default)
+    * contiguous, uncompressed datasets are memory-mapped instead
+    * spectra are returned as views into the cached block or map, not
+      copies; treat them as read-only
+
+    Use ``set_cache_limits`` to change the cache sizes.
+    Registered in place of Xspress3HDF5Handler by ``register(db)``.
+    '''
+    HANDLER_NAME = Xspress3HDF5Handler.HANDLER_NAME
+
+    def __init__(self, filename, key=XRF_DATA_KEY, chunk_frames=None):
+        self._chunk_frames = chunk_frames
+        self._mmap = None
+        # an open h5py.File handed in stays the caller's, never cached
+        self._external = filename if isinstance(filename, h5py.File) else None
+        super().__init__(filename, key=key)
+
+    def open(self):
+        self._file = self._get_file()
+
+    def close(self):
+        # the file belongs to the shared cache, just drop our references
+        self._file = None
+        self._dataset = None
+        self._mmap = None
+
+    def _get_file(self):
+        if self._external is not None:
+            return self._external
+        hdf = _FILE_CACHE.get(self._filename)
+        if hdf is None or not hdf.id.valid:
+            hdf = h5py.File(self._filename, 'r')
+            _FILE_CACHE.put(self._filename, hdf)
+        return hdf
+
+    def _get_dataset(self):
+        hdf = self._get_file()
+        if self._dataset is not None and hdf is self._file:
+            return
+        # (re)opened file: forget anything tied to the old handle
+        self._file = hdf
+        self._dataset = hdf[self._key]
+        self._mmap = self._memmap(self._dataset)
+        if self._chunk_frames is None:
+            chunks = self._dataset.chunks
+            self._chunk_frames = max(chunks[0] if chunks else 1, 64)
+
+    @staticmethod
+    def _memmap(dataset):
+        '''memory map a contiguous uncompressed dataset, else None'''
+        if dataset.chunks is not None or dataset.compression is not None:
+            return None
+        offset = dataset.id.get_offset()
+        if offset is None:
+            return None     # not yet allocated
+        try:
+            return np.memmap(dataset.file.filename, mode='r',
+                             dtype=dataset.dtype, shape=dataset.shape,
+                             offset=offset)
+        except (OSError, ValueError):
+            return None
+
+    def _frame_block(self, frame):
+        '''(block, first frame) of cached frames containing frame'''
+        n = self._chunk_frames
+        first = (frame // n) * n
+        cache_key = (self._filename, self._key, first)
+        block = _CHUNK_CACHE.get(cache_key)
+        if block is None or len(block) < min(n, len(self._dataset) - first):
+            block = self._dataset[first:first + n]
+            _CHUNK_CACHE.put(cache_key, block)
+        return block, first
+
+    def _check_frame(self, frame):
+        if frame >= len(self._dataset):
+            # file may have grown since it was opened: reopen it
+            if self._external is not None:
+                return
+            _FILE_CACHE.discard(lambda k: k == self._filename)
+            _CHUNK_CACHE.discard(lambda k: k[0] == self._filename)
+            self._get_dataset()
+
+    def __call__(self, frame=None, channel=None):
+        self._get_dataset()
+        if isinstance(frame, (int, np.integer)):
+            self._check_frame(frame)
+            if self._mmap is not None:
+                return self._mmap[frame, channel - 1, :]
+            block, first = self._frame_block(frame)
+            return block[frame - first, channel - 1, :]
+
+        if frame is None:
+            frame = slice(None)
+        data = self._mmap if self._mmap is not None else self._dataset
+        return np.asarray(data[frame, channel - 1, :]).squeeze()
+
+    def get_roi(self, chan, bin_low, bin_high, max_points=None):
+        '''sum bins bin_low:bin_high of one channel, without loading the
+        whole dataset'''
+        self._get_dataset()
+        data = self._mmap if self._mmap is not None else self._dataset
+        return np.sum(data[:max_points, chan - 1, bin_low:bin_high], axis=1)
+
+    @staticmethod
+    def set_cache_limits(max_open_files=None, max_cache_bytes=None):
+        '''change the shared cache limits, evicting as needed'''
+        if max_open_files is not None:
+            _FILE_CACHE.maxsize = max_open_files
+            _FILE_CACHE._evict()
+        if max_cache_bytes is not None:
+            _CHUNK_CACHE.max_cost = max_cache_bytes
+            _CHUNK_CACHE._evict()
+
+    @staticmethod
+    def clear_cache():
+        '''close all cached files and drop cached frames'''
+        _CHUNK_CACHE.clear()
+        _FILE_CACHE.clear()
+
+
 def register(db):
-    db.reg.register_handler(Xspress3HDF5Handler.HANDLER_NAME,
-                            Xspress3HDF5Handler)
\ No newline at end of file
+    db.reg.register_handler(CachedXspress3HDF5Handler.HANDLER_NAME,
+                            CachedXspress3HDF5Handler, overwrite=True)
@@ -0,0 +1,201 @@
+"""
+Visit-order optimization for sets of stage positions
+
+Reorders a set of points to shorten total motor travel before handing
+them to bp.list_scan.  Costs are computed as move times with all axes
+moving together, so the slowest axis of each move sets its duration.
+
+.. autosummary::
+
+   ~order_points
+   ~order_sample_locs
+   ~serpentine_order
+   ~nearest_neighbor_order
+   ~two_opt_order
+   ~path_cost
+   ~estimate_travel_time
+   ~motor_kinematics
+
+"""
+
+import numpy as np
+
+ORDER_MODES = ('serpentine', 'nn', '2opt')
+
+
+def _move_cost_matrix(points, velocity=None):
+    """
+    (N, N) matrix of constant-velocity move times between points.  Axes
+    move simultaneously, so each entry is the largest single-axis time.
+    """
+    pts = np.asarray(points, dtype=float)
+    if velocity is not None:
+        pts = pts / np.asarray(velocity, dtype=float)
+
+    return np.abs(pts[:, None, :] - pts[None, :, :]).max(axis=-1)
+
+def path_cost(points, order=None, velocity=None):
+    """
+    Total constant-velocity move time to visit points in order.
+    """
+    pts = np.asarray(points, dtype=float)
+    if order is not None:
+        pts = pts[np.asarray(order)]
+    if velocity is not None:
+        pts = pts / np.asarray(velocity, dtype=float)
+
+    return float(np.abs(np.diff(pts, axis=0)).max(axis=-1).sum())
+
+def serpentine_order(points, row_axis=0, decimals=3):
+    """
+    Boustrophedon ordering: group points into rows sharing a row_axis
+    coordinate (rounded to decimals), then sweep the other axis, reversing
+    direction on every other row.
+    """
+    pts = np.asarray(points, dtype=float)
+    fast_axis = 1 - row_axis
+    rows = np.round(pts[:, row_axis], decimals)
+    _, row_id = np.unique(rows, return_inverse=True)
+    direction = np.where(row_id % 2, -1.0, 1.0)
+
+    return np.lexsort((pts[:, fast_axis] * direction, row_id))
+
+def nearest_neighbor_order(points, start=0, velocity=None, cost=None):
+    """
+    Greedy tour: always move to the closest unvisited point next.
+    """
+    if cost is None:
+        cost = _move_cost_matrix(points, velocity=velocity)
+    n = len(cost)
+    if n == 0:
+        return np.array([], dtype=int)
+
+    visited = np.zeros(n, dtype=bool)
+    order = np.empty(n, dtype=int)
+    order[0] = start
+    visited[start] = True
+    for k in range(1, n):
+        dist = np.where(visited, np.inf, cost[order[k-1]])
+        order[k] = np.argmin(dist)
+        visited[order[k]] = True
+
+    return order
+
+def two_opt_order(points, order=None, start=0, velocity=None, cost=None,
+                  max_iter=100):
+    """
+    Improve an open tour with 2-opt segment reversals until no reversal
+    shortens it (or max_iter passes).  The first point is held fixed.
+    Starts from the nearest neighbor tour if no order is given.
+    """
+    if cost is None:
+        cost = _move_cost_matrix(points, velocity=velocity)
+    if order is None:
+        order = nearest_neighbor_order(points, start=start, cost=cost)
+    order = np.array(order, dtype=int)
+    n = len(order)
+
+    for _ in range(max_iter):
+        improved = False
+        for i in range(1, n - 1):
+            # reverse order[i:j+1] for every j > i at once:
+            # edges (a, b) and (c, d) become (a, c) and (b, d)
+            a, b = order[i-1], order[i]
+            c = order[i+1:]
+            d = order[i+2:]
+            delta = cost[a, c] - cost[a, b]
+            delta[:-1] += cost[b, d] - cost[c[:-1], d]
+
+            k = np.argmin(delta)
+            if delta[k] < -1e-12:
+                j = i + 1 + k
+                order[i:j+1] = order[i:j+1][::-1]
+                improved = True
+        if not improved:
+            break
+
+    return order
+
+def order_points(points, mode='2opt', start=0, velocity=None):
+    """
+    Return an index array visiting points in the requested order.
+
+    PARAMETERS
+
+    points : array-like, shape (N, ndim)
+        positions, one column per motor
+    mode : str or None
+        one of ``'serpentine'``, ``'nn'``, ``'2opt'``.  None keeps the
+        given order.
+    start : int
+        index of the first point to visit (nn, 2opt)
+    velocity : float or array-like, optional
+        per-axis velocities, to weight axes by their speed
+    """
+    n = len(points)
+    if mode is None:
+        return np.arange(n)
+    if mode not in ORDER_MODES:
+        raise ValueError(f'order mode must be one of {ORDER_MODES} or None')
+    if n < 3:
+        return np.arange(n)
+
+    if mode == 'serpentine':
+        return serpentine_order(points)
+    elif mode == 'nn':
+        return nearest_neighbor_order(points, start=start, velocity=velocity)
+    else:
+        return two_opt_order(points, start=start, velocity=velocity)
+
+def order_sample_locs(sample_locs, index=None, mode='2opt',
+                      keys=('stage_x', 'stage_y'), velocity=None):
+    """
+    Reorder HiTp sample indices to minimize stage travel.
+
+    sample_locs : SampleLocTable
+    index : list of sample indices to visit, default all
+    keys : motor names used to compute travel
+
+    Returns the list of sample indices in visit order.
+    """
+    indices = sample_locs.keys() if index is None else list(index)
+    pts = sample_locs.get(index, columns=keys)
+    order = order_points(pts, mode=mode, velocity=velocity)
+
+    return [indices[i] for i in order]
+
+def estimate_travel_time(points, velocity=1.0, accel_time=0.0,
+                         settle_time=0.0):
+    """
+    Estimate the time to visit points in the given order.
+
+    Each axis follows a trapezoidal profile, reaching velocity after
+    accel_time seconds (EPICS motor VELO and ACCL semantics), or a
+    triangular one if the move is too short.  Axes move together, so
+    each move lasts as long as its slowest axis.  settle_time is added
+    for every move that changes a position.
+    """
+    steps = np.abs(np.diff(np.asarray(points, dtype=float), axis=0))
+    if steps.size == 0:
+        return 0.0
+    v = np.broadcast_to(np.asarray(velocity, dtype=float), steps.shape[1:])
+    ta = np.broadcast_to(np.asarray(accel_time, dtype=float),
+                         steps.shape[1:])
+
+    t_trap = steps / v + ta
+    t_tri = 2 * np.sqrt(steps * ta / v)
+    t = np.where(steps >= v * ta, t_trap, t_tri)
+    moved = np.count_nonzero(np.any(steps > 0, axis=1))
+
+    return float(t.max(axis=1).sum() + settle_time * moved)
+
+def motor_kinematics(*motors):
+    """
+    Read (velocity, accel_time) arrays from motors exposing velocity and
+    acceleration signals, such as EpicsMotor and ophyd.sim.SynAxis
+    """
+    velocity = np.array([m.velocity.get() for m in motors], dtype=float)
+    accel_time = np.array([m.acceleration.get() for m in motors],
+                          dtype=float)
+
+    return velocity, accel_time
@@ -14,6 +14,8 @@ from bluesky import plan_patterns
 
 from collections import OrderedDict
 import numpy as np
+
+from .ordering import order_sample_locs, motor_kinematics
 import datetime
 import itertools
 import logging
@@ -78,41 +80,84 @@ def stub_plan(detectors, motor):
     return (yield from core())
 
 
+def _in_circle_points(axis1, axis2, center, radius, skip=0):
+    """
+    Return grid points from axis1 x axis2 that lie within radius of center.
+
+    Points are returned as an (N, 2) array in the same order bp.grid_scan 
+    visits them (axis1 outer loop, axis2 inner loop, no snaking).  The first
+    ``skip`` in-circle points are dropped.
+    """
+    g1, g2 = np.meshgrid(axis1, axis2, indexing='ij')
+    pts = np.column_stack([g1.ravel(), g2.ravel()])
+    rad2 = np.sum((pts - np.asarray(center, dtype=float))**2, axis=1)
+
+    return pts[rad2 <= radius*radius][skip:]
+
+def mesh_grid_circ_points(s1, f1, int1, s2, f2, int2, radius, pin, skip=0):
+    """
+    Compute the points visited by mesh_grid_circ as an (N, 2) array.
+
+    Grid lines are aligned to pin, spaced by int1 and int2, and bounded by 
+    (s1, f1) and (s2, f2).  Only points inside the circle of given radius, 
+    centered on the middle of the bounds, are kept.  The first skip points 
+    of that set are dropped.
+
+    usage:
+        pts = mesh_grid_circ_points(-10, 10, 1, -10, 10, 1, 10, (0.5, 0.5))
+        RE( bp.list_scan([det], m1, pts[:, 0], m2, pts[:, 1]) )
+    """
+    ## subtract fraction of interval to account for edges
+    s1_new = np.arange(pin[0], s1-int1/2, -int1)[-1]
+    f1_new = np.arange(pin[0], f1+int1/2, int1)[-1]
+
+    s2_new = np.arange(pin[1], s2-int2/2, -int2)[-1]
+    f2_new = np.arange(pin[1], f2+int2/2, int2)[-1]
+
+    ## add half of interval to include endpoints if interval is perfect
+    num1 = len(np.arange(s1_new, f1_new+int1/2, int1))
+    num2 = len(np.arange(s2_new, f2_new+int2/2, int2))
+    
+    center = (s1+(f1-s1)/2, s2+(f2-s2)/2)
+
+    return _in_circle_points(np.linspace(s1_new, f1_new, num1),
+                             np.linspace(s2_new, f2_new, num2),
+                             center, radius, skip=skip)
+
+def _circ_list_scan(detectors, mot1, mot2, pts, md):
+    """
+    Run bp.list_scan over precomputed (N, 2) points, recording them in the 
+    start document.  Only moves that change a motor position are issued.
+    """
+    if len(pts) == 0:
+        raise ValueError('no grid points inside the requested radius')
+
+    _md = {'num_points': len(pts),
+           'points': pts.tolist()}
+    _md.update(md or {})
+
+    return (yield from bp.list_scan(detectors, mot1, list(pts[:, 0]), 
+                                    mot2, list(pts[:, 1]), md=_md))
+
 def meshcirc(detectors, motor1, s1, f1, int1, mot2, s2, f2, int2, 
             radius, md=None):
     """
     Scan points in a mesh, including only coordinates inside the radius
-    Hooks bluesky.plans.grid_scan
+    Points are computed up front and handed to bluesky.plans.list_scan
     motor1: 
     s1 = start
     f = end
     int = number
     """
     # Verification (check non-negative, motors are motors, non-zero steps?)
-    # Basic plan logic
-    motor_args = list([motor1, s1, f1, int1, mot2, s2, f2, int2, False])
+    pts = _in_circle_points(np.linspace(s1, f1, int1), 
+                            np.linspace(s2, f2, int2), (0, 0), radius)
 
     # metadata addition
-    _md = {'radius': radius}
+    _md = {'radius': radius, 'plan_name': 'meshcirc'}
     _md.update(md or {})
 
-    # inject logic via per_step 
-    def per_step_fn(detectors, step, pos_cache):
-        """
-        has signature of bps.one_nd_step, but with added logic of skipping 
-        a point if it is outside of 
-        """
-        vals = list(step.values())
-        pos_rad = sum(map(lambda x: x*x , list(vals))) # calculate radius^2
-        pt_past_radius = (pos_rad > radius*radius)
-        if pt_past_radius: # condition 
-            pass
-        else: # run normal scan
-            yield from bps.one_nd_step(detectors, step, pos_cache)
-        
-    # plan logic
-    return (yield from bp.grid_scan(detectors, *motor_args, 
-                                    per_step=per_step_fn, md=_md))
+    return (yield from _circ_list_scan(detectors, motor1, mot2, pts, _md))
 
 def mesh_grid_circ(detectors, mot1, s1, f1, int1, mot2, s2, f2, int2, 
             radius, pin=None, skip=0, md=None):
@@ -124,7 +169,9 @@ def mesh_grid_circ(detectors, mot1, s1, f1, int1, mot2, s2, f2, int2,
 
     Currently has no way of correcting for rotation of grid.
 
-    Hooks bluesky.plans.grid_scan
+    Point set is built once by mesh_grid_circ_points and handed to 
+    bluesky.plans.list_scan.  The exact point list is recorded in the start
+    document under 'points'.
     detectors: list of detectors to count at each point
 
     motor1: 
@@ -145,63 +192,45 @@ def mesh_grid_circ(detectors, mot1, s1, f1, int1, mot2, s2, f2, int2,
     skip = number of points to skip (if restarting a scan)
     """
     # Verification (check non-negative, motors are motors, non-zero steps?)
-    # Basic plan logic
-    ## Define new bounds
     if not pin: # no pinning tuple provided
         pin = (mot1.position, mot2.position) 
 
-    ## subtract fraction of interval to account for edges
-    s1_new = np.arange(pin[0], s1-int1/2, -int1)[-1]
-    f1_new = np.arange(pin[0], f1+int1/2, int1)[-1]
+    pts = mesh_grid_circ_points(s1, f1, int1, s2, f2, int2, radius, pin, 
+                                skip=skip)
 
-    s2_new = np.arange(pin[1], s2-int2/2, -int2)[-1]
-    f2_new = np.arange(pin[1], f2+int2/2, int2)[-1]
+    # metadata addition
+    _md = {'radius': radius, 
+           'pin': list(pin),
+           'skip': skip,
+           'plan_name': 'mesh_grid_circ'}
+    _md.update(md or {})
 
-    ## add half of interval to include endpoints if interval is perfect
-    num1 = len(np.arange(s1_new, f1_new+int1/2, int1))
-    num2 = len(np.arange(s2_new, f2_new+int2/2, int2))
-    
-    center = (s1+(f1-s1)/2, s2+(f2-s2)/2)
+    return (yield from _circ_list_scan(detectors, mot1, mot2, pts, _md))
 
-    motor_args = list([mot1, s1_new, f1_new, num1, 
-                        mot2, s2_new, f2_new, num2, False])
+def hitp_list_scan(detectors, stage, index=None, order='2opt', md=None):
+    """
+    Measure HiTp library samples, visiting them in a travel-optimized order
 
-    # metadata addition
-    _md = {'radius': radius}
+    detectors: list of detectors to count at each sample
+    stage: HiTpStage or SynHiTpStage holding sample_locs
+    index: list of sample indices to measure, default all
+    order: one of 'serpentine', 'nn', '2opt', or None to keep given order
+
+    usage:
+        RE( hitp_list_scan([det], stage, order='2opt') )
+    """
+    velocity, _ = motor_kinematics(stage.stage_x, stage.stage_y)
+    indices = order_sample_locs(stage.sample_locs, index=index, mode=order,
+                                velocity=velocity)
+
+    _md = {'plan_name': 'hitp_list_scan',
+           'sample_order': [int(i) for i in indices],
+           'order_mode': order}
     _md.update(md or {})
 
-    # inject logic via per_step 
-    class stateful_per_step:
-        
-        def __init__(self, skip):
-            self.skip = skip
-            self.cnt = 0
-            print(self.skip, self.cnt)
-
-        def __call__(self, detectors, step, pos_cache):
-            """
-            has signature of bps.one_and_step, but with added logic of skipping 
-            a point if it is outside of provided radius
-            """
-            vals = list(step.values())
-            pos_rad = sum([(x-y)**2 for x, y in zip(vals, center)]) # calculate radius^2
-            pt_past_radius = (pos_rad > radius*radius)
-            if pt_past_radius: # condition 
-                pass
-            else: # run normal scan
-                if self.cnt < self.skip: # if not enough skipped
-                    self.cnt += 1
-                    pass
-                else:
-                    yield from bps.one_nd_step(detectors, step, pos_cache)
-            
-
-    per_stepper = stateful_per_step(skip)
-
-    # Skip points if need
-    newGen = bp.grid_scan(detectors, *motor_args, 
-                            per_step=per_stepper, md=_md)
-    return (yield from newGen)
+    return (yield from bp.list_scan(detectors, 
+                                    *stage.sample_loc_list(index=indices),
+                                    md=_md))
 
 def nscan(detectors, *motor_sets, num=11, per_step=None, md=None):
     """
@@ -0,0 +1,146 @@
+'''
+Acquisition simulator: the areaDetector cam PVs that the trigger mixins
+(ophyd SingleTrigger, XspressTrigger) touch, with a simulated exposure.
+
+A put of 1 to Acquire takes NumImages frames (one in Single mode), each
+lasting SimLatency seconds plus up to SimJitter seconds at random, then
+drops Acquire back to 0.  Both can be changed at run time, through the
+PVs or the --latency / --jitter options.
+
+Detectors served, under the default prefix 'SIM:':
+    DEX:        Dexela (cam at the detector prefix, as DexelaDet15)
+    PIL:cam1:   Pilatus
+    MAR:cam1:   MarCCD
+    XSP3:       Xspress3 (also ERASE)
+
+usage:
+    python -m ssrltools.sim.IOC.acquire --latency 0.05 --jitter 0.01
+'''
+import asyncio
+import random
+
+from caproto import ChannelType
+from caproto.server import (pvproperty, PVGroup, SubGroup,
+                            template_arg_parser, run)
+
+
+class AcquireCamGroup(PVGroup):
+    '''Cam PVs needed to stage and trigger an areaDetector'''
+    acquire = pvproperty(name='Acquire', value=0, dtype=int)
+    acquire_rbv = pvproperty(name='Acquire_RBV', value=0, dtype=int,
+                             read_only=True)
+    acquire_time = pvproperty(name='AcquireTime', value=0.0)
+    acquire_time_rbv = pvproperty(name='AcquireTime_RBV', value=0.0,
+                                  read_only=True)
+    array_counter = pvproperty(name='ArrayCounter', value=0, dtype=int)
+    array_counter_rbv = pvproperty(name='ArrayCounter_RBV', value=0,
+                                   dtype=int, read_only=True)
+    detector_state = pvproperty(name='DetectorState_RBV', value=0, dtype=int,
+                                read_only=True)
+    image_mode = pvproperty(name='ImageMode', value=0, dtype=int)
+    image_mode_rbv = pvproperty(name='ImageMode_RBV', value=0, dtype=int,
+                                read_only=True)
+    num_images = pvproperty(name='NumImages', value=1, dtype=int)
+    num_images_rbv = pvproperty(name='NumImages_RBV', value=1, dtype=int,
+                                read_only=True)
+    port_name = pvproperty(name='PortName_RBV', value='CAM',
+                           dtype=ChannelType.STRING, read_only=True)
+
+    sim_latency = pvproperty(name='SimLatency', value=0.1,
+                             doc='seconds per frame')
+    sim_jitter = pvproperty(name='SimJitter', value=0.0,
+                            doc='random extra seconds per frame, at most')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._task = None
+
+    @sim_latency.startup
+    async def sim_latency(self, instance, async_lib):
+        # starting latency and jitter given to the IOC
+        await self.sim_latency.write(self.parent.latency)
+        await self.sim_jitter.write(self.parent.jitter)
+
+    @acquire.putter
+    async def acquire(self, instance, value):
+        if value and self._task is None:
+            self._task = asyncio.get_running_loop().create_task(
+                                                        self._exposure())
+        elif not value and self._task is not None:
+            self._task.cancel()
+        return value
+
+    async def _exposure(self):
+        await self.acquire_rbv.write(1)
+        await self.detector_state.write(1)
+        frames = self.num_images.value if self.image_mode.value else 1
+        try:
+            for _ in range(max(frames, 1)):
+                await asyncio.sleep(self.sim_latency.value +
+                                    random.uniform(0, self.sim_jitter.value))
+                await self.array_counter_rbv.write(
+                                        self.array_counter_rbv.value + 1)
+        except asyncio.CancelledError:
+            pass
+        finally:
+            self._task = None
+            await self.detector_state.write(0)
+            await self.acquire_rbv.write(0)
+            await self.acquire.write(0, verify_value=False)
+
+    # plain setpoint -> readback mirrors
+    @acquire_time.putter
+    async def acquire_time(self, instance, value):
+        await self.acquire_time_rbv.write(value)
+        return value
+
+    @array_counter.putter
+    async def array_counter(self, instance, value):
+        await self.array_counter_rbv.write(value)
+        return value
+
+    @image_mode.putter
+    async def image_mode(self, instance, value):
+        await self.image_mode_rbv.write(value)
+        return value
+
+    @num_images.putter
+    async def num_images(self, instance, value):
+        await self.num_images_rbv.write(value)
+        return value
+
+
+class XspressAcquireGroup(AcquireCamGroup):
+    erase = pvproperty(name='ERASE', value=0, dtype=int)
+
+
+class AcquireSimIOC(PVGroup):
+    '''One acquisition simulator per detector benchmarked'''
+    dexela = SubGroup(AcquireCamGroup, prefix='DEX:')
+    pilatus = SubGroup(AcquireCamGroup, prefix='PIL:cam1:')
+    marccd = SubGroup(AcquireCamGroup, prefix='MAR:cam1:')
+    xspress3 = SubGroup(XspressAcquireGroup, prefix='XSP3:')
+
+    def __init__(self, *args, latency=0.1, jitter=0.0, **kwargs):
+        super().__init__(*args, **kwargs)
+        # of every detector, set at server startup
+        self.latency = latency
+        self.jitter = jitter
+
+
+if __name__ == '__main__':
+    parser, split_args = template_arg_parser(
+            default_prefix='SIM:',
+            desc='Run IOC simulating detector acquisition',
+            supported_async_libs=('asyncio',))
+    parser.add_argument('--latency', type=float, default=0.1,
+                        help='seconds per frame')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra seconds per frame, at most')
+    args = parser.parse_args()
+    ioc_options, run_options = split_args(args)
+    ioc_options.pop('macros')
+
+    ioc = AcquireSimIOC(latency=args.latency, jitter=args.jitter,
+                        **ioc_options)
+    run(ioc.pvdb, **run_options)
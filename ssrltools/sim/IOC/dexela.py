@@ -1,21 +1,93 @@
 '''
-     # Functionality items
-    # TODO: Initialize image array
-    #   Write to ArrayData PV
-    # TODO: Acquire triggering image refresh -> Update ROIs and other info
-    # TODO: Deal with filestore plugin, rudimentary operation 
-    #   Write array data as TIFF with every trigger
+Simulated Dexela 2923 areaDetector IOC
+
+Acquire (ImageMode Single, Multiple or Continuous) produces 2D frames of
+SizeY x SizeX pixels, one every max(AcquireTime, AcquirePeriod) seconds,
+published on IMAGE1:ArrayData along with HighestPixel.  With the TIFF:
+plugin (DexelaDet15Group), each frame is also written as a TIFF file, the
+way DexelaTiffPlugin / FileStoreTIFFIterativeWrite stage it.
+
+Frames are filled in place in a preallocated ring of buffers
+(FrameRing), and files are written from a background thread, so the
+frame rate is not tied to the disk.  A buffer waiting to be written is
+not refilled until the write finishes.
+
+usage:
+    python -m ssrltools.sim.IOC.dexela --size 1944x1536 --frame-rate 10
 '''
+import asyncio
+import time
 
-from caproto.server import (pvproperty, PVGroup, ioc_arg_parser,
+import numpy as np
+import tifffile
+
+from caproto import ChannelType
+from caproto.server import (pvproperty, PVGroup, template_arg_parser,
                              run, get_pv_pair_wrapper, SubGroup)
 
-import numpy as np
-from scipy import signal
+from ssrltools.background import BackgroundWriter
+from ssrltools.sim.IOC.fileplugin import PendingWrites, put_file_path
 
 pvproperty_with_rbv = get_pv_pair_wrapper(setpoint_suffix='',
                                           readback_suffix='_RBV')
 
+MAX_SIZE = (3888, 3072)     # Dexela 2923, (x, y)
+PORT_NAME = 'DEX1'          # matches areadetectors.HackedCam
+DATA_TYPES = ('Int8', 'UInt8', 'Int16', 'UInt16', 'Int32', 'UInt32',
+              'Float32', 'Float64')   # frames are Int32
+
+
+class FrameRing(object):
+    '''Preallocated ring of int32 frame buffers, filled in place
+
+    Each frame is a fixed pattern (powder rings on a flat background)
+    plus one of a few noise frames, all computed up front, added into the
+    next buffer of the ring: nothing is allocated per frame.  A buffer
+    handed to a writer with hold() is not refilled until its write
+    finishes.
+    '''
+    def __init__(self, shape, depth=8, num_noise=5, seed=0):
+        self.shape = tuple(shape)
+        self.depth = depth
+        self.count = 0
+        self.buffers = np.zeros((depth,) + self.shape, dtype=np.int32)
+        self._pending = [None] * depth
+
+        rng = np.random.default_rng(seed)
+        self._pattern = self.powder_pattern(self.shape)
+        self._noise = rng.poisson(20, size=(num_noise,) + self.shape
+                                  ).astype(np.int32)
+
+    @staticmethod
+    def powder_pattern(shape, num_rings=6, background=100):
+        '''Debye rings centered on the detector'''
+        y, x = np.indices(shape, dtype=np.float32)
+        r = np.hypot(y - shape[0] / 2, x - shape[1] / 2)
+        r_max = r.max()
+        pattern = np.full(shape, background, dtype=np.float32)
+        for k in range(1, num_rings + 1):
+            radius = r_max * k / (num_rings + 1)
+            pattern += 4000 / k * np.exp(-(r - radius)**2 / 18)
+        return pattern.astype(np.int32)
+
+    def hold(self, slot, future):
+        '''keep buffer slot until future (a concurrent.futures.Future) is done'''
+        self._pending[slot] = future
+
+    async def next_frame(self):
+        '''fill the next buffer with a new frame, returns (slot, frame)'''
+        slot = self.count % self.depth
+        pending = self._pending[slot]
+        if pending is not None:
+            if not pending.done():
+                await asyncio.wait([asyncio.wrap_future(pending)])
+            self._pending[slot] = None
+        frame = self.buffers[slot]
+        np.add(self._pattern, self._noise[self.count % len(self._noise)],
+               out=frame)
+        self.count += 1
+        return slot, frame
+
 
 class DexelaDet15noTiffGroup(PVGroup):
     # configuration_names = pvproperty(name=None, dtype=float)
@@ -32,8 +104,11 @@ class DexelaDet15noTiffGroup(PVGroup):
         pool_max_mem = pvproperty(name='PoolMaxMem', dtype=float, read_only=True)
         pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=float, read_only=True)
         pool_used_mem = pvproperty(name='PoolUsedMem', dtype=float, read_only=True)
-        port_name = pvproperty(name='PortName_RBV', dtype=str, read_only=True)
-        acquire = pvproperty_with_rbv(name='Acquire', dtype=float)
+        port_name = pvproperty(name='PortName_RBV', dtype=ChannelType.STRING,
+                               read_only=True)
+        acquire = pvproperty(name='Acquire', value=0, dtype=int)
+        acquire_rbv = pvproperty(name='Acquire_RBV', value=0, dtype=int,
+                                 read_only=True)
         acquire_period = pvproperty_with_rbv(name='AcquirePeriod', dtype=float)
         acquire_time = pvproperty_with_rbv(name='AcquireTime', dtype=float)
         array_callbacks = pvproperty_with_rbv(name='ArrayCallbacks', dtype=float)
@@ -49,7 +124,11 @@ class DexelaDet15noTiffGroup(PVGroup):
         bin_x = pvproperty_with_rbv(name='BinX', dtype=float)
         bin_y = pvproperty_with_rbv(name='BinY', dtype=float)
         color_mode = pvproperty_with_rbv(name='ColorMode', dtype=float)
-        data_type = pvproperty_with_rbv(name='DataType', dtype=float)
+        # a record, for the DataType_RBV.DISA field
+        data_type = pvproperty_with_rbv(name='DataType', value='Int32',
+                                        dtype=ChannelType.ENUM,
+                                        enum_strings=DATA_TYPES,
+                                        readback_kw=dict(record='mbbi'))
         detector_state = pvproperty(name='DetectorState_RBV', dtype=float, read_only=True)
         frame_type = pvproperty_with_rbv(name='FrameType', dtype=float)
         gain = pvproperty_with_rbv(name='Gain', dtype=float)
@@ -128,18 +207,320 @@ class DexelaDet15noTiffGroup(PVGroup):
         use_gain = pvproperty(name='DEXUseGain', dtype=float)
         use_offset = pvproperty(name='DEXUseOffset', dtype=float)
 
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._task = None
+
+        @acquire.startup
+        async def acquire(self, instance, async_lib):
+            # sensor size, frame size and rate given to the IOC
+            det = self.parent
+            await self.port_name.write(PORT_NAME)
+            await self.max_size.max_size_x.write(MAX_SIZE[0])
+            await self.max_size.max_size_y.write(MAX_SIZE[1])
+            await self.size.size_x.setpoint.write(det.frame_size[0])
+            await self.size.size_y.setpoint.write(det.frame_size[1])
+            await self.array_size.array_size_x.write(det.frame_size[0])
+            await self.array_size.array_size_y.write(det.frame_size[1])
+            await self.acquire_period.setpoint.write(1. / det.frame_rate)
+            await self.num_images.setpoint.write(1)
+
+        @acquire.putter
+        async def acquire(self, instance, value):
+            if value and self._task is None:
+                self._task = asyncio.get_running_loop().create_task(
+                                                        self._acquire())
+            elif not value and self._task is not None:
+                self._task.cancel()
+            return value
+
+        async def _acquire(self):
+            det = self.parent
+            mode = int(self.image_mode.readback.value)
+            # Single, Multiple, Continuous (None)
+            num = (1, max(int(self.num_images.readback.value), 1),
+                   None)[min(max(mode, 0), 2)]
+            period = max(self.acquire_time.readback.value,
+                         self.acquire_period.readback.value)
+            shape = (min(max(int(self.size.size_y.readback.value), 1),
+                         MAX_SIZE[1]),
+                     min(max(int(self.size.size_x.readback.value), 1),
+                         MAX_SIZE[0]))
+            ring = det.frame_ring(shape)
+
+            await self.acquire_rbv.write(1)
+            await self.detector_state.write(1)
+            await self.num_images_counter.write(0)
+            await self.array_size.array_size_x.write(shape[1])
+            await self.array_size.array_size_y.write(shape[0])
+            await self.array_size_bytes.write(ring.buffers[0].nbytes)
+            try:
+                n = 0
+                t_next = time.monotonic()
+                while num is None or n < num:
+                    t_next += period
+                    await asyncio.sleep(max(t_next - time.monotonic(), 0))
+                    slot, frame = await ring.next_frame()
+                    n += 1
+                    await self.num_images_counter.write(n)
+                    await self.array_counter.readback.write(
+                                        self.array_counter.readback.value + 1)
+                    await det.publish(ring, slot, frame)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._task = None
+                await self.detector_state.write(0)
+                await self.acquire_rbv.write(0)
+                await self.acquire.write(0, verify_value=False)
+
     cam = SubGroup(DexelaDetectorCamGroup, prefix='')
 
-    image = pvproperty(name='ArrayData', dtype=float)
+    class ImageGroup(PVGroup):
+        array_data = pvproperty(name='ArrayData', dtype=int, value=[0],
+                                max_length=MAX_SIZE[0] * MAX_SIZE[1],
+                                read_only=True)
+
+    image = SubGroup(ImageGroup, prefix='IMAGE1:')
+
+    highest_pixel = pvproperty(name='HighestPixel', value=0, dtype=int,
+                               read_only=True)
+
+    def __init__(self, *args, frame_size=(1024, 1024), frame_rate=10.,
+                 ring_depth=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.frame_size = frame_size        # (x, y)
+        self.frame_rate = frame_rate
+        self.ring_depth = ring_depth
+        self._ring = None
+
+    def frame_ring(self, shape):
+        '''ring of frame buffers, reallocated only when the size changes'''
+        if self._ring is None or self._ring.shape != shape:
+            self._ring = FrameRing(shape, depth=self.ring_depth)
+        return self._ring
+
+    async def publish(self, ring, slot, frame):
+        '''hand a new frame to the plugins'''
+        # a flat view: clients see the buffer, until the ring comes around
+        await self.image.array_data.write(frame.reshape(-1))
+        await self.highest_pixel.write(int(frame.max()))
+
+    def close(self):
+        '''release the plugins' writer threads, once the server is done'''
+
+
+async def _put_capture(obj, instance, value):
+    '''Capture: count captured frames from 0'''
+    if value:
+        await obj.parent.num_captured.write(0)
+    await obj.readback.write(value)
+
+
+class TIFFPluginGroup(PVGroup):
+    '''NDFileTIFF plugin: one file per frame, written on a background thread
+
+    Frames are written when AutoSave is Yes in Single mode, or while
+    Capture is on (up to NumCapture frames, 0 for no limit).  Frames
+    arriving with QueueSize writes pending are dropped, and counted in
+    DroppedArrays.
+    '''
+    auto_increment = pvproperty_with_rbv(name='AutoIncrement', value='Yes',
+                                         dtype=ChannelType.ENUM,
+                                         enum_strings=('No', 'Yes'))
+    auto_save = pvproperty_with_rbv(name='AutoSave', value='No',
+                                    dtype=ChannelType.ENUM,
+                                    enum_strings=('No', 'Yes'))
+    capture = pvproperty_with_rbv(name='Capture', value=0, dtype=int,
+                                  put=_put_capture)
+    delete_driver_file = pvproperty_with_rbv(name='DeleteDriverFile',
+                                             value=0, dtype=int)
+    file_format = pvproperty_with_rbv(name='FileFormat', value=0, dtype=int)
+    file_name = pvproperty_with_rbv(name='FileName', value='',
+                                    dtype=ChannelType.CHAR, max_length=256,
+                                    string_encoding='latin-1')
+    file_number = pvproperty_with_rbv(name='FileNumber', value=0, dtype=int)
+    file_number_sync = pvproperty(name='FileNumber_Sync', value=0, dtype=int)
+    file_number_write = pvproperty(name='FileNumber_write', value=0,
+                                   dtype=int)
+    file_path = pvproperty_with_rbv(name='FilePath', value='',
+                                    dtype=ChannelType.CHAR, max_length=256,
+                                    string_encoding='latin-1',
+                                    put=put_file_path)
+    file_path_exists = pvproperty(name='FilePathExists_RBV', value=0,
+                                  dtype=int, read_only=True)
+    file_template = pvproperty_with_rbv(name='FileTemplate',
+                                        value='%s%s_%6.6d.tiff',
+                                        dtype=ChannelType.CHAR,
+                                        max_length=256,
+                                        string_encoding='latin-1')
+    file_write_mode = pvproperty_with_rbv(name='FileWriteMode',
+                                          value='Single',
+                                          dtype=ChannelType.ENUM,
+                                          enum_strings=('Single', 'Capture',
+                                                        'Stream'))
+    full_file_name = pvproperty(name='FullFileName_RBV', value='',
+                                dtype=ChannelType.CHAR, max_length=256,
+                                string_encoding='latin-1', read_only=True)
+    num_capture = pvproperty_with_rbv(name='NumCapture', value=0, dtype=int)
+    num_captured = pvproperty(name='NumCaptured_RBV', value=0, dtype=int,
+                              read_only=True)
+    read_file = pvproperty_with_rbv(name='ReadFile', value=0, dtype=int)
+    write_file = pvproperty_with_rbv(name='WriteFile', value=0, dtype=int)
+    write_message = pvproperty(name='WriteMessage', value='',
+                               dtype=ChannelType.CHAR, max_length=256,
+                               string_encoding='latin-1')
+    write_status = pvproperty(name='WriteStatus', value=0, dtype=int)
+
+    array_counter = pvproperty_with_rbv(name='ArrayCounter', value=0,
+                                        dtype=int)
+    array_rate = pvproperty(name='ArrayRate_RBV', value=0.0, read_only=True)
+    asyn_io = pvproperty(name='AsynIO', dtype=float)
+    nd_attributes_file = pvproperty(name='NDAttributesFile', dtype=str)
+    pool_alloc_buffers = pvproperty(name='PoolAllocBuffers', dtype=float, read_only=True)
+    pool_free_buffers = pvproperty(name='PoolFreeBuffers', dtype=float, read_only=True)
+    pool_max_buffers = pvproperty(name='PoolMaxBuffers', dtype=float, read_only=True)
+    pool_max_mem = pvproperty(name='PoolMaxMem', dtype=float, read_only=True)
+    pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=float, read_only=True)
+    pool_used_mem = pvproperty(name='PoolUsedMem', dtype=float, read_only=True)
+    port_name = pvproperty(name='PortName_RBV', value='TIFF1',
+                           dtype=ChannelType.STRING, read_only=True)
+
+    class ArraySizeGroup(PVGroup):
+        depth = pvproperty(name='ArraySize2_RBV', value=0, dtype=int, read_only=True)
+        height = pvproperty(name='ArraySize1_RBV', value=0, dtype=int, read_only=True)
+        width = pvproperty(name='ArraySize0_RBV', value=0, dtype=int, read_only=True)
+
+    array_size = SubGroup(ArraySizeGroup, prefix='')
+
+    bayer_pattern = pvproperty(name='BayerPattern_RBV', dtype=int, read_only=True)
+    blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks',
+                                             value='No',
+                                             dtype=ChannelType.ENUM,
+                                             enum_strings=('No', 'Yes'))
+    color_mode = pvproperty(name='ColorMode_RBV', dtype=int, read_only=True)
+    data_type = pvproperty(name='DataType_RBV', value='Int32',
+                           dtype=ChannelType.ENUM, enum_strings=DATA_TYPES,
+                           read_only=True)
+
+    class DimSaGroup(PVGroup):
+        dim0 = pvproperty(name='Dim0SA', dtype=int)
+        dim1 = pvproperty(name='Dim1SA', dtype=int)
+        dim2 = pvproperty(name='Dim2SA', dtype=int)
+
+    dim_sa = SubGroup(DimSaGroup, prefix='')
+
+    dimensions = pvproperty(name='Dimensions_RBV', value=[0, 0], dtype=int,
+                            max_length=10, read_only=True)
+    dropped_arrays = pvproperty_with_rbv(name='DroppedArrays', value=0,
+                                         dtype=int)
+    enable = pvproperty_with_rbv(name='EnableCallbacks', value='Enable',
+                                 dtype=ChannelType.ENUM,
+                                 enum_strings=('Disable', 'Enable'))
+    min_callback_time = pvproperty_with_rbv(name='MinCallbackTime', dtype=float)
+    nd_array_address = pvproperty_with_rbv(name='NDArrayAddress', dtype=int)
+    nd_array_port = pvproperty_with_rbv(name='NDArrayPort', value=PORT_NAME,
+                                        dtype=ChannelType.STRING)
+    ndimensions = pvproperty(name='NDimensions_RBV', value=2, dtype=int,
+                             read_only=True)
+    plugin_type = pvproperty(name='PluginType_RBV', value='NDFileTIFF',
+                             dtype=ChannelType.STRING, read_only=True)
+    queue_free = pvproperty(name='QueueFree', value=20, dtype=int)
+    queue_free_low = pvproperty(name='QueueFreeLow', dtype=int)
+    queue_size = pvproperty(name='QueueSize', value=20, dtype=int)
+    queue_use = pvproperty(name='QueueUse', value=0, dtype=int)
+    queue_use_high = pvproperty(name='QueueUseHIGH', dtype=int)
+    queue_use_hihi = pvproperty(name='QueueUseHIHI', dtype=int)
+    time_stamp = pvproperty(name='TimeStamp_RBV', dtype=float, read_only=True)
+    unique_id = pvproperty(name='UniqueId_RBV', dtype=int, read_only=True)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # bounded by QueueSize instead: full queue drops frames
+        self._writer = BackgroundWriter(maxsize=0, name='TIFFWriter')
+        self._writes = PendingWrites(self, self._writer)
+
+    def close(self):
+        '''write out the pending frames and stop the writer thread'''
+        self._writer.close()
+
+    def _should_write(self):
+        if self.file_write_mode.readback.value == 'Single':
+            return self.auto_save.readback.value == 'Yes'
+        return bool(self.capture.readback.value)
+
+    async def array_arrived(self, ring, slot, frame, timestamp):
+        '''NDArray callback: count the frame, and write it if capturing'''
+        if self.enable.readback.value != 'Enable':
+            return
+        uid = self.array_counter.readback.value + 1
+        await self.array_counter.readback.write(uid)
+        await self.unique_id.write(uid)
+        await self.time_stamp.write(timestamp)
+        await self.array_size.width.write(frame.shape[1])
+        await self.array_size.height.write(frame.shape[0])
+        await self.dimensions.write([frame.shape[1], frame.shape[0]])
+        if not self._should_write():
+            return
+        if len(self._writes) >= self.queue_size.value:
+            await self.dropped_arrays.readback.write(
+                                    self.dropped_arrays.readback.value + 1)
+            return
+
+        number = self.file_number.readback.value
+        filename = self.file_template.readback.value % (
+                        self.file_path.readback.value,
+                        self.file_name.readback.value, number)
+        await self.full_file_name.write(filename)
+        if self.auto_increment.readback.value == 'Yes':
+            await self.file_number.setpoint.write(number + 1)
+
+        future = await self._writes.submit(tifffile.imwrite, filename, frame)
+        ring.hold(slot, future)
+
+        if self.file_write_mode.readback.value != 'Single':
+            captured = self.num_captured.value + 1
+            await self.num_captured.write(captured)
+            if captured == self.num_capture.readback.value:
+                await self.capture.setpoint.write(0)
+
+
+class DexelaDet15Group(DexelaDet15noTiffGroup):
+    '''Dexela with the TIFF: file plugin, as DexelaDet15'''
+    tiff = SubGroup(TIFFPluginGroup, prefix='TIFF:')
+
+    async def publish(self, ring, slot, frame):
+        await super().publish(ring, slot, frame)
+        await self.tiff.array_arrived(ring, slot, frame, time.time())
+
+    def close(self):
+        self.tiff.close()
+
 
 if __name__ == '__main__':
-    ioc_options, run_options = ioc_arg_parser(
+    parser, split_args = template_arg_parser(
             default_prefix='SSRL:DEX2923:',
-            desc='Run IOC simulating Xspress3')
+            desc='Run IOC simulating a Dexela 2923',
+            supported_async_libs=('asyncio',))
+    parser.add_argument('--size', default='1024x1024',
+                        help='frame size, WIDTHxHEIGHT')
+    parser.add_argument('--frame-rate', type=float, default=10.,
+                        help='frames per second, sets AcquirePeriod')
+    parser.add_argument('--ring', type=int, default=8,
+                        help='number of frame buffers')
+    parser.add_argument('--no-tiff', action='store_true',
+                        help='leave out the TIFF plugin')
+    args = parser.parse_args()
+    ioc_options, run_options = split_args(args)
+    ioc_options.pop('macros')
 
-    # Instantiate IOC, assigning prefix for PV names
-    ioc = DexelaDet15noTiffGroup(**ioc_options)
-    print('PVs:', list(ioc.pvdb))
+    cls = DexelaDet15noTiffGroup if args.no_tiff else DexelaDet15Group
+    ioc = cls(frame_size=tuple(int(n) for n in args.size.split('x')),
+              frame_rate=args.frame_rate, ring_depth=args.ring,
+              **ioc_options)
 
     # Run IOC
-    run(ioc.pvdb, **run_options)
\ No newline at end of file
+    try:
+        run(ioc.pvdb, **run_options)
+    finally:
+        ioc.close()
@@ -0,0 +1,49 @@
+'''
+Pieces shared by the simulated areaDetector file plugins (TIFF: of the
+Dexela, HDF5: of the Xspress3): the FilePath put hook, and the count of
+queued writes that the plugin reports in QueueUse.
+'''
+import asyncio
+import os
+
+
+async def put_file_path(obj, instance, value):
+    '''FilePath: check the directory exists, as areaDetector does'''
+    await obj.readback.write(value)
+    await obj.parent.file_path_exists.write(int(os.path.isdir(value)))
+
+
+class PendingWrites(object):
+    '''Writes queued on a BackgroundWriter by a file plugin group
+
+    The number not written yet goes to the group's QueueUse, and the
+    outcome of each write to its WriteStatus and WriteMessage.
+
+    usage:
+        self._writes = PendingWrites(self, BackgroundWriter(maxsize=0))
+        future = await self._writes.submit(tifffile.imwrite, name, frame)
+    '''
+    def __init__(self, group, writer):
+        self.group = group
+        self.writer = writer
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    async def submit(self, func, *args):
+        '''queue func(*args) on the writer, and return its Future'''
+        future = self.writer.submit(func, *args)
+        self.count += 1
+        await self.group.queue_use.write(self.count)
+        asyncio.get_running_loop().create_task(self._written(future))
+        return future
+
+    async def _written(self, future):
+        await asyncio.wait([asyncio.wrap_future(future)])
+        self.count -= 1
+        await self.group.queue_use.write(self.count)
+        exc = future.exception()
+        await self.group.write_status.write(int(exc is not None))
+        await self.group.write_message.write(
+                                    '' if exc is None else str(exc)[:255])
@@ -1,19 +1,149 @@
 '''
-Classes for use in simulated caproto beamline 
+Classes for use in simulated caproto beamline
 Classes here extend PV groups and add functionality
 
+Motors follow a trapezoidal velocity profile: they reach VELO in ACCL
+seconds, cruise, then slow down over ACCL seconds (a triangular profile
+for moves too short to reach VELO).  This is the model of
+ssrltools.ordering.estimate_travel_time, so travel-time estimates can be
+checked against the simulator.  One MotionEngine per group advances all
+its moving axes at tick_rate Hz, updating RBV, DRBV, RRBV, TDIR, MOVN and
+DMOV, and sleeps while nothing moves.
 
+usage:
+    python -m ssrltools.sim.IOC.motors --axes 24 --tick-rate 50
 '''
+import asyncio
+import math
 import time
-import random
 
-from caproto import ChannelType
-from caproto.server import pvproperty, PVGroup, get_pv_pair_wrapper
+from caproto import ChannelType, SkipWrite
+from caproto.server import (pvproperty, PVGroup, get_pv_pair_wrapper,
+                            template_arg_parser, run)
 from caproto.server.records import MotorFields, register_record
 
 pvproperty_with_rbv = get_pv_pair_wrapper(setpoint_suffix='',
                                           readback_suffix='_RBV')
 
+
+class TrapezoidMove(object):
+    '''Position along one move, from start to target
+
+    Accelerates to velocity in accel_time seconds, or straight to it if
+    accel_time is 0.  duration is the time the whole move takes.
+    '''
+    def __init__(self, start, target, velocity, accel_time):
+        self.start = start
+        self.target = target
+        self.direction = 1 if target >= start else -1
+        self.distance = d = abs(target - start)
+        if d == 0 or velocity <= 0:
+            self._accel = self._ramp = self._peak = 0.
+            self.duration = 0.
+        elif accel_time <= 0:
+            self._accel = self._ramp = 0.
+            self._peak = velocity
+            self.duration = d / velocity
+        else:
+            self._accel = velocity / accel_time
+            # too short to reach velocity: peaks half way
+            self._ramp = min(accel_time, math.sqrt(d / self._accel))
+            self._peak = self._accel * self._ramp
+            self.duration = (2 * self._ramp +
+                             (d - self._accel * self._ramp**2) / self._peak)
+
+    def position(self, t):
+        '''position t seconds into the move'''
+        if t >= self.duration:
+            return self.target
+        if t < self._ramp:
+            travelled = self._accel * t**2 / 2
+        elif self.duration - t < self._ramp:
+            travelled = (self.distance -
+                         self._accel * (self.duration - t)**2 / 2)
+        else:
+            travelled = (self._accel * self._ramp**2 / 2 +
+                         self._peak * (t - self._ramp))
+        return self.start + self.direction * travelled
+
+
+class MotionEngine(object):
+    '''Moves every SSRL_motor record of a group, from one asyncio task
+
+    The task ticks tick_rate times a second while any axis moves, and
+    waits for the next move otherwise.  A put to VAL during a move starts
+    a new move from the current position; STOP halts the axis where it is.
+    A STOP left set, as by a put while idle, is cleared when a move starts.
+    '''
+    def __init__(self, tick_rate=20.):
+        self.tick_rate = tick_rate
+        self.ticks = 0
+        self._moves = {}        # record fields -> (TrapezoidMove, start time)
+        self._wake = None
+        self._task = None
+
+    @property
+    def moving(self):
+        return len(self._moves)
+
+    def is_moving(self, fields):
+        return fields in self._moves
+
+    async def move(self, fields, target):
+        '''start moving the axis of fields toward target'''
+        if fields.stop.value:
+            await fields.stop.write(0)
+        start = fields.user_readback_value.value
+        move = TrapezoidMove(start, target, fields.velocity.value,
+                             fields.seconds_to_velocity.value)
+        self._moves[fields] = (move, time.monotonic())
+        await fields.direction_of_travel.write(int(move.direction > 0))
+        await fields.done_moving_to_value.write(0)
+        await fields.motor_is_moving.write(1)
+
+        if self._task is None or self._task.done():
+            self._wake = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        self._wake.set()
+
+    async def _run(self):
+        tick = 1. / self.tick_rate
+        next_tick = time.monotonic()
+        while True:
+            if not self._moves:
+                self._wake.clear()
+                await self._wake.wait()
+                next_tick = time.monotonic()
+            now = time.monotonic()
+            for fields, (move, t0) in list(self._moves.items()):
+                if fields.stop.value:
+                    await self._halt(fields)
+                    continue
+                pos = move.position(now - t0)
+                await fields.update_readback(pos)
+                if pos == move.target:
+                    await self._finish(fields)
+            self.ticks += 1
+            next_tick += tick
+            await asyncio.sleep(max(next_tick - time.monotonic(), 0))
+
+    async def _halt(self, fields):
+        # leave VAL where the axis stopped, without starting a move
+        await fields.parent.write(fields.user_readback_value.value,
+                                  update_fields=False)
+        await fields.stop.write(0)
+        await self._finish(fields)
+
+    async def _finish(self, fields):
+        del self._moves[fields]
+        await fields.motor_is_moving.write(0)
+        await fields.done_moving_to_value.write(1)
+
+
+# axes of groups without their own engine
+DEFAULT_ENGINE = MotionEngine()
+
+
 @register_record
 class MotorFieldsSSRL(MotorFields):
     _record_type = 'SSRL_motor'
@@ -21,41 +151,91 @@ class MotorFieldsSSRL(MotorFields):
     # Need to duplicate motor field to extend or override
     user_readback_value = pvproperty(name='RBV', dtype=ChannelType.DOUBLE,
                                      doc='User Readback Value', read_only=True)
+    velocity = pvproperty(name='VELO', dtype=ChannelType.DOUBLE, value=1.0,
+                          doc='Velocity (EGU/s)')
+    limit_violation = pvproperty(name='LVIO', dtype=ChannelType.INT, value=0,
+                                 doc='Limit violation', read_only=True)
+    stop = pvproperty(name='STOP', dtype=ChannelType.INT, value=0,
+                      doc='Stop')
+
+    @property
+    def engine(self):
+        return getattr(self.parent.group, 'motion', DEFAULT_ENGINE)
 
-    # scanner updates RBV periodically based on setpoint value
-    @user_readback_value.scan(period=1)
-    async def user_readback_value(self, instance, async_lib):
-        setpoint = self.parent.value    
-        pos = setpoint + random.random() / 100.0
+    @stop.putter
+    async def stop(self, instance, value):
+        # an idle axis has nothing to stop: reset at once, as the motor
+        # record does; a moving one is halted on the engine's next tick
+        if not self.engine.is_moving(self):
+            return 0
+        return value
 
-        # Set use, dial, raw readbacks
+    async def value_write_hook(self, instance, value):
+        # a put to VAL: refuse it past the soft limits (unless HLM == LLM,
+        # as in the motor record), else move there
+        low, high = self.user_low_limit.value, self.user_high_limit.value
+        violation = low != high and not low <= value <= high
+        await self.limit_violation.write(int(violation))
+        if violation:
+            raise SkipWrite()
+        await self.engine.move(self, value)
+
+    async def update_readback(self, pos):
+        '''set user, dial and raw readbacks from the user position'''
         timestamp = time.time()
-        await instance.write(pos, timestamp=timestamp) # user_readback_value
+        dial = pos - self.user_offset.value
+        step = self.motor_step_size.value
+        await self.user_readback_value.write(pos, timestamp=timestamp)
         # self here is MotorFields, with attributes other than user_readback_value
-        await self.dial_readback_value.write(pos, timestamp=timestamp)
-        await self.raw_readback_value.write(int(pos * 100000.), 
-                                            timestamp=timestamp) 
+        await self.dial_readback_value.write(dial, timestamp=timestamp)
+        await self.raw_readback_value.write(int(round(dial / step))
+                                            if step else 0,
+                                            timestamp=timestamp)
+
+
+class MotionGroup(PVGroup):
+    '''Group of SSRL_motor records, moved by one MotionEngine'''
+    def __init__(self, *args, tick_rate=20., **kwargs):
+        super().__init__(*args, **kwargs)
+        self.motion = MotionEngine(tick_rate=tick_rate)
+
 
-class IMSMotorsSSRL(PVGroup):
+class IMSMotorsSSRL(MotionGroup):
     '''
     Group for IMS motor IOC
     '''
     # Define records, try custom motor record
-    stagex = pvproperty(value=0.0, mock_record='SSRL_motor', name='MOTOR1')
-    stagey = pvproperty(value=0.0, mock_record='SSRL_motor', name='MOTOR2')
-    stagez = pvproperty(value=0.0, mock_record='SSRL_motor', name='MOTOR3')
-    stageth = pvproperty(value=0.0, mock_record='SSRL_motor', name='MOTOR4')
-
-    # Functionality items
-    # TODO: Initialize values for (limits, position, velo, accl)
-    # TODO: Update of RBV with setpoint update
-    # TODO: 
-
-    @stagex.startup
-    async def stagex(self, instance, async_lib):
-        # Could initialize PV values here.  
-        await instance.write(9)
-        await instance.fields['VELO'].write(1)
-        print(f'on startup, write {instance.value} to stagex')
-        print('velocity: {}'.format(self.stagex.fields['VELO'].value)) 
-        ## ???? Why doesn't f-string work
+    stagex = pvproperty(value=0.0, record='SSRL_motor', name='MOTOR1')
+    stagey = pvproperty(value=0.0, record='SSRL_motor', name='MOTOR2')
+    stagez = pvproperty(value=0.0, record='SSRL_motor', name='MOTOR3')
+    stageth = pvproperty(value=0.0, record='SSRL_motor', name='MOTOR4')
+
+
+def motor_group(num_axes, name='SimMotors'):
+    '''
+    MotionGroup class with num_axes motors, PVs MOTOR1 ... MOTOR<num_axes>
+
+    usage:
+        ioc = motor_group(48)(prefix='SIM:', tick_rate=50)
+    '''
+    axes = {f'motor{i}': pvproperty(value=0.0, record='SSRL_motor',
+                                    name=f'MOTOR{i}')
+            for i in range(1, num_axes + 1)}
+    return type(name, (MotionGroup,), axes)
+
+
+if __name__ == '__main__':
+    parser, split_args = template_arg_parser(
+            default_prefix='BL00:IMS:',
+            desc='Run IOC simulating motors',
+            supported_async_libs=('asyncio',))
+    parser.add_argument('--axes', type=int, default=4,
+                        help='number of motors, MOTOR1 ... MOTOR<axes>')
+    parser.add_argument('--tick-rate', type=float, default=20.,
+                        help='readback updates per second, while moving')
+    args = parser.parse_args()
+    ioc_options, run_options = split_args(args)
+    ioc_options.pop('macros')
+
+    ioc = motor_group(args.axes)(tick_rate=args.tick_rate, **ioc_options)
+    run(ioc.pvdb, **run_options)
@@ -1,38 +1,177 @@
 '''
-Xspress3 caproto group setup
-    # Functionality items.  
-    # TODO: Initialize array MCA 
-    #   What does MCA look like?
-    # TODO: Acquire triggering image refresh -> Update ROIs and other info
-    # TODO: Deal with filestore plugin, rudimentary operation 
-    #   Write file with MCA with every trigger
+Simulated Xspress3 IOC
+
+Acquire (ImageMode Single, Multiple or Continuous) produces MCA frames of
+NUM_CHANNELS x num_bins counts, one every max(AcquireTime, AcquirePeriod)
+seconds, updating ArrayCounter, FRAME_COUNT_RBV and the Value_RBV /
+ValueSum_RBV of every enabled ROI (bounds from C<n>_MCA_ROI<m>_LLM/HLM)
+and the ARR<n>:ArrayData spectrum of each channel.
+
+Spectra are drawn from a peak library computed once at startup
+(SpectrumSource): each channel sees a few fluorescence lines, and a block
+of frames is one matrix product and one Poisson draw.
+
+While HDF5:Capture is on, frames are appended to an HDF5 file in the
+layout read by Xspress3HDF5Handler (CaptureFile), from a background
+thread.  Capture reads back as done once NumCapture frames are in and
+the file is closed, as Xspress3FileStore.unstage expects.
+
+usage:
+    python -m ssrltools.sim.IOC.xspress --bins 4096 --file-path /tmp/
 '''
+import asyncio
+import os
+import tempfile
+import time
 
-from caproto.server import (pvproperty, PVGroup, ioc_arg_parser,
+import h5py
+import numpy as np
+
+from caproto import ChannelType
+from caproto.server import (pvproperty, PVGroup, template_arg_parser,
                              run, get_pv_pair_wrapper, SubGroup)
 
-import numpy as np
-from scipy import signal
+from ssrltools.background import BackgroundWriter
+from ssrltools.sim.IOC.fileplugin import PendingWrites, put_file_path
 
 pvproperty_with_rbv = get_pv_pair_wrapper(setpoint_suffix='',
                                           readback_suffix='_RBV')
 
-def generate_sim_MCA(num_peaks, length):
+NUM_BINS = 4096
+MAX_BINS = 16384        # longest ARR<n>:ArrayData spectrum
+NUM_CHANNELS = 2
+NUM_ROIS = 16
+PORT_NAME = 'XSP3'
+# as read by Xspress3HDF5Handler, and handlers.xspress3.FMT_ROI_KEY
+DATA_KEY = 'entry/instrument/detector/data'
+ROI_KEY = 'entry/instrument/detector/NDAttributes/CHAN{}ROI{}'
+IMAGE_MODES = ('Single', 'Multiple', 'Continuous')
+TRIGGER_MODES = ('Software', 'Internal', 'IDC', 'TTL Veto Only',
+                 'TTL Both', 'LVDS Veto Only', 'LVDS Both')
+COMPRESSION = ('None', 'N-bit', 'szip', 'zlib', 'blosc')
+
+
+def peak_library(num_peaks, length=NUM_BINS, rng=None):
+    '''
+    num_peaks unit-area Gaussians of length bins, shape (num_peaks, length)
+
+    Centers and widths are random, scaled from a 4096 bin MCA.
+    '''
+    rng = np.random.default_rng(rng)
+    scale = length / NUM_BINS
+    mean = rng.uniform(60, 4000, size=(num_peaks, 1)) * scale
+    std = rng.uniform(40, 60, size=(num_peaks, 1)) * scale
+    x = np.arange(length)
+    return (np.exp(-(x - mean)**2 / (2 * std**2)) /
+            (std * np.sqrt(2 * np.pi)))
+
+
+def generate_sim_MCA(num_peaks, length=NUM_BINS):
     '''
     Output sample MCA with some noise
     '''
-    out = np.zeros(length)
-    def gauss(mean, std, length):
-        ''' Quick gaussian distribution function '''
-        x = np.arange(length)
-        return 1/(std * np.sqrt(2*np.pi)) * np.exp(-(x - mean)**2/(2*std**2))
+    return peak_library(num_peaks, length).sum(axis=0)
+
 
-    for _ in range(num_peaks): # Add 3 gaussian peaks
-        std = np.random.randint(40, 60)
-        mean = np.random.randint(60, 4000)
-        out += gauss(mean, std, 4096)
+class SpectrumSource(object):
+    '''MCA frames drawn from a precomputed peak library
+
+    Each channel gets num_peaks lines of the library, of random strength,
+    on a flat background: its expected spectrum is computed once.  Frames
+    scale it by a per-frame intensity (beam, sample) and add counting
+    noise, for all channels of a block of frames at once.
+    '''
+    def __init__(self, num_channels=NUM_CHANNELS, num_bins=NUM_BINS,
+                 num_lines=64, num_peaks=4, counts=1e5, background=0.2,
+                 seed=0):
+        self._rng = rng = np.random.default_rng(seed)
+        self.num_channels = num_channels
+        self.num_bins = num_bins
+        self.library = peak_library(num_lines, num_bins, rng)
+
+        # num_peaks distinct lines per channel
+        lines = rng.random((num_channels, num_lines)).argsort(axis=1)
+        weights = np.zeros((num_channels, num_lines))
+        np.put_along_axis(weights, lines[:, :num_peaks],
+                          counts * rng.uniform(0.2, 1., (num_channels,
+                                                         num_peaks)),
+                          axis=1)
+        self.expected = weights @ self.library + background
+
+    def frames(self, num):
+        '''num frames, shape (num, num_channels, num_bins), uint32'''
+        intensity = self._rng.uniform(0.8, 1.2, (num, self.num_channels, 1))
+        return self._rng.poisson(self.expected * intensity).astype(np.uint32)
+
+
+def roi_sums(frames, bounds):
+    '''
+    Sums of ROIs of frames (..., channels, bins), with bounds of shape
+    (channels, rois, 2): bin_low inclusive, bin_high exclusive, as in
+    devices.xspress3.cumsum_roi_sums.  Returns shape (..., channels, rois).
+    '''
+    num_bins = frames.shape[-1]
+    bounds = np.clip(bounds, 0, num_bins)
+    low = bounds[..., 0]
+    high = np.maximum(low, bounds[..., 1])
+    csum = np.zeros(frames.shape[:-1] + (num_bins + 1,), dtype=np.int64)
+    np.cumsum(frames, axis=-1, out=csum[..., 1:])
+    lead = (1,) * (frames.ndim - 2)
+    return (np.take_along_axis(csum, high.reshape(lead + high.shape), -1) -
+            np.take_along_axis(csum, low.reshape(lead + low.shape), -1))
+
+
+class CaptureFile(object):
+    '''One HDF5 capture, in the layout read by Xspress3HDF5Handler
+
+    Frames go to DATA_KEY, shape (frames, channels, bins), one chunk per
+    frame; the ROI sums of each frame to one ROI_KEY dataset per channel
+    and ROI, as NDAttributes.  Every method but __init__ runs on the
+    writer thread.
+    '''
+    def __init__(self, filename, num_channels, num_bins, num_rois,
+                 compression=None, level=None):
+        self.filename = filename
+        self.shape = (num_channels, num_bins)
+        self.num_rois = num_rois
+        self.compression = compression
+        self.level = level
+        self.num_frames = 0
+        self._file = None
+        self._data = None
+        self._rois = []
+
+    def open(self):
+        self._file = h5py.File(self.filename, 'w')
+        self._data = self._file.create_dataset(
+            DATA_KEY, shape=(0,) + self.shape, maxshape=(None,) + self.shape,
+            chunks=(1,) + self.shape, dtype=np.uint32,
+            compression=self.compression,
+            compression_opts=self.level if self.compression else None)
+
+    def append(self, frame, rois):
+        self._data.resize(self.num_frames + 1, axis=0)
+        self._data[self.num_frames] = frame
+        self._rois.append(rois)
+        self.num_frames += 1
+
+    def close(self):
+        rois = np.array(self._rois, dtype=np.float64).reshape(
+                    (self.num_frames, self.shape[0], self.num_rois))
+        for chan in range(self.shape[0]):
+            for roi in range(self.num_rois):
+                self._file.create_dataset(ROI_KEY.format(chan + 1, roi + 1),
+                                          data=rois[:, chan, roi])
+        self._file.close()
+
+
+async def _put_capture(obj, instance, value):
+    '''Capture: start a new file, or close the current one'''
+    if value:
+        await obj.parent.start_capture()
+    else:
+        await obj.parent.stop_capture()
 
-    return out
 
 class SSRLXspress3DetectorGroup(PVGroup):
     # configuration_names = pvproperty(name=None, dtype=int)
@@ -49,10 +188,13 @@ class SSRLXspress3DetectorGroup(PVGroup):
         pool_max_mem = pvproperty(name='PoolMaxMem', dtype=int, read_only=True)
         pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=int, read_only=True)
         pool_used_mem = pvproperty(name='PoolUsedMem', dtype=int, read_only=True)
-        port_name = pvproperty(name='PortName_RBV', dtype=str, read_only=True)
-        acquire = pvproperty_with_rbv(name='Acquire', dtype=int)    
-        acquire_period = pvproperty_with_rbv(name='AcquirePeriod', dtype=int)
-        acquire_time = pvproperty_with_rbv(name='AcquireTime', dtype=int)
+        port_name = pvproperty(name='PortName_RBV', value=PORT_NAME,
+                               dtype=ChannelType.STRING, read_only=True)
+        acquire = pvproperty(name='Acquire', value=0, dtype=int)
+        acquire_rbv = pvproperty(name='Acquire_RBV', value=0, dtype=int,
+                                 read_only=True)
+        acquire_period = pvproperty_with_rbv(name='AcquirePeriod', value=0.0)
+        acquire_time = pvproperty_with_rbv(name='AcquireTime', value=0.1)
         array_callbacks = pvproperty_with_rbv(name='ArrayCallbacks', dtype=int)
 
         class ArraySizeGroup(PVGroup):
@@ -67,10 +209,13 @@ class SSRLXspress3DetectorGroup(PVGroup):
         bin_y = pvproperty_with_rbv(name='BinY', dtype=int)
         color_mode = pvproperty_with_rbv(name='ColorMode', dtype=int)
         data_type = pvproperty_with_rbv(name='DataType', dtype=int)
-        detector_state = pvproperty(name='DetectorState_RBV', dtype=int, read_only=True)
+        detector_state = pvproperty(name='DetectorState_RBV', value=0,
+                                    dtype=int, read_only=True)
         frame_type = pvproperty_with_rbv(name='FrameType', dtype=int)
         gain = pvproperty_with_rbv(name='Gain', dtype=int)
-        image_mode = pvproperty_with_rbv(name='ImageMode', dtype=int)
+        image_mode = pvproperty_with_rbv(name='ImageMode', value='Single',
+                                         dtype=ChannelType.ENUM,
+                                         enum_strings=IMAGE_MODES)
         manufacturer = pvproperty(name='Manufacturer_RBV', dtype=int, read_only=True)
 
         class MaxSizeGroup(PVGroup):
@@ -84,8 +229,9 @@ class SSRLXspress3DetectorGroup(PVGroup):
         model = pvproperty(name='Model_RBV', dtype=int, read_only=True)
         num_exposures = pvproperty_with_rbv(name='NumExposures', dtype=int)
         num_exposures_counter = pvproperty(name='NumExposuresCounter_RBV', dtype=int, read_only=True)
-        num_images = pvproperty_with_rbv(name='NumImages', dtype=int)
-        num_images_counter = pvproperty(name='NumImagesCounter_RBV', dtype=int, read_only=True)
+        num_images = pvproperty_with_rbv(name='NumImages', value=1, dtype=int)
+        num_images_counter = pvproperty(name='NumImagesCounter_RBV', value=0,
+                                        dtype=int, read_only=True)
         read_status = pvproperty(name='ReadStatus', dtype=int)
 
         class ReverseGroup(PVGroup):
@@ -117,7 +263,9 @@ class SSRLXspress3DetectorGroup(PVGroup):
         temperature = pvproperty_with_rbv(name='Temperature', dtype=int)
         temperature_actual = pvproperty(name='TemperatureActual', dtype=int)
         time_remaining = pvproperty(name='TimeRemaining_RBV', dtype=int, read_only=True)
-        trigger_mode = pvproperty_with_rbv(name='TriggerMode', dtype=int)
+        trigger_mode = pvproperty_with_rbv(name='TriggerMode', value='Internal',
+                                           dtype=ChannelType.ENUM,
+                                           enum_strings=TRIGGER_MODES)
         config_path = pvproperty_with_rbv(name='CONFIG_PATH', dtype=str)
         config_save_path = pvproperty_with_rbv(name='CONFIG_SAVE_PATH', dtype=str)
         connect = pvproperty(name='CONNECT', dtype=int)
@@ -126,17 +274,21 @@ class SSRLXspress3DetectorGroup(PVGroup):
         ctrl_mca_roi = pvproperty_with_rbv(name='CTRL_MCA_ROI', dtype=int)
         debounce = pvproperty_with_rbv(name='DEBOUNCE', dtype=int)
         disconnect = pvproperty(name='DISCONNECT', dtype=int)
-        erase = pvproperty(name='ERASE', dtype=int)
-        frame_count = pvproperty(name='FRAME_COUNT_RBV', dtype=int, read_only=True)
+        erase = pvproperty(name='ERASE', value=0, dtype=int)
+        frame_count = pvproperty(name='FRAME_COUNT_RBV', value=0, dtype=int,
+                                 read_only=True)
         invert_f0 = pvproperty_with_rbv(name='INVERT_F0', dtype=int)
         invert_veto = pvproperty_with_rbv(name='INVERT_VETO', dtype=int)
         max_frames = pvproperty(name='MAX_FRAMES_RBV', dtype=int, read_only=True)
         max_frames_driver = pvproperty(name='MAX_FRAMES_DRIVER_RBV', dtype=int, read_only=True)
-        max_num_channels = pvproperty(name='MAX_NUM_CHANNELS_RBV', dtype=int, read_only=True)
+        max_num_channels = pvproperty(name='MAX_NUM_CHANNELS_RBV',
+                                      value=NUM_CHANNELS, dtype=int,
+                                      read_only=True)
         max_spectra = pvproperty_with_rbv(name='MAX_SPECTRA', dtype=int)
         xsp_name = pvproperty(name='NAME', dtype=int)
         num_cards = pvproperty(name='NUM_CARDS_RBV', dtype=int, read_only=True)
-        num_channels = pvproperty_with_rbv(name='NUM_CHANNELS', dtype=int)
+        num_channels = pvproperty_with_rbv(name='NUM_CHANNELS',
+                                           value=NUM_CHANNELS, dtype=int)
         num_frames_config = pvproperty_with_rbv(name='NUM_FRAMES_CONFIG', dtype=int)
         reset = pvproperty(name='RESET', dtype=int)
         restore_settings = pvproperty(name='RESTORE_SETTINGS', dtype=int)
@@ -144,21 +296,73 @@ class SSRLXspress3DetectorGroup(PVGroup):
         save_settings = pvproperty(name='SAVE_SETTINGS', dtype=int)
         trigger_signal = pvproperty(name='TRIGGER', dtype=int)
 
-        # acquire is pair setpt/rbv, need to watch the setpoint part
-        @acquire.setpoint.putter
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self._task = None
+
+        @acquire.startup
+        async def acquire(self, instance, async_lib):
+            num_bins = self.parent.spectra.num_bins
+            await self.max_spectra.setpoint.write(num_bins)
+            await self.array_size.array_size_x.write(num_bins)
+            await self.array_size.array_size_y.write(NUM_CHANNELS)
+
+        @acquire.putter
         async def acquire(self, instance, value):
-            image = generate_sim_MCA(4, 4096)
-            print('acquire triggered, generated sample MCA')
-            # Can navigate out of subgroup into other subgroups
-            await self.parent.parent.hdf5.width.write(4)
+            if value and self._task is None:
+                self._task = asyncio.get_running_loop().create_task(
+                                                        self._acquire())
+            elif not value and self._task is not None:
+                self._task.cancel()
+            return value
+
+        @erase.putter
+        async def erase(self, instance, value):
+            # clears the frames in detector memory, and the ROI sums
+            if value:
+                await self.frame_count.write(0)
+                for chan in self.parent.channels:
+                    await chan.clear_rois()
+            return 0
+
+        async def _acquire(self):
+            det = self.parent
+            mode = IMAGE_MODES.index(self.image_mode.readback.value)
+            # Single, Multiple, Continuous (None)
+            num = (1, max(int(self.num_images.readback.value), 1), None)[mode]
+            period = max(self.acquire_time.readback.value,
+                         self.acquire_period.readback.value)
+
+            await self.acquire_rbv.write(1)
+            await self.detector_state.write(1)
+            await self.num_images_counter.write(0)
+            try:
+                n = 0
+                t_next = time.monotonic()
+                while num is None or n < num:
+                    # a block of frames at a time, with their ROI sums
+                    block = det.spectra.frames(min(num - n, 256) if num
+                                               else 16)
+                    sums = roi_sums(block, det.roi_bounds())
+                    for frame, rois in zip(block, sums):
+                        t_next += period
+                        await asyncio.sleep(max(t_next - time.monotonic(), 0))
+                        n += 1
+                        await self.num_images_counter.write(n)
+                        await self.frame_count.write(self.frame_count.value + 1)
+                        await self.array_counter.readback.write(
+                                        self.array_counter.readback.value + 1)
+                        await det.publish(frame, rois)
+            except asyncio.CancelledError:
+                pass
+            finally:
+                self._task = None
+                await self.detector_state.write(0)
+                await self.acquire_rbv.write(0)
+                await self.acquire.write(0, verify_value=False)
 
     settings = SubGroup(Xspress3DetectorSettingsGroup, prefix='')
 
-    # @settings.acquire.startup
-    # async def settings(self, instance, async_lib):
-    #     #instance.
-    #     print(instance.fields['Acquire'])
-
     # external_trig = pvproperty(name=None, dtype=int)
     # total_points = pvproperty(name=None, dtype=int)
     # spectra_per_point = pvproperty(name=None, dtype=int)
@@ -177,14 +381,18 @@ class SSRLXspress3DetectorGroup(PVGroup):
         pool_max_mem = pvproperty(name='PoolMaxMem', dtype=int, read_only=True)
         pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=int, read_only=True)
         pool_used_mem = pvproperty(name='PoolUsedMem', dtype=int, read_only=True)
-        port_name = pvproperty(name='PortName_RBV', dtype=str, read_only=True)
+        port_name = pvproperty(name='PortName_RBV', value='ROIDATA',
+                               dtype=ChannelType.STRING, read_only=True)
         # asyn_pipeline_config = pvproperty(name=None, dtype=int)
         width = pvproperty(name='ArraySize0_RBV', dtype=int, read_only=True)
         height = pvproperty(name='ArraySize1_RBV', dtype=int, read_only=True)
         depth = pvproperty(name='ArraySize2_RBV', dtype=int, read_only=True)
 
         bayer_pattern = pvproperty(name='BayerPattern_RBV', dtype=int, read_only=True)
-        blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks', dtype=str)
+        blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks',
+                                                 value='No',
+                                                 dtype=ChannelType.ENUM,
+                                                 enum_strings=('No', 'Yes'))
         color_mode = pvproperty(name='ColorMode_RBV', dtype=int, read_only=True)
         data_type = pvproperty(name='DataType_RBV', dtype=str, read_only=True)
         dim0_sa = pvproperty(name='Dim0SA', dtype=int)
@@ -197,7 +405,8 @@ class SSRLXspress3DetectorGroup(PVGroup):
         # enable = pvproperty_with_rbv(name='EnableCallbacks', dtype=str)
         min_callback_time = pvproperty_with_rbv(name='MinCallbackTime', dtype=int)
         nd_array_address = pvproperty_with_rbv(name='NDArrayAddress', dtype=int)
-        nd_array_port = pvproperty_with_rbv(name='NDArrayPort', dtype=int)
+        nd_array_port = pvproperty_with_rbv(name='NDArrayPort', value=PORT_NAME,
+                                                dtype=ChannelType.STRING)
         ndimensions = pvproperty(name='NDimensions_RBV', dtype=int, read_only=True)
         plugin_type = pvproperty(name='PluginType_RBV', dtype=int, read_only=True)
         queue_free = pvproperty(name='QueueFree', dtype=int)
@@ -211,6 +420,22 @@ class SSRLXspress3DetectorGroup(PVGroup):
 
     roi_data = SubGroup(PluginBaseGroup, prefix='ROIDATA:')
 
+    class ArrayPluginGroup(PVGroup):
+        '''NDPluginStdArrays of one channel: its latest spectrum, as read
+        by Xspress3Channel.spectrum'''
+        array_counter = pvproperty(name='ArrayCounter_RBV', value=0,
+                                   dtype=int, read_only=True)
+        array_data = pvproperty(name='ArrayData', value=[0] * NUM_BINS,
+                                dtype=int, max_length=MAX_BINS,
+                                read_only=True)
+
+        async def array_arrived(self, spectrum):
+            await self.array_data.write(spectrum)
+            await self.array_counter.write(self.array_counter.value + 1)
+
+    arr1 = SubGroup(ArrayPluginGroup, prefix='ARR1:')
+    arr2 = SubGroup(ArrayPluginGroup, prefix='ARR2:')
+
     class Xspress3ChannelGroup(PVGroup):
         # configuration_names = pvproperty(name=None, dtype=int)
 
@@ -222,9 +447,13 @@ class SSRLXspress3DetectorGroup(PVGroup):
                 bin_high = pvproperty_with_rbv(name='bin_high', dtype=int)
                 # ev_low = pvproperty(name=None, dtype=int)
                 # ev_high = pvproperty(name=None, dtype=int)
-                value = pvproperty(name='Value_RBV', dtype=int, read_only=True)
-                value_sum = pvproperty(name='ValueSum_RBV', dtype=int, read_only=True)
-                enable = pvproperty_with_rbv(name='EnableCallbacks', dtype=int)
+                value = pvproperty(name='Value_RBV', value=0.0, read_only=True)
+                value_sum = pvproperty(name='ValueSum_RBV', value=0.0,
+                                       read_only=True)
+                enable = pvproperty_with_rbv(name='EnableCallbacks',
+                                             value='Disable',
+                                             dtype=ChannelType.ENUM,
+                                             enum_strings=('Disable', 'Enable'))
 
             roi01 = SubGroup(Xspress3ROIGroup, prefix='ROI1:')
 
@@ -241,14 +470,18 @@ class SSRLXspress3DetectorGroup(PVGroup):
                 pool_max_mem = pvproperty(name='PoolMaxMem', dtype=int, read_only=True)
                 pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=int, read_only=True)
                 pool_used_mem = pvproperty(name='PoolUsedMem', dtype=int, read_only=True)
-                port_name = pvproperty(name='PortName_RBV', dtype=str, read_only=True)
+                port_name = pvproperty(name='PortName_RBV', value='XSP3.ROI',
+                                       dtype=ChannelType.STRING, read_only=True)
                 # asyn_pipeline_config = pvproperty(name=None, dtype=int)
                 width = pvproperty(name='ArraySize0_RBV', dtype=int, read_only=True)
                 height = pvproperty(name='ArraySize1_RBV', dtype=int, read_only=True)
                 depth = pvproperty(name='ArraySize2_RBV', dtype=int, read_only=True)
 
                 bayer_pattern = pvproperty(name='BayerPattern_RBV', dtype=int, read_only=True)
-                blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks', dtype=str)
+                blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks',
+                                                         value='No',
+                                                         dtype=ChannelType.ENUM,
+                                                         enum_strings=('No', 'Yes'))
                 color_mode = pvproperty(name='ColorMode_RBV', dtype=int, read_only=True)
                 data_type = pvproperty(name='DataType_RBV', dtype=str, read_only=True)
                 dim0_sa = pvproperty(name='Dim0SA', dtype=int)
@@ -260,7 +493,8 @@ class SSRLXspress3DetectorGroup(PVGroup):
                 #enable = pvproperty_with_rbv(name='EnableCallbacks', dtype=str)
                 min_callback_time = pvproperty_with_rbv(name='MinCallbackTime', dtype=int)
                 nd_array_address = pvproperty_with_rbv(name='NDArrayAddress', dtype=int)
-                nd_array_port = pvproperty_with_rbv(name='NDArrayPort', dtype=int)
+                nd_array_port = pvproperty_with_rbv(name='NDArrayPort', value=PORT_NAME,
+                                                        dtype=ChannelType.STRING)
                 ndimensions = pvproperty(name='NDimensions_RBV', dtype=int, read_only=True)
                 plugin_type = pvproperty(name='PluginType_RBV', dtype=int, read_only=True)
                 queue_free = pvproperty(name='QueueFree', dtype=int)
@@ -339,14 +573,69 @@ class SSRLXspress3DetectorGroup(PVGroup):
 
         rois = SubGroup(RoisGroup, prefix='')
 
+        class McaRoiGroup(PVGroup):
+            # ROI bounds, as Xspress3ROI.bin_low / bin_high
+            bin_low = pvproperty_with_rbv(name='LLM', value=0, dtype=int)
+            bin_high = pvproperty_with_rbv(name='HLM', value=0, dtype=int)
+
+        mca_roi01 = SubGroup(McaRoiGroup, prefix='MCA_ROI1_')
+        mca_roi02 = SubGroup(McaRoiGroup, prefix='MCA_ROI2_')
+        mca_roi03 = SubGroup(McaRoiGroup, prefix='MCA_ROI3_')
+        mca_roi04 = SubGroup(McaRoiGroup, prefix='MCA_ROI4_')
+        mca_roi05 = SubGroup(McaRoiGroup, prefix='MCA_ROI5_')
+        mca_roi06 = SubGroup(McaRoiGroup, prefix='MCA_ROI6_')
+        mca_roi07 = SubGroup(McaRoiGroup, prefix='MCA_ROI7_')
+        mca_roi08 = SubGroup(McaRoiGroup, prefix='MCA_ROI8_')
+        mca_roi09 = SubGroup(McaRoiGroup, prefix='MCA_ROI9_')
+        mca_roi10 = SubGroup(McaRoiGroup, prefix='MCA_ROI10_')
+        mca_roi11 = SubGroup(McaRoiGroup, prefix='MCA_ROI11_')
+        mca_roi12 = SubGroup(McaRoiGroup, prefix='MCA_ROI12_')
+        mca_roi13 = SubGroup(McaRoiGroup, prefix='MCA_ROI13_')
+        mca_roi14 = SubGroup(McaRoiGroup, prefix='MCA_ROI14_')
+        mca_roi15 = SubGroup(McaRoiGroup, prefix='MCA_ROI15_')
+        mca_roi16 = SubGroup(McaRoiGroup, prefix='MCA_ROI16_')
+
         vis_enabled = pvproperty(name='PluginControlVal', dtype=int)
 
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.roi_groups = [getattr(self.rois, f'roi{i:02d}')
+                               for i in range(1, NUM_ROIS + 1)]
+            self.bound_groups = [getattr(self, f'mca_roi{i:02d}')
+                                 for i in range(1, NUM_ROIS + 1)]
+
+        def roi_bounds(self):
+            '''(bin_low, bin_high) of every ROI'''
+            return [(grp.bin_low.readback.value, grp.bin_high.readback.value)
+                    for grp in self.bound_groups]
+
+        async def update_rois(self, sums):
+            '''Value_RBV and ValueSum_RBV of the enabled ROIs, from sums'''
+            for roi, value in zip(self.roi_groups, sums.tolist()):
+                if roi.enable.readback.value == 'Enable':
+                    await roi.value.write(value)
+                    await roi.value_sum.write(roi.value_sum.value + value)
+
+        async def clear_rois(self):
+            for roi in self.roi_groups:
+                await roi.value_sum.write(0)
+
     channel1 = SubGroup(Xspress3ChannelGroup, prefix='C1_')
     channel2 = SubGroup(Xspress3ChannelGroup, prefix='C2_')
 
     class Xspress3FileStoreGroup(PVGroup):
-        # configuration_names = pvproperty(name=None, dtype=int)
-        array_counter = pvproperty_with_rbv(name='ArrayCounter', dtype=int)
+        '''NDFileHDF5 plugin: one file per capture, written on a background
+        thread
+
+        Capture opens a new file, FilePath / FileName / FileTemplate /
+        FileNumber; each frame arriving while capturing is appended to
+        it.  After NumCapture frames (or a put of 0 to Capture) the file
+        is closed, then Capture reads back 0 and FileNumber increments,
+        with AutoIncrement.  FileWriteMode is not simulated: frames are
+        always streamed to the open file.
+        '''
+        array_counter = pvproperty_with_rbv(name='ArrayCounter', value=0,
+                                            dtype=int)
         array_rate = pvproperty(name='ArrayRate_RBV', dtype=int, read_only=True)
         asyn_io = pvproperty(name='AsynIO', dtype=int)
         nd_attributes_file = pvproperty(name='NDAttributesFile', dtype=str)
@@ -356,14 +645,18 @@ class SSRLXspress3DetectorGroup(PVGroup):
         pool_max_mem = pvproperty(name='PoolMaxMem', dtype=int, read_only=True)
         pool_used_buffers = pvproperty(name='PoolUsedBuffers', dtype=int, read_only=True)
         pool_used_mem = pvproperty(name='PoolUsedMem', dtype=int, read_only=True)
-        port_name = pvproperty(name='PortName_RBV', dtype=str, read_only=True)
+        port_name = pvproperty(name='PortName_RBV', value='HDF5',
+                               dtype=ChannelType.STRING, read_only=True)
         # asyn_pipeline_config = pvproperty(name=None, dtype=int)
         width = pvproperty(name='ArraySize0_RBV', dtype=int, read_only=True, value=1)
         height = pvproperty(name='ArraySize1_RBV', dtype=int, read_only=True, value=1)
         depth = pvproperty(name='ArraySize2_RBV', dtype=int, read_only=True, value=1)
         
         bayer_pattern = pvproperty(name='BayerPattern_RBV', dtype=int, read_only=True)
-        blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks', dtype=str)
+        blocking_callbacks = pvproperty_with_rbv(name='BlockingCallbacks',
+                                                 value='No',
+                                                 dtype=ChannelType.ENUM,
+                                                 enum_strings=('No', 'Yes'))
         color_mode = pvproperty(name='ColorMode_RBV', dtype=int, read_only=True)
         data_type = pvproperty(name='DataType_RBV', dtype=str, read_only=True)
         dim0_sa = pvproperty(name='Dim0SA', dtype=int)
@@ -372,43 +665,73 @@ class SSRLXspress3DetectorGroup(PVGroup):
 
         dimensions = pvproperty(name='Dimensions_RBV', dtype=int, read_only=True)
         dropped_arrays = pvproperty_with_rbv(name='DroppedArrays', dtype=int)
-        enable = pvproperty_with_rbv(name='EnableCallbacks', dtype=str)
+        enable = pvproperty_with_rbv(name='EnableCallbacks', value='Enable',
+                                     dtype=ChannelType.ENUM,
+                                     enum_strings=('Disable', 'Enable'))
         min_callback_time = pvproperty_with_rbv(name='MinCallbackTime', dtype=int)
         nd_array_address = pvproperty_with_rbv(name='NDArrayAddress', dtype=int)
-        nd_array_port = pvproperty_with_rbv(name='NDArrayPort', dtype=int)
+        nd_array_port = pvproperty_with_rbv(name='NDArrayPort', value=PORT_NAME,
+                                            dtype=ChannelType.STRING)
         ndimensions = pvproperty(name='NDimensions_RBV', dtype=int, read_only=True)
-        plugin_type = pvproperty(name='PluginType_RBV', dtype=int, read_only=True)
+        plugin_type = pvproperty(name='PluginType_RBV', value='NDFileHDF5',
+                                 dtype=ChannelType.STRING, read_only=True)
         queue_free = pvproperty(name='QueueFree', dtype=int)
         queue_free_low = pvproperty(name='QueueFreeLow', dtype=int)
-        queue_size = pvproperty(name='QueueSize', dtype=int)
-        queue_use = pvproperty(name='QueueUse', dtype=int)
+        queue_size = pvproperty(name='QueueSize', value=20, dtype=int)
+        queue_use = pvproperty(name='QueueUse', value=0, dtype=int)
         queue_use_high = pvproperty(name='QueueUseHIGH', dtype=int)
         queue_use_hihi = pvproperty(name='QueueUseHIHI', dtype=int)
-        time_stamp = pvproperty(name='TimeStamp_RBV', dtype=int, read_only=True)
+        time_stamp = pvproperty(name='TimeStamp_RBV', dtype=float, read_only=True)
         unique_id = pvproperty(name='UniqueId_RBV', dtype=int, read_only=True)
-        auto_increment = pvproperty_with_rbv(name='AutoIncrement', dtype=int)
-        auto_save = pvproperty_with_rbv(name='AutoSave', dtype=int)
-        capture = pvproperty_with_rbv(name='Capture', dtype=int)
+        auto_increment = pvproperty_with_rbv(name='AutoIncrement', value='Yes',
+                                             dtype=ChannelType.ENUM,
+                                             enum_strings=('No', 'Yes'))
+        auto_save = pvproperty_with_rbv(name='AutoSave', value='No',
+                                        dtype=ChannelType.ENUM,
+                                        enum_strings=('No', 'Yes'))
+        capture = pvproperty_with_rbv(name='Capture', value=0, dtype=int,
+                                      put=_put_capture)
         delete_driver_file = pvproperty_with_rbv(name='DeleteDriverFile', dtype=int)
         file_format = pvproperty_with_rbv(name='FileFormat', dtype=int)
-        file_name = pvproperty_with_rbv(name='FileName', dtype=str)
-        file_number = pvproperty_with_rbv(name='FileNumber', dtype=int)
+        file_name = pvproperty_with_rbv(name='FileName', value='',
+                                        dtype=ChannelType.CHAR, max_length=256,
+                                        string_encoding='latin-1')
+        file_number = pvproperty_with_rbv(name='FileNumber', value=0, dtype=int)
         file_number_sync = pvproperty(name='FileNumber_Sync', dtype=int)
         file_number_write = pvproperty(name='FileNumber_write', dtype=int)
-        file_path = pvproperty_with_rbv(name='FilePath', dtype=str)
-        file_path_exists = pvproperty(name='FilePathExists_RBV', dtype=int, read_only=True)
-        file_template = pvproperty_with_rbv(name='FileTemplate', dtype=str)
-        file_write_mode = pvproperty_with_rbv(name='FileWriteMode', dtype=int)
-        full_file_name = pvproperty(name='FullFileName_RBV', dtype=str, read_only=True)
-        num_capture = pvproperty_with_rbv(name='NumCapture', dtype=int)
-        num_captured = pvproperty(name='NumCaptured_RBV', dtype=int, read_only=True)
+        file_path = pvproperty_with_rbv(name='FilePath', value='',
+                                        dtype=ChannelType.CHAR, max_length=256,
+                                        string_encoding='latin-1',
+                                        put=put_file_path)
+        file_path_exists = pvproperty(name='FilePathExists_RBV', value=0,
+                                      dtype=int, read_only=True)
+        file_template = pvproperty_with_rbv(name='FileTemplate',
+                                            value='%s%s_%6.6d.h5',
+                                            dtype=ChannelType.CHAR,
+                                            max_length=256,
+                                            string_encoding='latin-1')
+        file_write_mode = pvproperty_with_rbv(name='FileWriteMode',
+                                              value='Stream',
+                                              dtype=ChannelType.ENUM,
+                                              enum_strings=('Single', 'Capture',
+                                                            'Stream'))
+        full_file_name = pvproperty(name='FullFileName_RBV', value='',
+                                    dtype=ChannelType.CHAR, max_length=256,
+                                    string_encoding='latin-1', read_only=True)
+        num_capture = pvproperty_with_rbv(name='NumCapture', value=0, dtype=int)
+        num_captured = pvproperty(name='NumCaptured_RBV', value=0, dtype=int,
+                                  read_only=True)
         read_file = pvproperty_with_rbv(name='ReadFile', dtype=int)
         write_file = pvproperty_with_rbv(name='WriteFile', dtype=int)
-        write_message = pvproperty(name='WriteMessage', dtype=str)
-        write_status = pvproperty(name='WriteStatus', dtype=int)
+        write_message = pvproperty(name='WriteMessage', value='',
+                                   dtype=ChannelType.CHAR, max_length=256,
+                                   string_encoding='latin-1')
+        write_status = pvproperty(name='WriteStatus', value=0, dtype=int)
         boundary_align = pvproperty_with_rbv(name='BoundaryAlign', dtype=int)
         boundary_threshold = pvproperty_with_rbv(name='BoundaryThreshold', dtype=int)
-        compression = pvproperty_with_rbv(name='Compression', dtype=int)
+        compression = pvproperty_with_rbv(name='Compression', value='None',
+                                          dtype=ChannelType.ENUM,
+                                          enum_strings=COMPRESSION)
         data_bits_offset = pvproperty_with_rbv(name='DataBitsOffset', dtype=int)
 
         class ExtraDimNameGroup(PVGroup):
@@ -437,24 +760,142 @@ class SSRLXspress3DetectorGroup(PVGroup):
         szip_num_pixels = pvproperty_with_rbv(name='SZipNumPixels', dtype=int)
         store_attr = pvproperty_with_rbv(name='StoreAttr', dtype=str)
         store_perform = pvproperty_with_rbv(name='StorePerform', dtype=str)
-        zlevel = pvproperty_with_rbv(name='ZLevel', dtype=int)
+        zlevel = pvproperty_with_rbv(name='ZLevel', value=6, dtype=int)
         num_capture_calc = pvproperty(name='NumCapture_CALC', dtype=int)
         num_capture_calc_disable = pvproperty(name='NumCapture_CALC.DISA', dtype=int)
 
-    hdf5 = SubGroup(Xspress3FileStoreGroup, prefix='HDF5:')
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            # unbounded: QueueUse reports the backlog
+            self._writer = BackgroundWriter(maxsize=0, name='HDF5Writer')
+            self._writes = PendingWrites(self, self._writer)
+            self._capture = None
+
+        def close(self):
+            '''write out the pending frames, close the capture file and
+            stop the writer thread'''
+            capture, self._capture = self._capture, None
+            if capture is not None:
+                self._writer.submit(capture.close)
+            self._writer.close()
+
+        @file_path_exists.startup
+        async def file_path_exists(self, instance, async_lib):
+            # starting file path given to the IOC, checked as a client put
+            await self.file_path.setpoint.write(self.parent.start_file_path)
+
+        async def start_capture(self):
+            '''open the next file, unless capturing already'''
+            if self._capture is not None:
+                return
+            if not self.file_path_exists.value:
+                await self.write_status.write(1)
+                await self.write_message.write('Invalid file path')
+                await self.capture.readback.write(0)
+                return
+            filename = self.file_template.readback.value % (
+                            self.file_path.readback.value,
+                            self.file_name.readback.value,
+                            self.file_number.readback.value)
+            compression = self.compression.readback.value
+            self._capture = CaptureFile(
+                filename, NUM_CHANNELS, self.parent.spectra.num_bins,
+                NUM_ROIS, compression='gzip' if compression == 'zlib' else None,
+                level=self.zlevel.readback.value)
+            await self.full_file_name.write(filename)
+            await self.num_captured.write(0)
+            await self.write_status.write(0)
+            await self.write_message.write('')
+            await self._writes.submit(self._capture.open)
+            await self.capture.readback.write(1)
+
+        async def stop_capture(self):
+            '''close the file: Capture reads back 0 once it is written'''
+            capture, self._capture = self._capture, None
+            if capture is None:
+                await self.capture.readback.write(0)
+                return
+            future = await self._writes.submit(capture.close)
+            await asyncio.wait([asyncio.wrap_future(future)])
+            if self.auto_increment.readback.value == 'Yes':
+                await self.file_number.setpoint.write(
+                                        self.file_number.readback.value + 1)
+            await self.capture.readback.write(0)
+            if self.capture.setpoint.value:
+                # NumCapture reached
+                await self.capture.setpoint.write(0)
+
+        async def array_arrived(self, frame, rois, timestamp):
+            '''NDArray callback: count the frame, and append it if capturing'''
+            if self.enable.readback.value != 'Enable':
+                return
+            uid = self.array_counter.readback.value + 1
+            await self.array_counter.readback.write(uid)
+            await self.unique_id.write(uid)
+            await self.time_stamp.write(timestamp)
+            await self.width.write(frame.shape[1])
+            await self.height.write(frame.shape[0])
+            if self._capture is None:
+                return
+
+            # a new array per block of frames: no copy needed
+            await self._writes.submit(self._capture.append, frame, rois)
+            captured = self.num_captured.value + 1
+            await self.num_captured.write(captured)
+            if captured == self.num_capture.readback.value:
+                asyncio.get_running_loop().create_task(self.stop_capture())
 
-    
+    hdf5 = SubGroup(Xspress3FileStoreGroup, prefix='HDF5:')
 
+    def __init__(self, *args, num_bins=NUM_BINS, file_path=None, seed=0,
+                 **kwargs):
+        if num_bins > MAX_BINS:
+            raise ValueError(f'at most {MAX_BINS} bins')
+        super().__init__(*args, **kwargs)
+        self.spectra = SpectrumSource(num_bins=num_bins, seed=seed)
+        self.channels = (self.channel1, self.channel2)
+        self.arrays = (self.arr1, self.arr2)
+        # starting HDF5:FilePath, set at server startup
+        if file_path is None:
+            file_path = tempfile.gettempdir() + os.sep
+        self.start_file_path = file_path
+
+    def roi_bounds(self):
+        '''ROI bounds of every channel, shape (channels, rois, 2)'''
+        return np.array([chan.roi_bounds() for chan in self.channels])
+
+    async def publish(self, frame, rois):
+        '''hand a new frame, and its ROI sums, to the ROIs and plugins'''
+        for chan, sums in zip(self.channels, rois):
+            await chan.update_rois(sums)
+        for arr, spectrum in zip(self.arrays, frame):
+            await arr.array_arrived(spectrum)
+        await self.hdf5.array_arrived(frame, rois, time.time())
+
+    def close(self):
+        '''release the HDF5 writer thread, once the server is done'''
+        self.hdf5.close()
 
 
 if __name__ == '__main__':
-    ioc_options, run_options = ioc_arg_parser(
+    parser, split_args = template_arg_parser(
             default_prefix='XSPRESS3-EXAMPLE:',
-            desc='Run IOC simulating Xspress3')
+            desc='Run IOC simulating Xspress3',
+            supported_async_libs=('asyncio',))
+    parser.add_argument('--bins', type=int, default=NUM_BINS,
+                        help='MCA bins per channel')
+    parser.add_argument('--file-path', default=None,
+                        help='starting HDF5:FilePath (default: temp dir)')
+    args = parser.parse_args()
+    ioc_options, run_options = split_args(args)
+    ioc_options.pop('macros')
 
     # Instantiate IOC, assigning prefix for PV names
-    ioc = SSRLXspress3DetectorGroup(**ioc_options)
-    print('PVs:', list(ioc.pvdb))
+    ioc = SSRLXspress3DetectorGroup(num_bins=args.bins,
+                                    file_path=args.file_path, **ioc_options)
 
     # Run IOC
-    run(ioc.pvdb, **run_options)
\ No newline at end of file
+    try:
+        run(ioc.pvdb, **run_options)
+    finally:
+        ioc.close()
\ No newline at end of file
@@ -6,7 +6,6 @@ Simulated hardware for use at SSRL beamlines running Bluesky
 
 """
 import numpy as np
-import random
 
 from ophyd import Signal
 from ophyd.sim import SynSignal
@@ -22,91 +21,386 @@ class Syn2DRings(SynSignal):
     """
     Synthetic Signal that returns concentric circles with sigma spread
     when triggered.  Built using Syn2DGauss as an example.
-    
+
+    Ring k has radius k * spacing around center (ring 0 is a spot), and a
+    Gaussian profile of width sigma across it.  evaluate() gives the
+    signal at N motor positions in one call, e.g. to precompute a scan.
+
     Parameters
     ----------
-    
+    center : (float, float)
+        center of the rings, in motor0, motor1 coordinates
+    Imax : float
+        peak intensity
+    spacing : float
+        distance between rings
+    sigma : float
+        width of each ring
+    noise : {'poisson', 'uniform', 'gaussian', None}
+        noise added to the signal
+    noise_multiplier : float
+        scale of the uniform and gaussian noise
+    random_state : int, numpy.random.Generator or NoiseSource
+        source of the noise (default: the device stream, see sim.noise)
     """
     def __init__(self, name, 
                  motor0, motor_field0, motor1, motor_field1,
                  center, Imax, spacing=10, sigma=1, 
                  noise=None, noise_multiplier=1, random_state=None, **kwargs):
         
-        if noise not in ('poisson', 'uniform', None):
-            raise ValueError("Noise must be one of 'poisson', 'uniform', None")
+        if noise not in NOISE_MODELS:
+            raise ValueError("Noise must be one of 'poisson', 'uniform', "
+                             "'gaussian', None")
+        if spacing <= 0:
+            raise ValueError('spacing must be positive')
         self._motor = motor0
         self._motor1 = motor1
-        if random_state is None:
-            random_state = np.random
+        self.center = np.asarray(center, dtype=float)
+        self.Imax, self.spacing, self.sigma = Imax, spacing, sigma
+        self.noise, self.noise_multiplier = noise, noise_multiplier
+        self.noise_source = noise_source(name, random_state)
             
         def func():
             """
             Return value at motor position of a patter of concentric circles. 
-            For simplicity, only generate circle   
             """
             x = motor0.read()[motor_field0]['value']
             y = motor1.read()[motor_field1]['value']
-            m = np.array([x, y]) # point to evaluate at
-            
-            v = Imax * np.exp(-np.sum((m - center) ** 2) / (2 * sigma ** 2))
-            return v
+            return self.evaluate([[x, y]])[0]
         
         super().__init__(name=name, func=func, **kwargs)
 
+    def evaluate(self, positions):
+        """
+        Signal at each of the (N, 2) motor positions, as an array of N
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        r = np.hypot(*(positions - self.center).T)
+        # distance to the nearest ring
+        d = r - self.spacing * np.round(r / self.spacing)
+        v = self.Imax * np.exp(-d ** 2 / (2 * self.sigma ** 2))
+        if self.noise == 'poisson':
+            v = self.noise_source.poisson(np.round(v))
+        elif self.noise == 'uniform':
+            self.noise_source.add_uniform(v, -self.noise_multiplier,
+                                          self.noise_multiplier)
+        elif self.noise == 'gaussian':
+            self.noise_source.add_normal(v, self.noise_multiplier)
+        return v
+
 #---------------- Building class for array simulator
 from ophyd.sim import SynSignal
 from ophyd.areadetector.filestore_mixins import resource_factory
+from ophyd.status import DeviceStatus
+from collections import deque
 from pathlib import Path
+import datetime
+import itertools
+import logging
 import os
+import tempfile
+import threading
 import numpy as np
 import uuid
 
+import h5py
+
+from ssrltools.background import BackgroundWriter
+from ssrltools.cache import LRUCache
+from ssrltools.sim.noise import NOISE_MODELS, noise_source
+
+logger = logging.getLogger(__name__)
+
+# default root of simulated detector files
+SIM_ROOT = os.path.join(tempfile.gettempdir(), 'ssrltools_sim')
+HDF5_DATA_KEY = '/entry/data/data'      # as read by AD_HDF5
+
+
+class FrameWriterPool(object):
+    """
+    Write frames to files from background threads, reusing frame buffers
+
+    Each frame is copied into a buffer of the pool, and written from it by
+    one of num_threads BackgroundWriters.  Buffers go back to the pool once
+    their write lands, so at most num_buffers frames are in flight:
+    submit() blocks past that.  Jobs with the same key go to the same
+    writer thread, in order (e.g. appends to one file).
+
+    usage:
+        pool = FrameWriterPool(num_threads=4)
+        future = pool.submit(tifffile.imwrite, 'frame.tiff', frame)
+        ...
+        pool.close()
+
+    PARAMETERS
+
+    num_threads : int
+        number of writer threads
+    num_buffers : int
+        most frames copied and not yet written
+    """
+    def __init__(self, num_threads=2, num_buffers=16):
+        self._writers = [BackgroundWriter(maxsize=0, name=f'FrameWriter-{i}')
+                         for i in range(num_threads)]
+        self._next_writer = itertools.cycle(self._writers)
+        self._slots = threading.BoundedSemaphore(num_buffers)
+        self._free = {}         # (shape, dtype) -> buffers not in use
+        self._lock = threading.Lock()
+        self.allocated = 0
+
+    def submit(self, func, path, frame, *, key=None, timeout=None):
+        """
+        Copy frame into a free buffer, and queue func(path, buffer).
+        Returns a Future of the write; raises TimeoutError if no buffer
+        frees up within timeout (s).
+        """
+        if not self._slots.acquire(timeout=timeout):
+            raise TimeoutError('no free frame buffer')
+        frame = np.asarray(frame)
+        buf = self._take(frame.shape, frame.dtype)
+        np.copyto(buf, frame)
+        if key is None:
+            writer = next(self._next_writer)
+        else:
+            writer = self._writers[hash(key) % len(self._writers)]
+        future = writer.submit(func, path, buf)
+        future.add_done_callback(lambda fut: self._give(buf))
+        return future
+
+    def submit_job(self, func, *args, key=None):
+        """queue a job without a frame, e.g. closing a file"""
+        writer = self._writers[hash(key) % len(self._writers)]
+        return writer.submit(func, *args)
+
+    def flush(self, timeout=None):
+        """wait until every frame submitted so far has been written"""
+        return all([writer.flush(timeout) for writer in self._writers])
+
+    @property
+    def closed(self):
+        return all(writer.closed for writer in self._writers)
+
+    def close(self, timeout=None):
+        """write out the pending frames and stop the writer threads"""
+        for writer in self._writers:
+            writer.close(timeout)
+
+    def _take(self, shape, dtype):
+        with self._lock:
+            free = self._free.get((shape, dtype))
+            if free:
+                return free.pop()
+            self.allocated += 1
+        return np.empty(shape, dtype=dtype)
+
+    def _give(self, buf):
+        with self._lock:
+            self._free.setdefault((buf.shape, buf.dtype), []).append(buf)
+        self._slots.release()
+
+_WRITER_POOL = None
+
+def writer_pool():
+    """the FrameWriterPool shared by simulated detectors"""
+    global _WRITER_POOL
+    if _WRITER_POOL is None or _WRITER_POOL.closed:
+        _WRITER_POOL = FrameWriterPool()
+    return _WRITER_POOL
+
+
+class _HDF5Frames(object):
+    """frames appended to one AD_HDF5 layout file, from one writer thread"""
+    def __init__(self, filename):
+        self.filename = filename
+        self._file = None
+        self._data = None
+
+    def append(self, filename, frame):
+        if self._file is None:
+            self._file = h5py.File(filename, 'w')
+            self._data = self._file.create_dataset(
+                HDF5_DATA_KEY, shape=(0,) + frame.shape,
+                maxshape=(None,) + frame.shape, chunks=(1,) + frame.shape,
+                dtype=frame.dtype)
+        n = len(self._data)
+        self._data.resize(n + 1, axis=0)
+        self._data[n] = frame
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+def _write_tiff(filename, frame):
+    tifffile.imwrite(filename, frame)
+
+
 class ArraySynSignal(SynSignal):
     """
     Base class for synthetic array signals. 
     Same interface as a normal ArraySignal, but with simulated data and 
     filestore
+
+    One resource is made per run (on stage), and one datum per point.
+    Frames are written by a FrameWriterPool (shared by default), and the
+    status returned by trigger() finishes when the frame is written.
+
+    Each instance keeps its own asset document cache, drained by
+    collect_asset_docs.  It holds at most asset_cache_size datums.  In a
+    staged run, trigger raises RuntimeError once it is full, as the datum
+    ids handed out must all reach the documents.  Outside of one, the
+    oldest are dropped, and counted, rather than growing without bound
+    when nobody collects.  Resources are kept apart, and handed out ahead
+    of the datums drained with them.
+
+    PARAMETERS
+
+    root : str
+        root directory of the files (default: SIM_ROOT)
+    spec : str
+        'AD_TIFF' (a file per frame) or 'AD_HDF5' (a file per run)
+    writers : FrameWriterPool
+        pool writing the frames (default: writer_pool())
+    asset_cache_size : int
+        most datum documents held between collect_asset_docs calls
+    write_timeout : float
+        most seconds to wait for a free frame buffer in trigger, or for
+        the run's file to close in unstage
     """
-    _asset_docs_cache = []
-    _last_ret = None
-    point_number = 0
+    def __init__(self, *args, root=SIM_ROOT, spec='AD_TIFF', writers=None,
+                 asset_cache_size=10000, write_timeout=10, **kwargs):
+        if spec not in ('AD_TIFF', 'AD_HDF5'):
+            raise ValueError("spec must be one of 'AD_TIFF', 'AD_HDF5'")
+        self.file_root = root
+        self.spec = spec
+        self._writers = writers
+        self.write_timeout = write_timeout
+        self._resource = None
+        self._new_resources = []        # made, not collected yet
+        self._datum_factory = None
+        self._staged_run = False
+        self._hdf5 = None
+        self._last_ret = None
+        self.point_number = 0
+
+        self.asset_cache_size = asset_cache_size
+        self._asset_docs_cache = deque(maxlen=asset_cache_size)
+        self.asset_cache_high_water = 0
+        self.asset_docs_dropped = 0
+        super().__init__(*args, **kwargs)
+
+    @property
+    def asset_cache_metrics(self):
+        """datums waiting now, most ever waiting, and dropped"""
+        return dict(depth=len(self._asset_docs_cache),
+                    high_water=self.asset_cache_high_water,
+                    dropped=self.asset_docs_dropped)
+
+    @property
+    def writers(self):
+        if self._writers is None:
+            self._writers = writer_pool()
+        return self._writers
+
+    def stage(self):
+        self._new_resource()
+        self._staged_run = True
+        return [self]
+
+    def unstage(self):
+        hdf5, resource = self._hdf5, self._resource
+        self._resource = self._datum_factory = self._hdf5 = None
+        self._staged_run = False
+        if hdf5 is not None:
+            # written once the frames before it are
+            future = self.writers.submit_job(hdf5.close, key=resource['uid'])
+            try:
+                future.result(timeout=self.write_timeout)
+            except TimeoutError:
+                raise TimeoutError(f'{self.name}: {hdf5.filename} not '
+                                   f'closed within {self.write_timeout} s')
+        return [self]
+
+    def _new_resource(self):
+        """one resource for the run: a directory for the day, a uid name"""
+        resource_path = datetime.datetime.now().strftime('%Y/%m/%d')
+        os.makedirs(os.path.join(self.file_root, resource_path), exist_ok=True)
+        filename = str(uuid.uuid4())
+        if self.spec == 'AD_TIFF':
+            resource_kwargs = {'template': '%s%s_%6.6d.tiff',
+                               'filename': filename, 'frame_per_point': 1}
+        else:
+            resource_path = os.path.join(resource_path, filename + '.h5')
+            resource_kwargs = {'frame_per_point': 1}
+            self._hdf5 = _HDF5Frames(os.path.join(self.file_root,
+                                                   resource_path))
+        self._resource, self._datum_factory = resource_factory(
+                spec=self.spec, root=self.file_root,
+                resource_path=resource_path,
+                resource_kwargs=resource_kwargs,
+                path_semantics='windows' if os.name == 'nt' else 'posix')
+        self._new_resources.append(self._resource)
+        self.point_number = 0
+
+    def _frame_file(self, point_number):
+        if self._hdf5 is not None:
+            return self._hdf5.filename
+        kwargs = self._resource['resource_kwargs']
+        path = os.path.join(self.file_root, self._resource['resource_path'],
+                            '')
+        return kwargs['template'] % (path, kwargs['filename'], point_number)
 
     def trigger(self):
-        # not running at the moment.... but super.trigger() is.  
-        tmpRoot = 'C:\\Users\\roberttk\\Desktop\\SLAC_RA\\bluesky-dev\\fstore'
-        tmpPath = '\\tmp'
-        os.makedirs(tmpRoot+tmpPath, exist_ok=True)
-        st = super().trigger() # re-evaluates self._func, puts into value
-        # Returns NullType
-        ret = super().read()    # Signal.read() exists, not SynSignal.read()
-        # But using Signal.read() does not allow uid's to be passed into mem.
-        val = ret[self.name]['value']
-        
+        if self._datum_factory is None:
+            # triggered outside of a staged run
+            self._new_resource()
+        elif self._staged_run and \
+                len(self._asset_docs_cache) >= self.asset_cache_size:
+            raise RuntimeError(f'{self.name}: asset cache full '
+                               f'({self.asset_cache_size} datums not '
+                               'collected)')
         # AD_TIFF handler generates filename by populating template
         # self.template % (self.path, self.filename, self.point_number)
-        self.point_number += 1 
-        resource, datum_factory = resource_factory(
-                spec='AD_TIFF',
-                root=tmpRoot,
-                resource_path=tmpRoot + '\\tmp\\',
-                resource_kwargs={'template': '%s%s_%d.tiff' , 
-                                    'filename': f'{uuid.uuid4()}'},
-                path_semantics='windows')
-        datum = datum_factory({'point_number': self.point_number})
-        
-        self._asset_docs_cache.append(('resource', resource))
-        self._asset_docs_cache.append(('datum', datum))
-
-        fname = (resource['resource_kwargs']['filename'] 
-                    + f'_{self.point_number}.tiff')
-        fpath = Path(resource['root']) / resource['resource_path'] / fname
-        # for tiff spec
-        tifffile.imsave(fpath, val)
-        
-        # replace 'value' in read dict with some datum id
-        ret[self.name]['value'] = datum['datum_id']
-        self._last_ret = ret
-        return st
+        point_number = self.point_number
+        self.point_number += 1
+        datum = self._datum_factory({'point_number': point_number})
+        self._cache_datum(datum)
+        filename = self._frame_file(point_number)
+        if self._hdf5 is not None:
+            write, key = self._hdf5.append, self._resource['uid']
+        else:
+            write, key = _write_tiff, None
+
+        status = DeviceStatus(self)
+        def write_frame(st):
+            if not st.success:
+                status.set_exception(st.exception())
+                return
+            try:
+                # replace 'value' in read dict with the datum id
+                ret = super(ArraySynSignal, self).read()
+                ret[self.name]['value'] = datum['datum_id']
+                self._last_ret = ret
+                future = self.writers.submit(write, filename, self.get(),
+                                             key=key,
+                                             timeout=self.write_timeout)
+            except Exception as exc:
+                # errors raised in status callbacks are only logged: fail
+                # the trigger instead of leaving it pending
+                status.set_exception(exc)
+                return
+            future.add_done_callback(written)
+
+        def written(future):
+            exc = future.exception()
+            if exc is None:
+                status.set_finished()
+            else:
+                status.set_exception(exc)
+
+        # re-evaluates self._func, puts into value (after exposure_time)
+        super().trigger().add_callback(write_frame)
+        return status
     
     def describe(self):
         ret = super().describe()
@@ -133,36 +427,65 @@ class ArraySynSignal(SynSignal):
             # return {self.name: {'value': self.get(),
             #                      'timestamp': self.timestamp}}
 
+    def _cache_datum(self, datum):
+        cache = self._asset_docs_cache
+        if len(cache) == cache.maxlen:
+            if not self.asset_docs_dropped:
+                logger.warning('%s: asset cache full (%d), dropping the '
+                               'oldest datums', self.name, cache.maxlen)
+            self.asset_docs_dropped += 1
+        cache.append(('datum', datum))
+        self.asset_cache_high_water = max(self.asset_cache_high_water,
+                                          len(cache))
+
     def collect_asset_docs(self):
-        items = list(self._asset_docs_cache)
-        self._asset_docs_cache.clear()
-        for item in items:
-            yield item
+        # swap in an empty cache: nothing copied, and datums cached while
+        # the caller iterates wait for the next call
+        items = self._asset_docs_cache
+        self._asset_docs_cache = deque(maxlen=self.asset_cache_size)
+        resources, self._new_resources = self._new_resources, []
+        for resource in resources:
+            yield 'resource', resource
+        yield from items
 
 class ArraySynGauss(ArraySynSignal):
     """
     Output a 2D Gaussian spot at centered at motor position.  
 
+    Each image spans size around the motor positions, in pt_density
+    points a side.  evaluate() gives the images at N motor positions in
+    one call, e.g. to precompute a scan (N * pt_density**2 values: chunk
+    long trajectories).
+    Noise is drawn from the device's seeded stream (see sim.noise), so
+    runs with the same seed make the same images.
+
     Example
     -------
     motor1 = SynAxis(name='motor1')
     motor2 = SynAxis(name='motor2')
     det = SynGauss('det', motor1, 'motor1', motor2, 'motor2', 
                    center1=0, center2=0, Imax=1, sigma1=1, sigma2=1)
+    images = det.evaluate(np.column_stack([xs, ys]))
     """
     def __init__(self, name, motor1, motor_field1, motor2, motor_field2, 
                  center1, center2, Imax, sigma1=1, sigma2=2,
                  noise='poisson', random_state=None, 
                  size=5, pt_density=5, noise_multiplier=1, **kwargs):
-        if noise not in ('poisson', 'uniform', None):
-            raise ValueError("Noise must be one of 'poisson', 'uniform', None")
+        if noise not in NOISE_MODELS:
+            raise ValueError("Noise must be one of 'poisson', 'uniform', "
+                             "'gaussian', None")
             
         self._motor1 = motor1
         self._motor2 = motor2
         self.__name__ = name
         
-        if random_state is None:
-            random_state = np.random
+        self.center = np.array([center1, center2], dtype=float)
+        self.sigma = np.array([sigma1, sigma2], dtype=float)
+        self.Imax = Imax
+        self.noise, self.noise_multiplier = noise, noise_multiplier
+        self.noise_source = noise_source(name, random_state)
+        # image points, around the motor positions
+        self._offsets = np.linspace(-size/2, size/2, pt_density)
                     
         # Function to simulate calls to pv
         def func():
@@ -177,51 +500,127 @@ class ArraySynGauss(ArraySynSignal):
             """
             m1 = motor1.read()[motor_field1]['value']
             m2 = motor2.read()[motor_field2]['value']
-            
-            # generate mesh for evauation
-            x = np.linspace(m1-size/2, m1+size/2, pt_density)
-            y = np.linspace(m2-size/2, m2+size/2, pt_density)
-            
-            xx, yy = np.meshgrid(x, y, sparse=True)
-            
-            v = Imax * np.exp(-( ((xx-center1)**2 / (2*sigma1**2)) +  \
-                                 ((yy-center2)**2 / (2*sigma2**2)) ))
-            if noise == 'poisson':
-                v += random_state.poisson(np.mean(v), np.shape(v))
-            elif noise == 'uniform':
-                v += random_state.uniform(low=-1, high=1, size=np.shape(v)) * noise_multiplier
-        
-            return v
+            return self.evaluate([[m1, m2]])[0]
         
         super().__init__(func=func, name=name, **kwargs)
         # Sets self.value to func evaluation. 
+
+    def evaluate(self, positions):
+        """
+        Images at each of the (N, 2) motor positions, as an array of
+        (N, pt_density, pt_density): rows along motor2, columns motor1
+        """
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        # the Gaussian is separable: one profile per axis and image
+        xy = positions[:, :, None] + self._offsets
+        profiles = np.exp(-(xy - self.center[:, None]) ** 2 /
+                          (2 * self.sigma[:, None] ** 2))
+        v = self.Imax * profiles[:, 1, :, None] * profiles[:, 0, None, :]
+        if self.noise == 'poisson':
+            v += self.noise_source.poisson(v.mean(axis=(1, 2))[:, None, None],
+                                           v.shape)
+        elif self.noise == 'uniform':
+            self.noise_source.add_uniform(v, -self.noise_multiplier,
+                                          self.noise_multiplier)
+        elif self.noise == 'gaussian':
+            self.noise_source.add_normal(v, self.noise_multiplier)
+        return v
     
 class SynImageDetector(ArraySynSignal):
     """
-    Simulates an area detector by returning an image from file.  
+    Simulates an area detector by replaying images from file.
+
+    The images are indexed once, when the detector is made: imPath is one
+    image, or a directory of images ending in ext (sorted by name).  Each
+    trigger plays the next image of the index, in order (wrapping
+    around) or at random; give a seed for a random order that replays
+    the same way every time.  rewind() starts the playback over.
+
+    Decoded frames are kept in an LRU cache of cache_size frames, so once
+    warmed up a trigger costs the detector pipeline, not the disk and
+    fabio.  preload=True fills the cache when the detector is made.  With
+    mmap=True uncompressed TIFFs are memory-mapped instead of read (other
+    files still go through fabio).  Frames are read-only.
+
+    usage:
+        det = SynImageDetector('det', 'images/', order='random', seed=1,
+                               cache_size=64, preload=True)
+
+    PARAMETERS
+
+    imPath : str
+        image file, or directory of image files
+    ext : str
+        extension of the images in a directory
+    order : str
+        'sequential' or 'random'
+    seed : int
+        seed of the random order (default: unseeded)
+    cache_size : int
+        most decoded frames kept
+    preload : bool
+        decode the first cache_size frames now
+    mmap : bool
+        memory-map uncompressed TIFFs
     """
-    def __init__(self, name, imPath, ext='.tif', **kwargs):
+    def __init__(self, name, imPath, ext='.tif', order='sequential',
+                 seed=None, cache_size=16, preload=False, mmap=False,
+                 **kwargs):
+        if order not in ('sequential', 'random'):
+            raise ValueError("order must be one of 'sequential', 'random'")
         self.__name__ = name
         self.im_path = Path(imPath)
-        if not os.path.exists(self.im_path):
-            raise FileNotFoundError
-        
+        if not self.im_path.exists():
+            raise FileNotFoundError(imPath)
+        if self.im_path.is_file():
+            self.files = [self.im_path]
+        else:
+            self.files = sorted(self.im_path.glob('*' + ext))
+            if not self.files:
+                raise FileNotFoundError(f'no {ext} images in {imPath}')
+        self.order = order
+        self.seed = seed
+        self.mmap = mmap
+        self.frames = LRUCache(maxsize=max(cache_size, 1))
+        self.rewind()
+        if preload:
+            for index in range(min(cache_size, len(self.files))):
+                self.frame(index)
+
         def func():
-            """Return np.ndarray with image data from specified path
-            """
-            if os.path.isfile(self.im_path):
-                print('file found')
-                image = fabio.open(self.im_path)
-                return np.array(image.data)
-            elif os.path.isdir(self.im_path):
-                print('path found')
-                ims = list(self.im_path.glob('*'+ext))
-                i = random.randint(0,len(ims))
-                image = fabio.open(ims[i])
-
-                return np.array(image.data)
+            """Return the next frame of the playback"""
+            return self.frame(self._next_index())
 
         super().__init__(func=func, name=name, **kwargs)
+        # the initial value played a frame: the first trigger plays it again
+        self.rewind()
+
+    def rewind(self):
+        """start the playback over, from the same seed"""
+        self._count = itertools.count()
+        self._rng = np.random.default_rng(self.seed)
+
+    def _next_index(self):
+        if self.order == 'random':
+            return int(self._rng.integers(len(self.files)))
+        return next(self._count) % len(self.files)
+
+    def frame(self, index):
+        """decoded frame of file index, from the cache when there"""
+        frame = self.frames.get(index)
+        if frame is None:
+            frame = self._load(self.files[index])
+            frame.flags.writeable = False
+            self.frames.put(index, frame)
+        return frame
+
+    def _load(self, path):
+        if self.mmap and path.suffix.lower() in ('.tif', '.tiff'):
+            try:
+                return tifffile.memmap(path, mode='r')
+            except ValueError:
+                pass        # compressed or tiled: not mappable
+        return np.array(fabio.open(str(path)).data)
 
 class SynXspress3(SynSignal):
     """
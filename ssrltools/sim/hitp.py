@@ -4,7 +4,8 @@ from ophyd.sim import SynAxis, SynSignal
 import pandas as pd 
 from pathlib import Path
 
-from numpy import random
+from ..devices.locations import SampleLocTable
+from .noise import noise_source
 
 
 class SynHiTpStage(Device):
@@ -43,40 +44,30 @@ class SynHiTpStage(Device):
         df = pd.read_csv(path177)
         print('loaded 177 positions')
         
-        self.sample_locs = {}
-        for i in range(len(df)):
-            self.sample_locs[i] = { 'stage_x': df['Plate X'][i],
-                                    'stage_y': df['Plate Y'][i],
-                                    'plate_x': 0, #self.plate_x.position,
-                                    'plate_y': 0, #self.plate_y.position,
-                                    'theta':   0 #self.theta.position
-                                  }
+        self.sample_locs = SampleLocTable.from_columns(
+                                    stage_x=df['Plate X'].to_numpy(),
+                                    stage_y=df['Plate Y'].to_numpy(),
+                                    plate_x=0, #self.plate_x.position,
+                                    plate_y=0, #self.plate_y.position,
+                                    theta=0 #self.theta.position
+                                  )
         super().__init__(*args, **kwargs)
 
-    def sample_loc_list(self, paired=False):
+    def sample_loc_list(self, paired=False, index=None):
         """
         Returns motor-location list pairs for consumption by bp.list_scan
         motor1, [m1_loc1, m1_loc2, ...], 
         motor2, [m2_loc1, m2_loc2, ...], ...
 
+        index selects (and orders) the samples returned, default (None)
+        all.  An int selects that one sample, as position arrays of length
+        1, and [] selects none.
+
         Can also be formatted as tuples:
         (m1_loc1, m2_loc1, ... ), (m1_loc2, m2_loc2, ...)
         """
-        loc_lists = {}
-        for name in self.component_names:
-            loc_lists[name] = []
-
-        for pos in self.sample_locs.values():
-            for motor in pos.keys():
-                loc_lists[motor].append(pos[motor])
-
-        # format as * unpackable args
-        result = []
-        for name in self.component_names:
-            result.append(getattr(self, name))
-            result.append(loc_lists[name])
-
-        return result
+        # position arrays are views into the table when index is None
+        return self.sample_locs.list_scan_args(self, index=index)
 
     def sample(self, index):
         return self.sample_locs[index]
@@ -108,15 +99,19 @@ class SynHiTpDet(SynSignal):
     """
     Simulated detector for HiTp simulations.  
     Returns tuple with motor positions?...
+
+    Values come from the device's seeded stream (see sim.noise), unless
+    random_state gives another.
     """
-    def __init__(self, name, motorx, motory, **kwargs):
+    def __init__(self, name, motorx, motory, random_state=None, **kwargs):
         self.__name__ = name
+        self.noise_source = noise_source(name, random_state)
 
         def func():
             """
             Returns random int from 1-10
             """
-            return random.randint(1, 10)
+            return int(self.noise_source.rng.integers(1, 10))
 
         super().__init__(func=func, name=name, **kwargs)
 
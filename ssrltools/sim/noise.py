@@ -0,0 +1,150 @@
+"""
+Seeded noise for simulated detectors
+
+Each device draws from its own ``np.random.Generator``, seeded from the
+session seed (``set_seed``) and the device name: runs with the same seed
+replay the same noise, whatever order the devices are made or triggered
+in.  Uniform and normal draws are pre-generated a block at a time and
+handed out as views of the block, so adding noise to a frame allocates
+nothing.
+
+.. autosummary::
+
+   ~NoiseSource
+   ~noise_source
+   ~set_seed
+
+"""
+import zlib
+
+import numpy as np
+
+NOISE_MODELS = ('poisson', 'uniform', 'gaussian', None)
+
+_SEED = None        # session seed, None for fresh entropy
+
+
+def set_seed(seed):
+    """seed the streams of the devices made from now on"""
+    global _SEED
+    _SEED = seed
+
+
+class NoiseSource(object):
+    """
+    Vectorized noise draws from one seeded np.random.Generator
+
+    Standard uniform and normal values are generated block_size at a
+    time, and handed out in order.  Each comes from its own child stream,
+    so the values drawn do not depend on block_size.  The ``add_*``
+    methods add noise to an array in place; the others fill ``out`` when
+    given.  numpy has no in-place Poisson draw, so ``poisson`` still
+    allocates its result.
+
+    usage:
+        noise = NoiseSource(seed=1)
+        noise.add_uniform(frame, -1, 1)
+        counts = noise.poisson(frame)
+
+    PARAMETERS
+
+    seed : int, np.random.SeedSequence or np.random.Generator
+        seed of the stream, or the generator itself
+    block_size : int
+        values pre-generated at a time, per distribution
+    """
+    def __init__(self, seed=None, block_size=2**16):
+        if isinstance(seed, np.random.Generator):
+            self.rng = seed
+        else:
+            self.rng = np.random.default_rng(seed)
+        self.block_size = block_size
+        uniform, normal = self.rng.spawn(2)
+        self._fills = {'uniform': uniform.random,
+                       'normal': normal.standard_normal}
+        self._blocks = {}       # kind -> [block, values handed out]
+
+    @classmethod
+    def for_device(cls, name, seed=None, **kwargs):
+        """the stream of device name, from seed (default: set_seed's)"""
+        if seed is None:
+            seed = _SEED
+        key = zlib.crc32(name.encode())
+        return cls(np.random.SeedSequence(seed, spawn_key=(key,)), **kwargs)
+
+    def _chunks(self, kind, num):
+        """views of the next num standard values of kind, block by block"""
+        fill = self._fills[kind]
+        entry = self._blocks.get(kind)
+        if entry is None:
+            entry = self._blocks[kind] = [np.empty(self.block_size),
+                                          self.block_size]
+        block = entry[0]
+        while num > 0:
+            if entry[1] == len(block):
+                fill(out=block)
+                entry[1] = 0
+            n = min(num, len(block) - entry[1])
+            yield block[entry[1]:entry[1] + n]
+            entry[1] += n
+            num -= n
+
+    def _fill(self, kind, arr, scale, shift, add=False):
+        """set (or add) scale * standard values + shift, into arr"""
+        if not arr.flags.c_contiguous:
+            raise ValueError('noise is drawn in place: arrays must be '
+                             'contiguous')
+        flat = arr.reshape(-1)
+        i = 0
+        for chunk in self._chunks(kind, flat.size):
+            chunk *= scale
+            chunk += shift
+            if add:
+                flat[i:i + len(chunk)] += chunk
+            else:
+                flat[i:i + len(chunk)] = chunk
+            i += len(chunk)
+        return arr
+
+    def uniform(self, size=None, low=0., high=1., out=None):
+        """uniform values in [low, high), of shape size or into out"""
+        if out is None:
+            out = np.empty(size)
+        return self._fill('uniform', out, high - low, low)
+
+    def normal(self, size=None, loc=0., scale=1., out=None):
+        """normal values, of shape size or into out"""
+        if out is None:
+            out = np.empty(size)
+        return self._fill('normal', out, scale, loc)
+
+    def poisson(self, lam, size=None, out=None):
+        """Poisson counts of mean lam, into out when given"""
+        counts = self.rng.poisson(lam, size)
+        if out is None:
+            return counts
+        out[...] = counts
+        return out
+
+    def add_uniform(self, v, low=-1., high=1.):
+        """add uniform noise in [low, high) to v, in place"""
+        return self._fill('uniform', v, high - low, low, add=True)
+
+    def add_normal(self, v, scale=1.):
+        """add normal noise of width scale to v, in place"""
+        return self._fill('normal', v, scale, 0., add=True)
+
+
+def noise_source(name, random_state=None):
+    """
+    NoiseSource of a simulated device, from its random_state argument:
+    None (the device stream of the session seed), a seed, a Generator or
+    a NoiseSource.  A legacy np.random / RandomState seeds a new stream.
+    """
+    if isinstance(random_state, NoiseSource):
+        return random_state
+    if isinstance(random_state, np.random.Generator):
+        return NoiseSource(random_state)
+    if hasattr(random_state, 'randint'):
+        return NoiseSource(random_state.randint(2**32, dtype=np.uint64))
+    return NoiseSource.for_device(name, random_state)
@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the background writer thread
+
+@author: RTK
+"""
+
+import unittest
+
+class BackgroundWriterTests(unittest.TestCase):
+    def test_order_and_metrics(self):
+        """
+        Jobs run in submission order; errors land in the future
+        """
+        from ssrltools.background import BackgroundWriter
+
+        writer = BackgroundWriter(maxsize=4)
+        done = []
+        futures = [writer.submit(done.append, i) for i in range(20)]
+        bad = writer.submit(lambda: 1 / 0)
+        self.assertTrue(writer.flush(timeout=5))
+
+        self.assertEqual(done, list(range(20)))
+        self.assertTrue(all(f.done() for f in futures))
+        self.assertIsInstance(bad.exception(), ZeroDivisionError)
+
+        metrics = writer.metrics
+        self.assertEqual(metrics['submitted'], 21)
+        self.assertEqual(metrics['completed'], 21)
+        self.assertEqual(metrics['failed'], 1)
+        self.assertEqual(metrics['queue_depth'], 0)
+        self.assertLessEqual(metrics['max_queue_depth'], 4)
+
+        writer.close()
+        with self.assertRaises(RuntimeError):
+            writer.submit(done.append, 0)
+
+    def test_back_pressure(self):
+        """
+        A full queue blocks submit, and times out if asked to
+        """
+        import queue
+        import threading
+        from ssrltools.background import BackgroundWriter
+
+        writer = BackgroundWriter(maxsize=1)
+        release = threading.Event()
+        writer.submit(release.wait)     # occupies the writer thread
+        writer.submit(lambda: None)     # fills the queue
+        with self.assertRaises(queue.Full):
+            writer.submit(lambda: None, timeout=0.05)
+
+        release.set()
+        writer.close()
+        self.assertEqual(writer.metrics['completed'], 2)
+
+    def test_close_while_submitting(self):
+        """
+        Every job submitted while another thread closes the writer either
+        runs, or fails: submit raises, or the future does
+        """
+        import threading
+        from ssrltools.background import BackgroundWriter
+
+        for _ in range(20):
+            writer = BackgroundWriter(maxsize=2)
+            futures, refused = [], []
+
+            def produce():
+                for i in range(200):
+                    try:
+                        futures.append(writer.submit(abs, i))
+                    except RuntimeError:
+                        refused.append(i)
+
+            threads = [threading.Thread(target=produce) for _ in range(3)]
+            for t in threads:
+                t.start()
+            writer.close()
+            for t in threads:
+                t.join(5)
+            for fut in futures:
+                fut.exception(timeout=5)        # resolved, either way
+            self.assertEqual(len(futures) + len(refused), 600)
+            self.assertTrue(writer.flush(timeout=0))
+
+    def test_dropped_writer_collected(self):
+        """
+        A writer dropped without close is collected, and its thread ends
+        """
+        import gc
+        import weakref
+        from ssrltools.background import BackgroundWriter, _open_writers
+
+        writer = BackgroundWriter()
+        writer.submit(abs, -1).result(5)
+        self.assertIn(writer, _open_writers)
+        thread, ref = writer._thread, weakref.ref(writer)
+        del writer
+        gc.collect()
+        self.assertIsNone(ref())
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for SPEC and CSV file writing callbacks
+
+@author: RTK
+"""
+
+import os
+import re
+import tempfile
+import unittest
+
+class SpecWriterTests(unittest.TestCase):
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.tmpdir = self._tmp.name
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def run_plans(self, *writers):
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+        from ophyd.sim import det, motor
+
+        RE = RunEngine({})
+        for w in writers:
+            RE.subscribe(getattr(w, 'receiver', w))
+        RE(bp.scan([det], motor, -1, 1, 5))
+        RE(bp.count([det], 3))
+
+    def test_streaming_matches_buffered(self):
+        """
+        Streaming mode writes the same file, without keeping event data
+        """
+        from ssrltools.filewriters import SpecWriterCallback
+
+        fn_a = os.path.join(self.tmpdir, 'a.dat')
+        fn_b = os.path.join(self.tmpdir, 'b.dat')
+        buffered = SpecWriterCallback(fn_a)
+        streamed = SpecWriterCallback(fn_b, streaming=True)
+        self.run_plans(buffered, streamed)
+
+        self.assertTrue(all(len(v) == 0 for v in streamed.data.values()))
+        self.assertIsNone(streamed._stream)
+
+        with open(fn_a) as fa, open(fn_b) as fb:
+            strip_name = lambda t: re.sub(r'#F .*', '#F', t)
+            self.assertEqual(strip_name(fa.read()), strip_name(fb.read()))
+
+    def test_sidecar_index(self):
+        """
+        Index tracks every scan, and rebuilds itself when missing or stale;
+        only writing a scan changes the sidecar
+        """
+        from ssrltools.filewriters import SpecWriterCallback, SpecFileIndex
+
+        fn = os.path.join(self.tmpdir, 'spec.dat')
+        writer = SpecWriterCallback(fn)
+        streamed = SpecWriterCallback(
+                        os.path.join(self.tmpdir, 'streamed.dat'),
+                        streaming=True)
+        self.run_plans(writer, streamed)
+
+        for w in (writer, streamed):
+            index = SpecFileIndex(w.spec_filename)
+            self.assertEqual(len(index), 2)
+            self.assertEqual(index.max_scan_id, 2)
+            self.assertIn(w.uid, index)
+            self.assertTrue(index.read_scan(2).startswith('#S 2  count('))
+            self.assertIn(w.uid, index.read_scan(w.uid))
+
+        entries = SpecFileIndex(fn).entries
+        os.remove(fn + '.idx')
+        self.assertEqual(SpecFileIndex(fn).entries, entries)
+        self.assertFalse(os.path.exists(fn + '.idx'))
+        self.run_plans(SpecWriterCallback(fn))  # writing scans saves it
+        with open(fn + '.idx') as f:
+            self.assertEqual(len(f.readlines()), 4)
+
+        # scans appended by someone else make the index stale
+        with open(fn + '.idx') as f:
+            sidecar = f.read()
+        with open(fn, 'a') as f:
+            f.write('\n#S 7  foreign()\n#MD uid = abc\n1 2\n')
+        index = SpecFileIndex(fn)
+        self.assertEqual(index.max_scan_id, 7)
+        self.assertIn('abc', index)
+        with open(fn + '.idx') as f:
+            self.assertEqual(f.read(), sidecar)
+
+        # nor does a missing SPEC file remove the sidecar
+        self.assertEqual(len(SpecFileIndex(fn + '.gone', fn + '.idx')), 0)
+        self.assertTrue(os.path.exists(fn + '.idx'))
+
+        # existing file: next scan id comes from the index
+        self.assertEqual(SpecWriterCallback(fn).usefile(fn), 7)
+
+        # a scan already in the file is refused
+        writer.spec_filename = fn
+        with self.assertRaises(ValueError):
+            writer.write_scan()
+
+    def test_event_page(self):
+        """
+        event, event_page and bulk_events documents give the same files
+        """
+        import numpy as np
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+        from event_model import pack_event_page
+        from ophyd.sim import det, motor
+        from ssrltools.callbacks import SpecCSVCallback
+        from ssrltools.filewriters import SpecWriterCallback
+
+        docs = []
+        RE = RunEngine({})
+        RE(bp.scan([det], motor, -1, 1, 7),
+           lambda name, doc: docs.append((name, doc)))
+        events = [d for n, d in docs if n == 'event']
+        others = [(n, d) for n, d in docs if n != 'event']
+        by_mode = {
+            'event': [('event', d) for d in events],
+            'event_page': [('event_page', pack_event_page(*events))],
+            'bulk_events': [('bulk_events', 
+                             {events[0]['descriptor']: events})],
+        }
+
+        contents = {}
+        for mode, pages in by_mode.items():
+            fn = os.path.join(self.tmpdir, mode + '.dat')
+            csv_fn = os.path.join(self.tmpdir, mode + '.csv')
+            open(csv_fn, 'w').close()
+            spec = SpecWriterCallback(fn)
+            csv = SpecCSVCallback(csv_fn)
+            for name, doc in others[:2] + pages + others[2:]:
+                spec.receiver(name, doc)
+                csv(name, doc)
+
+            self.assertEqual(spec.num_primary_data, 7)
+            np.testing.assert_allclose(spec.data['motor'], 
+                                       np.linspace(-1, 1, 7))
+            with open(fn) as f, open(csv_fn) as g:
+                contents[mode] = (re.sub(r'#F .*', '#F', f.read()), g.read())
+
+        self.assertEqual(contents['event'], contents['event_page'])
+        self.assertEqual(contents['event'], contents['bulk_events'])
+
+    def test_csv_chunked_flush(self):
+        """
+        Chunked CSV flushes write the same file as one write at stop
+        """
+        import pandas as pd
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+        from ophyd.sim import det, motor
+        from ssrltools.callbacks import SpecCSVCallback
+
+        fns = [os.path.join(self.tmpdir, f'{n}.csv') for n in ('all', 'chunk')]
+        for fn in fns:
+            open(fn, 'w').close()
+        whole = SpecCSVCallback(fns[0])
+        chunked = SpecCSVCallback(fns[1], flush_every=4)
+
+        RE = RunEngine({})
+        RE.subscribe(whole)
+        RE.subscribe(chunked)
+        RE(bp.scan([det], motor, -1, 1, 11))
+
+        self.assertEqual(chunked.num_written, 11)
+        self.assertEqual(len(chunked.data), 0)
+        with open(fns[0]) as f, open(fns[1]) as g:
+            self.assertEqual(f.read(), g.read())
+        frame = pd.read_csv(fns[1])
+        self.assertEqual(list(frame['seq_num']), list(range(1, 12)))
+
+    def test_background_writer(self):
+        """
+        Writing through a shared background writer gives the same files
+        """
+        from ssrltools.background import BackgroundWriter
+        from ssrltools.callbacks import SpecCSVCallback
+        from ssrltools.filewriters import SpecWriterCallback
+
+        bg = BackgroundWriter(maxsize=2)
+        names = ('spec.dat', 'stream.dat', 'scan.csv')
+        paths = {}
+        for label in ('sync', 'bg'):
+            paths[label] = [os.path.join(self.tmpdir, label + n) for n in names]
+            open(paths[label][2], 'w').close()
+        writer = None
+        callbacks = []
+        for label in ('sync', 'bg'):
+            spec_fn, stream_fn, csv_fn = paths[label]
+            callbacks += [
+                SpecWriterCallback(spec_fn, writer=writer),
+                SpecWriterCallback(stream_fn, streaming=True, writer=writer),
+                SpecCSVCallback(csv_fn, writer=writer, flush_every=2),
+                ]
+            writer = bg
+        self.run_plans(*callbacks)
+        bg.close()
+
+        self.assertGreater(bg.metrics['completed'], 10)
+        self.assertEqual(bg.metrics['failed'], 0)
+        for sync_fn, bg_fn in zip(*paths.values()):
+            with open(sync_fn) as f, open(bg_fn) as g:
+                strip_name = lambda t: re.sub(r'#F .*', '#F', t)
+                self.assertEqual(strip_name(f.read()), strip_name(g.read()))
+
+    def test_duplicate_uid_keeps_file_header(self):
+        """
+        A scan refused on the writer thread, its uid already in the file,
+        raises from flush and leaves the file header for the next scan
+        """
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+        from ophyd.sim import det
+        from ssrltools.background import BackgroundWriter
+        from ssrltools.filewriters import SpecWriterCallback
+
+        bg = BackgroundWriter()
+        for streaming in (False, True):
+            fn = os.path.join(self.tmpdir, f'dup{int(streaming)}.dat')
+            docs = []
+            first = SpecWriterCallback(fn)
+            RE = RunEngine({})
+            RE.subscribe(first.receiver)
+            RE(bp.count([det], 2), lambda name, doc: docs.append((name, doc)))
+
+            writer = SpecWriterCallback(
+                        os.path.join(self.tmpdir, 'unused.dat'),
+                        streaming=streaming, writer=bg)
+            writer.newfile(fn)
+            for name, doc in docs:          # the same run again
+                writer.receiver(name, doc)
+            with self.assertRaisesRegex(ValueError, 'already contains'):
+                writer.flush()
+            self.assertTrue(writer.write_file_header)
+            self.assertTrue(writer.flush())
+
+            RE = RunEngine({})
+            RE.subscribe(writer.receiver)
+            RE(bp.count([det], 3))
+            writer.flush()
+            with open(fn) as f:
+                text = f.read()
+            self.assertEqual(text.count('#F '), 2)
+            self.assertEqual(text.count('#S '), 2)
+            self.assertLess(text.rindex('#F '), text.rindex('#S '))
+        bg.close()
+
+if __name__ == '__main__':
+    unittest.main()
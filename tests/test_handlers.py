@@ -0,0 +1,138 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the cached Xspress3 HDF5 handler
+
+@author: RTK
+"""
+
+import os
+import subprocess
+import sys
+import tempfile
+import unittest
+
+def write_frames(filename, data, **kwargs):
+    """Xspress3 layout file of data (frames, channels, bins)"""
+    import h5py
+    from ssrltools.handlers.xspress3 import XRF_DATA_KEY
+
+    with h5py.File(filename, 'w') as f:
+        f.create_dataset(XRF_DATA_KEY, data=data, **kwargs)
+
+class CachedHandlerTests(unittest.TestCase):
+    def setUp(self):
+        import numpy as np
+        from ssrltools.handlers.xspress3 import CachedXspress3HDF5Handler
+
+        CachedXspress3HDF5Handler.clear_cache()
+        self.tmp = tempfile.TemporaryDirectory()
+        self.data = np.random.default_rng(0).integers(
+                                    0, 1000, (23, 2, 32), dtype=np.uint32)
+
+    def tearDown(self):
+        from ssrltools.handlers.xspress3 import CachedXspress3HDF5Handler
+
+        CachedXspress3HDF5Handler.set_cache_limits(max_open_files=8)
+        CachedXspress3HDF5Handler.clear_cache()
+        self.tmp.cleanup()
+
+    def check_frames(self, handler):
+        import numpy as np
+
+        for frame in range(len(self.data)):
+            for chan in (1, 2):
+                np.testing.assert_array_equal(handler(frame, chan),
+                                              self.data[frame, chan - 1])
+        np.testing.assert_array_equal(handler(channel=2), self.data[:, 1])
+        np.testing.assert_array_equal(handler(slice(3, 9), 1),
+                                      self.data[3:9, 0])
+        np.testing.assert_array_equal(handler.get_roi(1, 4, 20),
+                                      self.data[:, 0, 4:20].sum(axis=1))
+        np.testing.assert_array_equal(
+                handler.get_roi(2, 0, 32, max_points=7),
+                self.data[:7, 1].sum(axis=1))
+
+    def test_chunked_gzip(self):
+        """
+        Frames read in blocks that do not line up with the HDF5 chunks
+        """
+        from ssrltools.handlers.xspress3 import CachedXspress3HDF5Handler
+
+        fn = os.path.join(self.tmp.name, 'chunked.h5')
+        write_frames(fn, self.data, chunks=(5, 2, 32), compression='gzip')
+        handler = CachedXspress3HDF5Handler(fn, chunk_frames=4)
+        self.check_frames(handler)
+        self.assertIsNone(handler._mmap)
+
+    def test_contiguous_memmap(self):
+        """
+        Contiguous, uncompressed data is read through a memory map
+        """
+        import numpy as np
+        from ssrltools.handlers.xspress3 import CachedXspress3HDF5Handler
+
+        fn = os.path.join(self.tmp.name, 'contiguous.h5')
+        write_frames(fn, self.data)
+        handler = CachedXspress3HDF5Handler(fn)
+        self.check_frames(handler)
+        self.assertIsInstance(handler._mmap, np.memmap)
+
+    def test_shared_and_evicted(self):
+        """
+        Handlers of one file share the open file; evicted files are
+        closed, and reopened when read again
+        """
+        import numpy as np
+        from ssrltools.handlers.xspress3 import CachedXspress3HDF5Handler
+
+        first, second = (os.path.join(self.tmp.name, f'{name}.h5')
+                         for name in ('first', 'second'))
+        for fn in (first, second):
+            write_frames(fn, self.data, chunks=(4, 2, 32))
+        a = CachedXspress3HDF5Handler(first)
+        b = CachedXspress3HDF5Handler(first)
+        a(0, 1)
+        b(5, 2)
+        self.assertIs(a._file, b._file)
+
+        CachedXspress3HDF5Handler.set_cache_limits(max_open_files=1)
+        hdf = a._file
+        c = CachedXspress3HDF5Handler(second)
+        c(0, 1)
+        self.assertFalse(hdf.id.valid)
+        np.testing.assert_array_equal(a(22, 2), self.data[22, 1])
+        self.assertTrue(a._file.id.valid)
+
+    def test_growing_file(self):
+        """
+        Frames written after the file was opened are found on reopening
+        """
+        import numpy as np
+        from ssrltools.handlers.xspress3 import (CachedXspress3HDF5Handler,
+                                                 XRF_DATA_KEY)
+
+        fn = os.path.join(self.tmp.name, 'growing.h5')
+        write_frames(fn, self.data[:10], chunks=(4, 2, 32),
+                     maxshape=(None, 2, 32))
+        handler = CachedXspress3HDF5Handler(fn)
+        np.testing.assert_array_equal(handler(9, 1), self.data[9, 0])
+
+        # the IOC appends from another process
+        np.save(os.path.join(self.tmp.name, 'more.npy'), self.data[10:])
+        script = ('import h5py, numpy as np, sys\n'
+                  'more = np.load(sys.argv[2])\n'
+                  'with h5py.File(sys.argv[1], "a") as f:\n'
+                  f'    data = f["{XRF_DATA_KEY}"]\n'
+                  '    data.resize(len(data) + len(more), axis=0)\n'
+                  '    data[-len(more):] = more\n')
+        subprocess.run([sys.executable, '-c', script, fn,
+                        os.path.join(self.tmp.name, 'more.npy')],
+                       check=True,
+                       env=dict(os.environ, HDF5_USE_FILE_LOCKING='FALSE'))
+
+        np.testing.assert_array_equal(handler(8, 2), self.data[8, 1])
+        np.testing.assert_array_equal(handler(15, 2), self.data[15, 1])
+        np.testing.assert_array_equal(handler(11, 1), self.data[11, 0])
+
+if __name__ == '__main__':
+    unittest.main()
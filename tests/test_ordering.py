@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for travel-optimized ordering of HiTp sample positions
+
+@author: RTK
+"""
+
+import unittest
+
+class OrderingTests(unittest.TestCase):
+    def test_orders_are_permutations(self):
+        """
+        Every mode visits each point exactly once
+        """
+        import numpy as np
+        from ssrltools.ordering import order_points, ORDER_MODES
+
+        pts = np.random.default_rng(0).uniform(-30, 30, size=(50, 2))
+        for mode in ORDER_MODES:
+            order = order_points(pts, mode=mode)
+            self.assertEqual(sorted(order), list(range(50)))
+
+    def test_travel_time_177(self):
+        """
+        Optimized orders beat dictionary order on the 177 position wafer,
+        as estimated from the simulated stage axes
+        """
+        import numpy as np
+        from ssrltools.sim.hitp import SynHiTpStage
+        from ssrltools.ordering import (order_sample_locs, 
+                                        estimate_travel_time,
+                                        motor_kinematics)
+
+        stg = SynHiTpStage(prefix='simBL:', name='SynStage')
+        velocity, accel_time = motor_kinematics(stg.stage_x, stg.stage_y)
+
+        def travel(indices):
+            pts = [[stg.sample_locs[i]['stage_x'], 
+                    stg.sample_locs[i]['stage_y']] for i in indices]
+            return estimate_travel_time(pts, velocity, accel_time)
+
+        baseline = travel(list(stg.sample_locs.keys()))
+        times = {mode: travel(order_sample_locs(stg.sample_locs, mode=mode,
+                                                velocity=velocity))
+                 for mode in ('serpentine', 'nn', '2opt')}
+
+        for mode, t in times.items():
+            self.assertLess(t, baseline, mode)
+        self.assertLessEqual(times['2opt'], times['nn'])
+
+        # subsets are reordered without pulling in other samples
+        subset = order_sample_locs(stg.sample_locs, index=[5, 90, 3, 170])
+        self.assertEqual(sorted(subset), [3, 5, 90, 170])
+
+    def test_trapezoid_estimate(self):
+        """
+        Long moves cruise, short moves never reach full velocity
+        """
+        from ssrltools.ordering import estimate_travel_time
+
+        self.assertAlmostEqual(
+            estimate_travel_time([[0, 0], [10, 2]], 2.0, 0.5), 5.5)
+        self.assertAlmostEqual(
+            estimate_travel_time([[0], [0.25]], 1.0, 1.0), 1.0)
+
+if __name__ == '__main__':
+    unittest.main()
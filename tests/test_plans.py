@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for SSRL plans, run against ophyd simulated hardware
+
+@author: RTK
+"""
+
+import unittest
+
+class PlanTests(unittest.TestCase):
+    def test_mesh_grid_circ_points(self):
+        """
+        Point set matches the brute force in-circle check, in grid order
+        """
+        import numpy as np
+        from ssrltools.plans import mesh_grid_circ_points
+
+        pts = mesh_grid_circ_points(-5, 5, 1, -5, 5, 1, 5, (0, 0))
+        expected = [(x, y) for x in np.linspace(-5, 5, 11)
+                            for y in np.linspace(-5, 5, 11)
+                            if x*x + y*y <= 25]
+        self.assertEqual(len(pts), len(expected))
+        np.testing.assert_allclose(pts, expected)
+
+        skipped = mesh_grid_circ_points(-5, 5, 1, -5, 5, 1, 5, (0, 0),
+                                        skip=10)
+        np.testing.assert_allclose(skipped, expected[10:])
+
+        # grid lines follow the pin
+        pinned = mesh_grid_circ_points(-5, 5, 1, -5, 5, 1, 5, (0.5, 0.5))
+        np.testing.assert_allclose(np.mod(pinned, 1), 0.5)
+
+    def test_mesh_grid_circ_plan(self):
+        """
+        Only in-circle points are measured, and recorded in the start doc
+        """
+        from bluesky import RunEngine
+        from ophyd.sim import SynAxis, det
+        from ssrltools.plans import mesh_grid_circ
+
+        m1 = SynAxis(name='m1')
+        m2 = SynAxis(name='m2')
+
+        docs = []
+        RE = RunEngine({})
+        RE(mesh_grid_circ([det], m1, -3, 3, 1, m2, -3, 3, 1, 3,
+                          pin=(0, 0), skip=2),
+           lambda name, doc: docs.append((name, doc)))
+
+        start = [d for n, d in docs if n == 'start'][0]
+        events = [d for n, d in docs if n == 'event']
+        self.assertEqual(start['plan_name'], 'mesh_grid_circ')
+        self.assertEqual(len(events), len(start['points']))
+        self.assertEqual(len(events), start['num_points'])
+        for ev, pt in zip(events, start['points']):
+            self.assertAlmostEqual(ev['data']['m1'], pt[0])
+            self.assertAlmostEqual(ev['data']['m2'], pt[1])
+            self.assertLessEqual(pt[0]**2 + pt[1]**2, 9)
+
+if __name__ == '__main__':
+    unittest.main()
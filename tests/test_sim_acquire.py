@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the simulated acquisition IOC
+
+@author: RTK
+"""
+
+import unittest
+
+class SimAcquireTests(unittest.TestCase):
+    def test_exposures(self):
+        """
+        Acquire takes NumImages frames in Multiple mode, one in Single,
+        SimLatency seconds each, then drops back to 0; a put of 0 ends
+        the exposure early
+        """
+        import asyncio
+        import time
+        from ssrltools.sim.IOC.acquire import AcquireSimIOC
+
+        async def wait_done(cam):
+            while cam.acquire.value:
+                await asyncio.sleep(0.005)
+
+        async def scenario():
+            ioc = AcquireSimIOC(prefix='TEST:')
+            cam = ioc.pilatus
+            await cam.sim_latency.write(0.02)
+            await cam.image_mode.write(1)
+            await cam.num_images.write(4)
+            self.assertEqual(cam.image_mode_rbv.value, 1)
+            self.assertEqual(cam.num_images_rbv.value, 4)
+
+            t0 = time.monotonic()
+            await cam.acquire.write(1)
+            await asyncio.sleep(0.005)      # the exposure task starts
+            self.assertEqual(cam.acquire_rbv.value, 1)
+            self.assertEqual(cam.detector_state.value, 1)
+            await wait_done(cam)
+            self.assertGreaterEqual(time.monotonic() - t0, 0.08)
+            self.assertEqual(cam.array_counter_rbv.value, 4)
+            self.assertEqual(cam.acquire_rbv.value, 0)
+            self.assertEqual(cam.detector_state.value, 0)
+
+            # Single mode: one frame, whatever NumImages
+            await cam.image_mode.write(0)
+            await cam.array_counter.write(0)
+            self.assertEqual(cam.array_counter_rbv.value, 0)
+            await cam.acquire.write(1)
+            await wait_done(cam)
+            self.assertEqual(cam.array_counter_rbv.value, 1)
+
+            # stopped during the first frame
+            await cam.sim_latency.write(10.)
+            await cam.acquire.write(1)
+            await asyncio.sleep(0.01)
+            await cam.acquire.write(0)
+            await asyncio.sleep(0.01)
+            self.assertEqual(cam.acquire_rbv.value, 0)
+            self.assertEqual(cam.array_counter_rbv.value, 1)
+
+            # other detectors are untouched, the Xspress3 has ERASE
+            self.assertEqual(ioc.dexela.array_counter_rbv.value, 0)
+            self.assertIn('TEST:XSP3:ERASE', ioc.pvdb)
+            self.assertIn('TEST:MAR:cam1:Acquire', ioc.pvdb)
+
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
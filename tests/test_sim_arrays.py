@@ -0,0 +1,249 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the simulated array detectors
+
+@author: RTK
+"""
+
+import os
+import tempfile
+import unittest
+
+class ArraySimTests(unittest.TestCase):
+    def test_one_resource_per_run(self):
+        """
+        A run makes one resource and a datum per point; frames are on disk
+        when each trigger status finishes
+        """
+        import h5py
+        import numpy as np
+        import tifffile
+        from bluesky import RunEngine
+        from bluesky.plans import count
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss, FrameWriterPool
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        pool = FrameWriterPool(num_threads=2, num_buffers=2)
+        RE = RunEngine({})
+        docs = []
+        RE.subscribe(lambda name, doc: docs.append((name, doc)))
+
+        with tempfile.TemporaryDirectory() as root:
+            for spec in ('AD_TIFF', 'AD_HDF5'):
+                det = ArraySynGauss('det', motor1, 'motor1', motor2, 'motor2',
+                                    center1=0, center2=0, Imax=5, noise=None,
+                                    root=root, spec=spec, writers=pool)
+                docs.clear()
+                RE(count([det], 6))
+                resources = [doc for name, doc in docs if name == 'resource']
+                datums = [doc for name, doc in docs if name == 'datum']
+                self.assertEqual(len(resources), 1)
+                self.assertEqual([d['datum_kwargs']['point_number']
+                                  for d in datums], list(range(6)))
+
+                res = resources[0]
+                path = os.path.join(root, res['resource_path'])
+                if spec == 'AD_TIFF':
+                    kwargs = res['resource_kwargs']
+                    frame = tifffile.imread(kwargs['template'] % (
+                        os.path.join(path, ''), kwargs['filename'], 5))
+                else:
+                    with h5py.File(path, 'r') as f:
+                        self.assertEqual(len(f['entry/data/data']), 6)
+                        frame = f['entry/data/data'][5]
+                np.testing.assert_array_equal(frame, det.get())
+        # frame buffers are reused
+        self.assertLessEqual(pool.allocated, 2)
+        pool.close()
+        self.assertTrue(pool.closed)
+
+    def test_asset_cache_per_instance(self):
+        """
+        Each detector has its own bounded asset cache, and counts its
+        high-water mark and the datums dropped outside of a staged run
+        """
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        with tempfile.TemporaryDirectory() as root:
+            a, b = (ArraySynGauss(name, motor1, 'motor1', motor2, 'motor2',
+                                  center1=0, center2=0, Imax=5, root=root,
+                                  asset_cache_size=3)
+                    for name in ('a', 'b'))
+            for _ in range(5):
+                a.trigger().wait(5)
+            b.trigger().wait(5)
+
+            docs = list(a.collect_asset_docs())
+            self.assertEqual([name for name, _ in docs],
+                             ['resource', 'datum', 'datum', 'datum'])
+            self.assertEqual([doc['datum_kwargs']['point_number']
+                              for _, doc in docs[1:]], [2, 3, 4])
+            self.assertEqual(a.asset_cache_metrics,
+                             dict(depth=0, high_water=3, dropped=2))
+            self.assertEqual(list(a.collect_asset_docs()), [])
+
+            docs = list(b.collect_asset_docs())
+            self.assertEqual(len(docs), 2)
+            self.assertEqual(docs[1][1]['resource'], docs[0][1]['uid'])
+
+    def test_asset_cache_full_in_run(self):
+        """
+        In a staged run, trigger raises once the asset cache is full,
+        rather than dropping datums already handed out
+        """
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        with tempfile.TemporaryDirectory() as root:
+            det = ArraySynGauss('det', motor1, 'motor1', motor2, 'motor2',
+                                center1=0, center2=0, Imax=5, root=root,
+                                asset_cache_size=3)
+            det.stage()
+            for _ in range(3):
+                det.trigger().wait(5)
+            with self.assertRaisesRegex(RuntimeError, 'asset cache full'):
+                det.trigger()
+            docs = list(det.collect_asset_docs())
+            self.assertEqual([doc['datum_kwargs']['point_number']
+                              for name, doc in docs if name == 'datum'],
+                             [0, 1, 2])
+            det.trigger().wait(5)
+            docs = list(det.collect_asset_docs())
+            self.assertEqual(docs[0][1]['datum_kwargs']['point_number'], 3)
+            self.assertEqual(det.asset_cache_metrics['dropped'], 0)
+            det.unstage()
+
+    def test_image_playback(self):
+        """
+        Images are indexed once and replayed in order, or in a seeded
+        random order, from a bounded cache of decoded frames
+        """
+        import numpy as np
+        import tifffile
+        from ssrltools.sim import SynImageDetector
+
+        with tempfile.TemporaryDirectory() as path:
+            for i in range(3):
+                tifffile.imwrite(os.path.join(path, f'im{i}.tif'),
+                                 np.full((4, 6), i, dtype=np.uint16))
+            det = SynImageDetector('det', path, cache_size=2, mmap=True,
+                                   root=path)
+            self.assertEqual(len(det.files), 3)
+            played = []
+            for _ in range(4):
+                det.trigger().wait(5)
+                played.append(int(det.get()[0, 0]))
+            self.assertEqual(played, [0, 1, 2, 0])
+            self.assertEqual(len(det.frames), 2)
+            self.assertFalse(det.get().flags.writeable)
+
+            orders = []
+            for _ in range(2):
+                det = SynImageDetector('det', path, order='random', seed=7,
+                                       cache_size=3, preload=True, root=path)
+                orders.append([int(det.frame(det._next_index())[0, 0])
+                               for _ in range(20)])
+                # everything decoded up front
+                self.assertEqual(det.frames.misses, 3)
+            self.assertEqual(orders[0], orders[1])
+            self.assertEqual(set(orders[0]), {0, 1, 2})
+
+    def test_evaluate_positions(self):
+        """
+        evaluate() gives the same signal as a trigger at each position,
+        for a whole trajectory at once
+        """
+        import numpy as np
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss, Syn2DRings
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        positions = np.random.default_rng(0).uniform(-5, 5, (50, 2))
+        gauss = ArraySynGauss('det', motor1, 'motor1', motor2, 'motor2',
+                              center1=1, center2=-1, Imax=5, noise=None,
+                              pt_density=7)
+        rings = Syn2DRings('rings', motor1, 'motor1', motor2, 'motor2',
+                           center=(1, -1), Imax=5, spacing=2, sigma=0.3)
+        images = gauss.evaluate(positions)
+        values = rings.evaluate(positions)
+        self.assertEqual(images.shape, (50, 7, 7))
+        self.assertEqual(values.shape, (50,))
+        for i in (0, 17, 49):
+            motor1.set(positions[i, 0])
+            motor2.set(positions[i, 1])
+            np.testing.assert_allclose(gauss._func(), images[i])
+            self.assertAlmostEqual(rings._func(), values[i])
+
+            m1, m2 = positions[i]
+            xx, yy = np.meshgrid(np.linspace(m1 - 2.5, m1 + 2.5, 7),
+                                 np.linspace(m2 - 2.5, m2 + 2.5, 7))
+            np.testing.assert_allclose(images[i], 5 * np.exp(
+                    -(xx - 1) ** 2 / 2 - (yy + 1) ** 2 / 8))
+
+        # on the rings, and between them
+        np.testing.assert_allclose(
+            rings.evaluate([[1, -1], [1, 3], [4, -1], [1, 0]]),
+            [5, 5, 5 * np.exp(-1 / 0.18), 5 * np.exp(-1 / 0.18)])
+
+    def test_trigger_fails_on_write_error(self):
+        """
+        An error handing the frame to the writers fails the trigger
+        status, rather than leaving it pending
+        """
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss
+
+        class ClosedWriters(object):
+            def submit(self, *args, **kwargs):
+                raise RuntimeError('writers closed')
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        with tempfile.TemporaryDirectory() as root:
+            det = ArraySynGauss('det', motor1, 'motor1', motor2, 'motor2',
+                                center1=0, center2=0, Imax=5, root=root,
+                                writers=ClosedWriters(), exposure_time=0.05)
+            det.stage()
+            # the frame is written from a status callback, on another thread
+            status = det.trigger()
+            with self.assertRaisesRegex(RuntimeError, 'writers closed'):
+                status.wait(5)
+            det.unstage()
+
+    def test_write_timeout(self):
+        """
+        With the writers stuck, trigger fails once no frame buffer frees
+        up within write_timeout, and unstage once the file is not closed
+        """
+        import threading
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss, FrameWriterPool
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        pool = FrameWriterPool(num_threads=1, num_buffers=1)
+        stuck = threading.Event()
+        pool.submit_job(stuck.wait)
+        with tempfile.TemporaryDirectory() as root:
+            tiff, hdf5 = (ArraySynGauss('det', motor1, 'motor1', motor2,
+                                        'motor2', center1=0, center2=0,
+                                        Imax=5, root=root, spec=spec,
+                                        writers=pool, write_timeout=0.2)
+                          for spec in ('AD_TIFF', 'AD_HDF5'))
+            tiff.stage()
+            first = tiff.trigger()      # holds the only frame buffer
+            with self.assertRaisesRegex(TimeoutError, 'frame buffer'):
+                tiff.trigger().wait(5)
+            tiff.unstage()
+
+            hdf5.stage()
+            with self.assertRaisesRegex(TimeoutError, 'not closed'):
+                hdf5.unstage()
+            stuck.set()
+            first.wait(5)
+            pool.close()
+
+if __name__ == '__main__':
+    unittest.main()
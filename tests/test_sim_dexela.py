@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the simulated Dexela IOC
+
+@author: RTK
+"""
+
+import os
+import tempfile
+import unittest
+
+class SimDexelaTests(unittest.TestCase):
+    def test_acquire_writes_tiffs(self):
+        """
+        Multiple mode publishes NumImages frames from the ring, and the
+        TIFF plugin writes each one to its own file
+        """
+        import asyncio
+        import numpy as np
+        import tifffile
+        from ssrltools.sim.IOC.dexela import DexelaDet15Group
+
+        async def scenario(path):
+            ioc = DexelaDet15Group(prefix='TEST:', frame_size=(64, 32),
+                                   frame_rate=200., ring_depth=3)
+            cam, tiff = ioc.cam, ioc.tiff
+            await cam.size.size_x.setpoint.write(64)
+            await cam.size.size_y.setpoint.write(32)
+            await cam.image_mode.setpoint.write(1)
+            await cam.num_images.setpoint.write(5)
+            await tiff.file_path.setpoint.write(path)
+            await tiff.file_name.setpoint.write('frames')
+            await tiff.auto_save.setpoint.write('Yes')
+            self.assertEqual(tiff.file_path_exists.value, 1)
+
+            await cam.acquire.write(1)
+            while cam.acquire.value:
+                await asyncio.sleep(0.01)
+            ioc.close()             # writes out the pending frames
+
+            ring = ioc.frame_ring((32, 64))
+            self.assertEqual(ring.count, 5)
+            self.assertEqual(cam.num_images_counter.value, 5)
+            self.assertEqual(tiff.file_number.readback.value, 5)
+            # last frame published is a view of the ring
+            data = ioc.image.array_data.value
+            self.assertTrue(np.shares_memory(data, ring.buffers))
+            self.assertEqual(ioc.highest_pixel.value, data.max())
+            return ring.buffers[(ring.count - 1) % ring.depth].copy()
+
+        with tempfile.TemporaryDirectory() as path:
+            path += os.sep
+            last = asyncio.run(scenario(path))
+            names = sorted(os.listdir(path))
+            self.assertEqual(names, [f'frames_{i:06d}.tiff' for i in range(5)])
+            np.testing.assert_array_equal(
+                tifffile.imread(path + names[-1]), last)
+
+if __name__ == '__main__':
+    unittest.main()
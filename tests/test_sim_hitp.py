@@ -17,5 +17,56 @@ class HiTpSimTests(unittest.TestCase):
         stg = SynHiTpStage(prefix='simBL:', name='SynStage')
         det = SynHiTpDet('SynDet', stg.stage_x, stg.stage_y)
 
+    def test_sample_loc_table(self):
+        """
+        Test bulk updates, index slicing and list_scan export of the
+        sample location table
+        """
+        import numpy as np
+        from ssrltools.sim.hitp import SynHiTpStage
+        
+        stg = SynHiTpStage(prefix='simBL:', name='SynStage')
+        locs = stg.sample_locs
+        self.assertEqual(len(locs), 177)
+
+        locs.set(theta=1.5, plate_x=0.2)
+        self.assertTrue(np.all(locs.column('theta') == 1.5))
+        locs.set([3, 4], plate_y=[7, 8])
+        self.assertEqual(locs[4]['plate_y'], 8)
+
+        # dict-style single sample access still works
+        locs[10] = {'stage_x': 1.0, 'stage_y': 2.0}
+        self.assertEqual(locs[10]['stage_x'], 1.0)
+        self.assertEqual(stg.sample(10)['stage_y'], 2.0)
+
+        args = stg.sample_loc_list()
+        self.assertIs(args[0], stg.stage_x)
+        self.assertTrue(np.shares_memory(args[1], locs.data))
+
+        args = stg.sample_loc_list(index=[10, 3])
+        np.testing.assert_array_equal(args[1], [1.0, locs[3]['stage_x']])
+
+    def test_sample_loc_list_index(self):
+        """
+        index=None gives every sample, index=0 only the first, and [] none
+        """
+        from ssrltools.devices.hitp import HiTpStage
+        from ssrltools.sim.hitp import SynHiTpStage
+
+        for stg in (SynHiTpStage(prefix='simBL:', name='SynStage'),
+                    HiTpStage('simBL', name='HS')):
+            locs = stg.sample_locs
+            locs[0] = {'stage_x': 4.0, 'stage_y': 5.0}
+            args = stg.sample_loc_list(index=None)
+            self.assertEqual([len(pos) for pos in args[1::2]],
+                             [len(locs)] * (len(args) // 2))
+            args = stg.sample_loc_list(index=0)
+            self.assertIs(args[0], stg.stage_x)
+            self.assertEqual(args[1].tolist(), [4.0])
+            self.assertEqual(args[3].tolist(), [5.0])
+            args = stg.sample_loc_list(index=[])
+            self.assertEqual([len(pos) for pos in args[1::2]],
+                             [0] * (len(args) // 2))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
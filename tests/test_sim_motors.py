@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the simulated motor IOC motion engine
+
+@author: RTK
+"""
+
+import unittest
+
+class SimMotorTests(unittest.TestCase):
+    def test_profile_matches_estimate(self):
+        """
+        Move durations match estimate_travel_time, trapezoid or triangle
+        """
+        from ssrltools.ordering import estimate_travel_time
+        from ssrltools.sim.IOC.motors import TrapezoidMove
+
+        for dist, velo, accl in ((5., 2., 0.5), (0.1, 2., 0.5),
+                                 (3., 1., 0.), (0., 1., 0.2)):
+            move = TrapezoidMove(1., 1. - dist, velo, accl)
+            est = estimate_travel_time([[1.], [1. - dist]], velo, accl)
+            self.assertAlmostEqual(move.duration, est)
+            self.assertEqual(move.position(move.duration), 1. - dist)
+            # always heading toward the target
+            steps = [move.position(move.duration * i / 20) for i in range(21)]
+            self.assertTrue(all(a >= b for a, b in zip(steps, steps[1:])))
+
+    def test_engine_moves_axes(self):
+        """
+        Puts to VAL move the axes at VELO, toggling DMOV and MOVN; puts
+        past the soft limits are refused
+        """
+        import asyncio
+        import time
+        from ssrltools.sim.IOC.motors import motor_group
+
+        async def scenario():
+            ioc = motor_group(12)(prefix='TEST:', tick_rate=100)
+            axes = [getattr(ioc, f'motor{i}') for i in range(1, 13)]
+            fields = axes[0].field_inst
+            await fields.user_high_limit.write(1.)
+            await axes[0].write(2.)
+            self.assertEqual(fields.limit_violation.value, 1)
+            self.assertEqual(ioc.motion.moving, 0)
+
+            t0 = time.monotonic()
+            for ax in axes:
+                await ax.write(0.3)
+            self.assertEqual(fields.done_moving_to_value.value, 0)
+            self.assertEqual(fields.motor_is_moving.value, 1)
+            while ioc.motion.moving:
+                await asyncio.sleep(0.01)
+            # 0.3 at 1 EGU/s, 0.2 s to reach it
+            self.assertGreater(time.monotonic() - t0, 0.45)
+            for ax in axes:
+                self.assertEqual(ax.field_inst.user_readback_value.value, 0.3)
+                self.assertEqual(ax.field_inst.done_moving_to_value.value, 1)
+
+        asyncio.run(scenario())
+
+    def test_stop(self):
+        """
+        A STOP put while idle is reset and does not halt the next move;
+        STOP halts a moving axis where it is, and is cleared
+        """
+        import asyncio
+        from ssrltools.sim.IOC.motors import motor_group
+
+        async def scenario():
+            ioc = motor_group(1)(prefix='TEST:', tick_rate=100)
+            motor, fields = ioc.motor1, ioc.motor1.field_inst
+            await fields.stop.write(1)
+            self.assertEqual(fields.stop.value, 0)
+            await motor.write(0.1)
+            while ioc.motion.moving:
+                await asyncio.sleep(0.01)
+            self.assertEqual(fields.user_readback_value.value, 0.1)
+
+            await motor.write(0.5)
+            await asyncio.sleep(0.05)
+            self.assertEqual(ioc.motion.moving, 1)
+            await fields.stop.write(1)
+            while ioc.motion.moving:
+                await asyncio.sleep(0.01)
+            self.assertEqual(fields.stop.value, 0)
+            self.assertEqual(fields.done_moving_to_value.value, 1)
+            stopped = fields.user_readback_value.value
+            self.assertLess(stopped, 0.5)
+            self.assertEqual(motor.value, stopped)
+
+        asyncio.run(scenario())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the seeded noise of the simulated detectors
+
+@author: RTK
+"""
+
+import unittest
+
+class SimNoiseTests(unittest.TestCase):
+    def test_streams(self):
+        """
+        Device streams replay from a seed, differ between devices, and
+        do not depend on the block size
+        """
+        import numpy as np
+        from ssrltools.sim.noise import NoiseSource
+
+        def draws(name, block_size):
+            noise = NoiseSource.for_device(name, seed=4, block_size=block_size)
+            out = np.empty((3, 50))
+            noise.uniform(low=-2, high=2, out=out)
+            return out, noise.normal(70, scale=3)
+
+        u, n = draws('det', 64)
+        for other_u, other_n in (draws('det', 64), draws('det', 1000)):
+            np.testing.assert_array_equal(u, other_u)
+            np.testing.assert_array_equal(n, other_n)
+        self.assertFalse(np.array_equal(u, draws('det2', 64)[0]))
+        self.assertTrue(np.all((u >= -2) & (u < 2)))
+
+        # in place, and only on arrays that can be filled in place
+        frame = np.ones((40, 40))
+        self.assertIs(NoiseSource(1).add_normal(frame, 0.5), frame)
+        self.assertAlmostEqual(frame.mean(), 1, delta=0.1)
+        with self.assertRaises(ValueError):
+            NoiseSource(1).add_uniform(frame[:, ::2])
+
+    def test_seeded_detectors(self):
+        """
+        Detectors made after set_seed make the same noisy data
+        """
+        import numpy as np
+        from ophyd.sim import SynAxis
+        from ssrltools.sim import ArraySynGauss
+        from ssrltools.sim.noise import set_seed
+
+        motor1, motor2 = SynAxis(name='motor1'), SynAxis(name='motor2')
+        positions = np.random.default_rng(0).uniform(-2, 2, (10, 2))
+        images = []
+        try:
+            for noise in ('poisson', 'uniform', 'gaussian') * 2:
+                set_seed(11)
+                det = ArraySynGauss('det', motor1, 'motor1', motor2, 'motor2',
+                                    center1=0, center2=0, Imax=5, noise=noise)
+                images.append(det.evaluate(positions))
+        finally:
+            set_seed(None)
+        for first, again in zip(images[:3], images[3:]):
+            np.testing.assert_array_equal(first, again)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the simulated Xspress3 IOC
+
+@author: RTK
+"""
+
+import os
+import tempfile
+import unittest
+
+class SimXspress3Tests(unittest.TestCase):
+    def test_peak_library(self):
+        """
+        Library lines have unit area, and frames keep the channel spectra
+        """
+        import numpy as np
+        from ssrltools.sim.IOC.xspress import peak_library, SpectrumSource
+
+        lines = peak_library(8, 4096, rng=1)
+        self.assertEqual(lines.shape, (8, 4096))
+        np.testing.assert_allclose(lines.sum(axis=1), 1, atol=0.01)
+
+        source = SpectrumSource(num_channels=3, num_bins=1024, seed=2)
+        frames = source.frames(200)
+        self.assertEqual(frames.shape, (200, 3, 1024))
+        np.testing.assert_allclose(frames.mean(axis=0), source.expected,
+                                   rtol=0.2, atol=3)
+
+    def test_capture_writes_hdf5(self):
+        """
+        Multiple mode updates the counters and ROIs, and a capture of
+        NumCapture frames is written in the Xspress3HDF5Handler layout
+        """
+        import asyncio
+        import h5py
+        import numpy as np
+        from ssrltools.sim.IOC.xspress import (SSRLXspress3DetectorGroup,
+                                               DATA_KEY, ROI_KEY)
+
+        async def scenario(path):
+            ioc = SSRLXspress3DetectorGroup(prefix='TEST:', num_bins=512)
+            settings, hdf5 = ioc.settings, ioc.hdf5
+            roi = ioc.channel2.rois.roi03
+            await ioc.channel2.mca_roi03.bin_low.setpoint.write(100)
+            await ioc.channel2.mca_roi03.bin_high.setpoint.write(300)
+            await roi.enable.setpoint.write(1)
+            await settings.image_mode.setpoint.write('Multiple')
+            await settings.num_images.setpoint.write(5)
+            await settings.acquire_time.setpoint.write(0.001)
+            await hdf5.file_path.setpoint.write(path)
+            self.assertEqual(hdf5.file_path_exists.value, 1)
+            await hdf5.file_name.setpoint.write('xsp3')
+            await hdf5.num_capture.setpoint.write(5)
+            await hdf5.capture.setpoint.write(1)
+            self.assertEqual(hdf5.capture.readback.value, 1)
+
+            await settings.acquire.write(1)
+            while settings.acquire.value or hdf5.capture.readback.value:
+                await asyncio.sleep(0.01)
+
+            self.assertEqual(settings.frame_count.value, 5)
+            self.assertEqual(settings.array_counter.readback.value, 5)
+            self.assertEqual(hdf5.num_captured.value, 5)
+            self.assertEqual(hdf5.file_number.readback.value, 1)
+            self.assertEqual(hdf5.write_status.value, 0)
+            self.assertEqual(ioc.arr2.array_counter.value, 5)
+            ioc.close()
+            return hdf5.full_file_name.value, roi.value.value, \
+                roi.value_sum.value, ioc.arr2.array_data.value
+
+        with tempfile.TemporaryDirectory() as path:
+            path += os.sep
+            filename, value, value_sum, spectrum = asyncio.run(
+                                                            scenario(path))
+            self.assertEqual(filename, path + 'xsp3_000000.h5')
+            with h5py.File(filename, 'r') as f:
+                data = f[DATA_KEY][()]
+                sums = f[ROI_KEY.format(2, 3)][()]
+            self.assertEqual(data.shape, (5, 2, 512))
+            np.testing.assert_array_equal(sums, data[:, 1, 100:300].sum(axis=1))
+            self.assertEqual(value, sums[-1])
+            self.assertEqual(value_sum, sums.sum())
+            # the last spectrum of channel 2, as Xspress3Channel.spectrum
+            np.testing.assert_array_equal(spectrum, data[-1, 1])
+
+if __name__ == '__main__':
+    unittest.main()
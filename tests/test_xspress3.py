@@ -0,0 +1,446 @@
+# -*- coding: utf-8 -*-
+"""
+Tests for the Xspress3 device support
+
+@author: RTK
+"""
+
+import contextlib
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+import uuid
+
+def fake_detector(name='xs', flyer=False):
+    """Two-channel Xspress3 with an HDF5 plugin, on fake signals"""
+    from ophyd import Component as Cpt
+    from ophyd.sim import make_fake_device
+    from ssrltools.devices.xspress3 import (XspressTrigger, XspressFlyer,
+                                            Xspress3Detector, Xspress3Channel,
+                                            Xspress3FileStore)
+
+    class Detector(XspressFlyer if flyer else XspressTrigger,
+                   Xspress3Detector):
+        channel1 = Cpt(Xspress3Channel, 'C1_', channel_num=1)
+        channel2 = Cpt(Xspress3Channel, 'C2_', channel_num=2)
+        hdf5 = Cpt(Xspress3FileStore, 'HDF5:', root='/',
+                   write_path_template=tempfile.gettempdir())
+
+    return make_fake_device(Detector)('XSP3:', name=name)
+
+def record_puts(rois, puts, drop=()):
+    """Log (signal name, value) of every ROI setting put into puts; puts
+    to the signals in drop are logged but never reach them"""
+    def recorder(sig):
+        put = sig.put
+
+        def record(value, **kwargs):
+            puts.append((sig.name, value))
+            if sig not in drop:
+                put(value, **kwargs)
+        return record
+
+    for roi in rois:
+        for sig in (roi.bin_low, roi.bin_high, roi.enable):
+            sig.put = recorder(sig)
+
+@contextlib.contextmanager
+def sim_ioc(path, bins=256):
+    """Simulated Xspress3 IOC writing to path, on a prefix of its own"""
+    prefix = f'XSPTEST{uuid.uuid4().hex[:8]}:'
+    ioc = subprocess.Popen(
+        [sys.executable, '-m', 'ssrltools.sim.IOC.xspress', '--prefix',
+         prefix, '--bins', str(bins), '--file-path', path],
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        yield prefix
+    finally:
+        ioc.terminate()
+        ioc.wait()
+
+def sim_detector(prefix, path, flyer=False, name='xs'):
+    """Two-channel Xspress3 on the simulated IOC at prefix, once it is up"""
+    from ophyd import Component as Cpt
+    from ssrltools.devices.xspress3 import (XspressTrigger, XspressFlyer,
+                                            Xspress3Detector, Xspress3Channel,
+                                            Xspress3FileStore)
+
+    class Detector(XspressFlyer if flyer else XspressTrigger,
+                   Xspress3Detector):
+        channel1 = Cpt(Xspress3Channel, 'C1_', channel_num=1)
+        channel2 = Cpt(Xspress3Channel, 'C2_', channel_num=2)
+        hdf5 = Cpt(Xspress3FileStore, 'HDF5:', root='/',
+                   write_path_template=path, wait_on_stage=True)
+
+    deadline = time.monotonic() + 30
+    while True:
+        try:
+            det = Detector(prefix, name=name,
+                           read_attrs=['channel1', 'channel2', 'hdf5'])
+            det.wait_for_connection(timeout=2)
+            return det
+        except TimeoutError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.5)
+
+class Xspress3Tests(unittest.TestCase):
+    def test_xrf_roi_sums(self):
+        """
+        ROI sums match plain slice sums, for overlapping, empty, clipped
+        and float ROIs, in blocks of frames and on worker threads
+        """
+        import h5py
+        import numpy as np
+        from ssrltools.devices.xspress3 import xrf_roi_sums
+
+        rng = np.random.default_rng(0)
+        data = rng.integers(0, 100, (37, 3, 64), dtype=np.uint32)
+        rois = [(1, 10, 20), (1, 15, 40),       # overlapping
+                (1, 10, 20),                    # repeated
+                (2, 30, 30), (2, 40, 35),       # empty, reversed
+                (2, -5, 10), (3, 50, 100),      # clipped
+                (3, 0, 64), (3, 2.7, 9.2)]      # whole spectrum, float
+
+        def expected(rows, frames=37):
+            res = []
+            for chan, lo, hi in rows:
+                lo = min(max(int(lo), 0), 64)
+                hi = min(max(int(hi), lo), 64)
+                res.append(data[:frames, chan - 1, lo:hi].sum(axis=1))
+            return res
+
+        with tempfile.TemporaryDirectory() as path:
+            fn = os.path.join(path, 'xsp3.h5')
+            with h5py.File(fn, 'w') as f:
+                f.create_dataset('data', data=data, chunks=(4, 3, 64))
+            with h5py.File(fn, 'r') as f:
+                for dataset in (data, f['data'], data.astype(float)):
+                    for kwargs in ({}, dict(chunk_size=8),
+                                   dict(chunk_size=5, max_workers=3)):
+                        sums = xrf_roi_sums(dataset, rois, **kwargs)
+                        self.assertEqual(len(sums), len(rois))
+                        for got, want in zip(sums, expected(rois)):
+                            np.testing.assert_array_equal(got, want)
+
+                sums = xrf_roi_sums(f['data'], rois, max_points=11,
+                                    chunk_size=4, max_workers=2)
+                for got, want in zip(sums, expected(rois, 11)):
+                    np.testing.assert_array_equal(got, want)
+
+        # every ROI of a channel empty
+        sums = xrf_roi_sums(data, [(1, 5, 5), (1, 70, 80)])
+        for got in sums:
+            np.testing.assert_array_equal(got, np.zeros(37))
+
+    def test_read_hdf5(self):
+        """
+        read_hdf5 sums the enabled ROIs over the acquired frames, with
+        their bounds in bins and eV
+        """
+        import h5py
+        import numpy as np
+
+        xs = fake_detector()
+        rng = np.random.default_rng(1)
+        data = rng.integers(0, 50, (12, 2, 128), dtype=np.uint32)
+        for roi, (lo, hi) in ((xs.channel1.rois.roi01, (5, 60)),
+                              (xs.channel2.rois.roi03, (40, 41)),
+                              (xs.channel2.rois.roi04, (100, 200))):
+            roi.bin_low.sim_put(lo)
+            roi.bin_high.sim_put(hi)
+            roi.enable.sim_put(1)
+        xs.settings.num_images.sim_put(10)
+
+        with tempfile.TemporaryDirectory() as path:
+            fn = os.path.join(path, 'xsp3.h5')
+            with h5py.File(fn, 'w') as f:
+                f.create_dataset(xs.data_key, data=data)
+            res = dict(xs.read_hdf5(fn, chunk_size=3, max_workers=2))
+
+        self.assertEqual(list(res), [xs.channel1.rois.roi01.name,
+                                     xs.channel2.rois.roi03.name,
+                                     xs.channel2.rois.roi04.name])
+        info = res[xs.channel2.rois.roi04.name]
+        self.assertEqual((info.bin_low, info.bin_high), (100, 200))
+        self.assertEqual((info.ev_low, info.ev_high), (1000., 2000.))
+        np.testing.assert_array_equal(info.value,
+                                      data[:10, 1, 100:].sum(axis=1))
+        np.testing.assert_array_equal(res[xs.channel1.rois.roi01.name].value,
+                                      data[:10, 0, 5:60].sum(axis=1))
+
+    def test_live_roi_sums(self):
+        """
+        LiveRoiSums of simulated spectra on two channels match plain sums,
+        and frames counts each frame once
+        """
+        import numpy as np
+        from ssrltools.sim.IOC.xspress import SpectrumSource
+
+        xs = fake_detector()
+        rois = {xs.channel1.rois.roi01: (10, 200),
+                xs.channel1.rois.roi02: (150, 151),
+                xs.channel2.rois.roi01: (0, 4096),
+                xs.channel2.rois.roi05: (300, 280)}      # empty
+        for roi, (lo, hi) in rois.items():
+            roi.bin_low.sim_put(lo)
+            roi.bin_high.sim_put(hi)
+            roi.enable.sim_put(1)
+        frames = SpectrumSource(num_channels=2).frames(7)
+
+        live = xs.live_roi_sums()
+        live.start()
+        totals = dict.fromkeys(live.signals, 0)
+        for num, frame in enumerate(frames):
+            for chan, spectrum in zip(xs.channels.values(), frame):
+                chan.spectrum.sim_put(spectrum, timestamp=100. + num)
+                if num == 3:        # resent, as by a reconnecting monitor
+                    chan.spectrum.sim_put(spectrum, timestamp=100. + num)
+            for roi, (lo, hi) in rois.items():
+                key = roi.value.name + '_live'
+                value = live.signals[key].get()
+                self.assertEqual(value, frame[roi.channel_num - 1,
+                                              lo:max(lo, hi)].sum())
+                totals[key] += value
+        live.stop()
+        xs.channel1.spectrum.sim_put(frames[0], timestamp=200.)
+
+        self.assertEqual(live.frames.get(), len(frames))
+        for roi, (lo, hi) in rois.items():
+            self.assertEqual(
+                totals[roi.value.name + '_live'],
+                frames[:, roi.channel_num - 1, lo:max(lo, hi)].sum())
+        self.assertEqual(len(live.read()), len(rois))
+
+    def test_fly_sim(self):
+        """
+        bp.fly against the simulated IOC: every frame lands in an event,
+        under the channel names step scans use, with its datums
+        """
+        import event_model
+        import h5py
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+        import bluesky.preprocessors as bpp
+        from ssrltools.sim.IOC.xspress import DATA_KEY
+
+        with tempfile.TemporaryDirectory() as path:
+            path += os.sep
+            with sim_ioc(path) as prefix:
+                xs = sim_detector(prefix, path, flyer=True)
+                xs.external_trig.put(True)
+                xs.total_points.put(20)
+                xs.settings.acquire_time.put(0.005)
+                xs.settings.acquire_period.put(0)
+
+                docs = []
+                RE = RunEngine({})
+                RE(bpp.stage_wrapper(bp.fly([xs]), [xs]),
+                   lambda name, doc: docs.append((name, doc)))
+
+            names = [name for name, _ in docs]
+            keys = [xs.channel1.name, xs.channel2.name]
+            descriptor = dict(docs)['descriptor']
+            self.assertEqual(sorted(descriptor['data_keys']), keys)
+            events = [ev for name, doc in docs if name == 'event_page'
+                      for ev in event_model.unpack_event_page(doc)]
+            self.assertEqual(len(events), 20)
+            datums = [doc for name, doc in docs if name == 'datum']
+            self.assertEqual(len(datums), 40)
+            self.assertEqual([ev['data'][keys[1]] for ev in events],
+                             [d['datum_id'] for d in datums
+                              if d['datum_kwargs']['channel'] == 2])
+            self.assertEqual(sorted(d['datum_kwargs']['frame']
+                                    for d in datums
+                                    if d['datum_kwargs']['channel'] == 1),
+                             list(range(20)))
+            self.assertLess(names.index('resource'), names.index('datum'))
+            self.assertEqual(dict(docs)['stop']['exit_status'], 'success')
+
+            resource = dict(docs)['resource']
+            with h5py.File(os.path.join(resource['root'],
+                                        resource['resource_path']), 'r') as f:
+                self.assertEqual(f[DATA_KEY].shape, (20, 2, 256))
+
+    def test_count_sim_datums(self):
+        """
+        bp.count against the simulated IOC emits one datum per channel per
+        frame, each before the event pointing at it, batched or not
+        """
+        import event_model
+        from bluesky import RunEngine
+        import bluesky.plans as bp
+
+        with tempfile.TemporaryDirectory() as path:
+            path += os.sep
+            with sim_ioc(path) as prefix:
+                xs = sim_detector(prefix, path)
+                xs.total_points.put(4)
+                xs.settings.acquire_time.put(0.005)
+                self.assertFalse(xs.hdf5.datum_batch)    # per datum default
+                runs = []
+                for datum_batch in (None, 3):
+                    xs.hdf5.datum_batch = datum_batch
+                    docs = []
+                    RE = RunEngine({})
+                    RE(bp.count([xs], 4),
+                       lambda name, doc: docs.append((name, doc)))
+                    runs.append(docs)
+
+        keys = [xs.channel1.name, xs.channel2.name]
+        for docs in runs:
+            names = [name for name, _ in docs]
+            self.assertEqual(names.count('resource'), 1)
+            self.assertNotIn('datum_page', names)
+            datums = {}
+            events = 0
+            for name, doc in docs:
+                if name == 'datum':
+                    datums[doc['datum_id']] = doc['datum_kwargs']
+                elif name in ('event', 'event_page'):
+                    if name == 'event_page':
+                        doc, = event_model.unpack_event_page(doc)
+                    for chan, key in enumerate(keys, 1):
+                        self.assertEqual(datums[doc['data'][key]],
+                                         {'frame': events, 'channel': chan})
+                    events += 1
+            self.assertEqual(events, 4)
+            self.assertEqual(len(datums), 8)
+
+    def test_configure_bins(self):
+        """
+        configure_bins puts only the changed settings, clears the low
+        limit first when the ROI moves below it, and forgets the cached
+        settings when the readbacks do not follow
+        """
+        xs = fake_detector()
+        roi = xs.channel1.rois.roi01
+        roi.bin_low.sim_put(100)
+        roi.bin_high.sim_put(200)
+        roi.enable.sim_put(1)
+        puts = []
+        record_puts([roi], puts)
+        low, high, enable = roi.bin_low.name, roi.bin_high.name, \
+            roi.enable.name
+
+        self.assertIsNone(roi.configure_bins(100, 200, 1))
+        self.assertEqual(puts, [])
+
+        roi.configure_bins(100, 300, 1).wait(1)
+        self.assertEqual(puts, [(high, 300)])
+
+        # moved down, below the current low limit
+        del puts[:]
+        roi.configure_bins(20, 50, 1).wait(1)
+        self.assertEqual(puts, [(low, 0), (high, 50), (low, 20)])
+        self.assertEqual((roi.bin_low.get(), roi.bin_high.get()), (20, 50))
+        self.assertEqual(roi.known_config(), (20, 50, 1))
+
+        # enable never reads back
+        del puts[:]
+        record_puts([roi], puts, drop=[roi.enable])
+        status = roi.configure_bins(20, 50, 0, timeout=0.2)
+        with self.assertRaises(Exception):
+            status.wait(2)
+        self.assertEqual(puts, [(enable, 0)])
+        self.assertIsNone(roi._config)
+        self.assertEqual(roi.known_config(), (20, 50, 1))
+
+    def test_configure_rois(self):
+        """
+        configure_rois converts each channel's table at once, puts only
+        what changed and names the ROIs
+        """
+        xs = fake_detector()
+        rois = [xs.channel1.rois.roi01, xs.channel1.rois.roi02,
+                xs.channel2.rois.roi01]
+        for roi, (lo, hi) in zip(rois, ((100, 200), (300, 400), (50, 60))):
+            roi.bin_low.sim_put(lo)
+            roi.bin_high.sim_put(hi)
+            roi.enable.sim_put(1)
+        puts = []
+        record_puts(rois, puts)
+
+        table = [(1, 1, 1000, 2000, 'Fe'),
+                 (1, 2, 3000, 4000),
+                 (2, 1, 500, 600, None)]
+        status = xs.configure_rois(table)
+        self.assertTrue(status.done and status.success)
+        self.assertEqual(puts, [])
+        self.assertEqual(rois[0].value.name, 'Det1_Fe')
+
+        table = [(1, 1, 1000, 2500, 'Fe'),      # high moved
+                 (1, 2, 3000, 4000),            # unchanged
+                 (2, 1, 600, 600)]              # disabled
+        xs.configure_rois(table, timeout=1)
+        self.assertEqual(puts, [(rois[0].bin_high.name, 250),
+                                (rois[2].bin_low.name, 60),
+                                (rois[2].enable.name, 0)])
+        self.assertEqual([roi.known_config() for roi in rois],
+                         [(100, 250, 1), (300, 400, 1), (60, 60, 0)])
+
+    def test_energy_calibration(self):
+        """
+        bin -> eV -> bin round trips with a quadratic term, scalars give
+        Python numbers and arrays keep their shape, energy axes are
+        cached read-only, and the module functions keep their old returns
+        """
+        import numpy as np
+        from ssrltools.devices.xspress3 import (EnergyCalibration,
+                                                bin_to_ev, ev_to_bin)
+
+        cal = EnergyCalibration(gain=9.98, offset=-3.5, quadratic=2e-5)
+        bins = np.arange(4096).reshape(64, 64)
+        ev = cal.bin_to_ev(bins)
+        self.assertEqual(ev.shape, (64, 64))
+        np.testing.assert_allclose(ev, -3.5 + 9.98 * bins + 2e-5 * bins**2)
+        np.testing.assert_array_equal(cal.ev_to_bin(ev), bins)
+        # anywhere inside a bin gives that bin
+        np.testing.assert_array_equal(
+            cal.ev_to_bin(0.5 * (ev[:, :-1] + ev[:, 1:])), bins[:, :-1])
+
+        self.assertIsInstance(cal.bin_to_ev(100), float)
+        self.assertIsInstance(cal.ev_to_bin(1000.), int)
+        self.assertEqual(cal.ev_to_bin(cal.bin_to_ev(2000)), 2000)
+        self.assertIsInstance(cal.ev_to_bin([1000.]), np.ndarray)
+
+        axis = cal.energy_axis(4096)
+        self.assertIs(cal.energy_axis(4096), axis)
+        np.testing.assert_array_equal(axis, ev.ravel())
+        with self.assertRaises(ValueError):
+            axis[0] = 0
+        self.assertEqual(len(cal.energy_axis(256)), 256)
+        with self.assertRaises(ValueError):
+            EnergyCalibration(gain=-1)
+
+        # gain 10 default: int eV for scalars, as before calibrations
+        self.assertEqual(bin_to_ev(123), 1230)
+        self.assertIsInstance(bin_to_ev(123), int)
+        self.assertIsInstance(bin_to_ev(np.int64(7)), int)
+        self.assertEqual(ev_to_bin(1239.), 123)
+        np.testing.assert_array_equal(bin_to_ev([1, 2]), [10., 20.])
+
+    def test_ev_signal(self):
+        """
+        ev_low / ev_high read the bin limits through the channel
+        calibration, and set them back in bins
+        """
+        from ssrltools.devices.xspress3 import EnergyCalibration
+
+        xs = fake_detector()
+        xs.channel2.calibration = EnergyCalibration(gain=5., offset=100.)
+        for chan in (xs.channel1, xs.channel2):
+            chan.rois.roi01.bin_low.sim_put(40)
+        self.assertEqual(xs.channel1.rois.roi01.ev_low.get(), 400.)
+        self.assertEqual(xs.channel2.rois.roi01.ev_low.get(), 300.)
+
+        roi = xs.channel2.rois.roi01
+        roi.ev_high.put(1102.)
+        self.assertEqual(roi.bin_high.get(), 200)
+        self.assertEqual(roi.ev_high.get(), 1100.)
+
+if __name__ == '__main__':
+    unittest.main()